@@ -1,39 +1,141 @@
-from flask import Flask, render_template, request, jsonify
-import json
+from flask import Flask, json, render_template, request, jsonify
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import atexit
+import base64
+import binascii
 import os
-import random
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from database import DB_BACKEND, open_sqlite_store
+from http_cache import CachedResponse, ResponseCache, cached_response
+from leaderboard import Leaderboard, PeriodLeaderboards, PERIODS, period_key
+from pieces import ROTATIONS
+from replay import ReplayError
+from rules import RULES, RULES_FILE, RULES_VERSION
+from startup import phase, print_report, report
+from user_store import UserStore
+from verify import Verifier, VerifierBusy
 
 app = Flask(__name__)
 
-# Простое хранилище пользователей (в продакшене используйте базу данных)
+# Проверка результатов: запись игры пересчитывается в ограниченном пуле процессов
+VERIFY_WORKERS = int(os.environ.get('VERIFY_WORKERS', os.cpu_count() or 1))
+VERIFY_MAX_PENDING = int(os.environ.get('VERIFY_MAX_PENDING', 64))
+VERIFY_TIMEOUT = 30  # секунды
+MAX_BULK_RESULTS = 500  # результатов в одном запросе /api/save_scores
+verifier = Verifier(max_workers=VERIFY_WORKERS, max_pending=VERIFY_MAX_PENDING)
+
+# Пользователи хранятся в памяти процесса; файл читается один раз при старте,
+# изменения записываются в фоне не чаще раза в секунду и при завершении.
+# TETRIS_DB_BACKEND=sqlite - общая база SQLite с настольной версией игры
 USERS_FILE = 'web_tetris_users.json'
+with phase('store'):
+    if DB_BACKEND == 'sqlite':
+        store = open_sqlite_store()
+    else:
+        store = UserStore(USERS_FILE)
+atexit.register(store.close)
+
+# Таблицы лидеров обновляются при каждой записи результата;
+# из хранилища общая таблица строится только при старте.
+# В SQLite сохраняются и результаты за день и неделю
+with phase('leaderboards'):
+    # Номер последнего изменения читается до таблицы: изменения, сделанные
+    # во время её построения, применятся ещё раз (лучший результат не меняется)
+    sync_state = {'change': store.last_change() if DB_BACKEND == 'sqlite' else 0, 'checked': 0.0}
+    leaderboard_index = Leaderboard.from_store(store)
+    period_boards = PeriodLeaderboards(store=store if DB_BACKEND == 'sqlite' else None)
+LEADERBOARD_MAX_LIMIT = 100
+
+# Готовые ответы GET-запросов (таблица лидеров, статистика) хранятся
+# сериализованными до записи результата; клиенты получают ETag и 304
+response_cache = ResponseCache()
+LEADERBOARD_TAG = 'leaderboard'
+
+
+# Правила игры из rules.json вместе с таблицами поворотов фигур - одни и те же
+# для движка на сервере и веб-клиента. Ответ сериализуется один раз; по адресу
+# с текущей версией (?v=...) браузер хранит его без повторных запросов
+with phase('rules'):
+    rules_response = CachedResponse(
+        json.dumps({'success': True, 'version': RULES_VERSION, 'rules': RULES,
+                    'rotations': ROTATIONS}).encode('utf-8') + b'\n',
+        os.path.getmtime(RULES_FILE))
+RULES_IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def user_tag(username):
+    return 'user:' + username
+
+
+def scores_changed(username):
+    """Сбросить кэш ответов, зависящих от результатов пользователя"""
+    response_cache.invalidate(LEADERBOARD_TAG, user_tag(username))
+
+
+# Базу SQLite могут менять другие процессы (воркеры serve.py, настольная игра).
+# Не чаще раза в SYNC_INTERVAL секунд процесс читает журнал изменений других
+# процессов (store.changes_since), вносит эти результаты в таблицы лидеров и
+# сбрасывает кэш только затронутых ответов. Таблицы целиком перестраиваются,
+# лишь если процесс отстал больше, чем хранит журнал
+SYNC_INTERVAL = 1.0
+sync_lock = threading.Lock()
+
+
+@app.before_request
+def sync_shared_store():
+    """Подхватить изменения базы, сделанные другими процессами"""
+    if DB_BACKEND != 'sqlite':
+        return
+    now = time.monotonic()
+    if now - sync_state['checked'] < SYNC_INTERVAL or not sync_lock.acquire(blocking=False):
+        return
+    try:
+        sync_state['checked'] = now
+        changes, sync_state['change'] = store.changes_since(sync_state['change'])
+        if changes is None:
+            leaderboard_index.merge(store.scores())
+            period_boards.reload()
+            response_cache.clear()
+            return
+        tags = set()
+        for username, score, period in changes:
+            if period is None:
+                leaderboard_index.update(username, score)
+            else:
+                period_boards.apply(period, username, score)
+            tags.add(user_tag(username))
+        if tags:
+            response_cache.invalidate(LEADERBOARD_TAG, *tags)
+    finally:
+        sync_lock.release()
 
 
-def load_users():
-    """Загрузить данные пользователей"""
-    if os.path.exists(USERS_FILE):
-        try:
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+@app.route('/')
+def index():
+    """Главная страница игры"""
+    return render_template('index.html', rules_version=RULES_VERSION)
 
 
-def save_users(users_data):
-    """Сохранить данные пользователей"""
+@app.route('/healthz')
+def healthz():
+    """Проверка работоспособности для балансировщика и Cloud Run"""
     try:
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users_data, f, ensure_ascii=False, indent=2)
-        return True
-    except:
-        return False
+        users = len(store)
+    except sqlite3.Error:
+        return jsonify({'status': 'error'}), 503
+    return jsonify({'status': 'ok', 'users': users, 'pid': os.getpid()})
 
 
-@app.route('/')
-def index():
-    """Главная страница игры"""
-    return render_template('index.html')
+@app.route('/api/rules')
+def get_rules():
+    """Правила игры: фигуры, повороты, отскоки от стен, гравитация, очки"""
+    if request.args.get('v') == RULES_VERSION:
+        return cached_response(rules_response, RULES_IMMUTABLE)
+    return cached_response(rules_response, 'no-cache')
 
 
 @app.route('/api/login', methods=['POST'])
@@ -45,80 +147,320 @@ def login():
     if not username:
         return jsonify({'error': 'Требуется имя пользователя'}), 400
 
-    users = load_users()
-
     # Создать пользователя, если не существует
-    if username not in users:
-        users[username] = {'high_score': 0, 'games_played': 0}
-        save_users(users)
+    stats, created = store.create_user(username)
+    if created:
+        leaderboard_index.update(username, stats['high_score'])
+        scores_changed(username)
 
     return jsonify({
         'success': True,
         'username': username,
-        'stats': users[username]
+        'stats': stats
     })
 
 
+# Игру с подтверждаемым счётом начинает сервер: он выдаёт seed, привязанный
+# к игроку, и засчитывает запись только с таким seed и только один раз, так
+# что чужую или уже отправленную запись не засчитать ещё раз
+GAME_SEED_TTL = 24 * 3600  # секунды
+MAX_OPEN_GAMES = 16  # невостребованных seed на игрока
+
+
+@app.route('/api/new_game', methods=['POST'])
+def new_game():
+    """API для начала игры: seed генератора фигур для записи игры"""
+    data = request.get_json(silent=True) or {}
+    username = data.get('username', '')
+    username = username.strip() if isinstance(username, str) else ''
+
+    if not username:
+        return jsonify({'error': 'Требуется имя пользователя'}), 400
+
+    if username not in store:
+        return jsonify({'error': 'Пользователь не найден'}), 404
+
+    seed = secrets.randbits(32)
+    store.issue_seed(username, seed, MAX_OPEN_GAMES)
+    return jsonify({'success': True, 'seed': seed})
+
+
+VERIFIER_BUSY = ('Сервер перегружен, попробуйте позже', 503)
+
+
+def decode_replay(data):
+    """Достать запись игры (base64) из запроса; возвращает (bytes, None) или (None, ошибка)"""
+    try:
+        return base64.b64decode(data['replay'], validate=True), None
+    except (binascii.Error, TypeError, ValueError):
+        return None, ('Некорректная запись игры', 400)
+
+
+def submission_score(future, username, timeout=VERIFY_TIMEOUT):
+    """Дождаться проверки записи игры (не дольше timeout секунд).
+
+    Возвращает (score, None) для подтверждённого результата или
+    (None, (сообщение, код)) при ошибке.
+    """
+    try:
+        result = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        return None, ('Проверка результата заняла слишком много времени', 503)
+    except ReplayError:
+        return None, ('Запись игры не прошла проверку', 400)
+
+    if result.username != username:
+        return None, ('Запись игры принадлежит другому пользователю', 400)
+    if not store.claim_seed(username, result.seed, time.time() - GAME_SEED_TTL):
+        return None, ('Игра не начата на сервере или уже засчитана', 400)
+    return result.score, None
+
+
+def verify_submission(data, username):
+    """Проверить запись игры (seed и поток ввода, см. replay.py).
+
+    Возвращает (score, None) для подтверждённого результата или
+    (None, (сообщение, код)) при ошибке.
+    """
+    replay_data, error = decode_replay(data)
+    if error:
+        return None, error
+
+    try:
+        future = verifier.submit(replay_data)
+    except VerifierBusy:
+        return None, VERIFIER_BUSY
+    return submission_score(future, username)
+
+
+def verify_submissions(items):
+    """Проверить пачку записей [(username, bytes)] параллельно в пуле.
+
+    На всю пачку - один срок VERIFY_TIMEOUT: при заполненной очереди ждёт
+    свободного места, пока срок не вышел, а если место так и не появилось,
+    остальные элементы сразу получают 503. Возвращает [(score, ошибка)] в
+    том же порядке.
+    """
+    deadline = time.monotonic() + VERIFY_TIMEOUT
+    futures = []
+    for _, replay_data in items:
+        if futures and futures[-1] is None:
+            futures.append(None)
+            continue
+        try:
+            futures.append(verifier.submit(replay_data, timeout=max(0.0, deadline - time.monotonic())))
+        except VerifierBusy:
+            futures.append(None)
+    return [submission_score(future, username, max(0.0, deadline - time.monotonic()))
+            if future else (None, VERIFIER_BUSY)
+            for future, (username, _) in zip(futures, items)]
+
+
 @app.route('/api/save_score', methods=['POST'])
 def save_score():
-    """API для сохранения результата"""
+    """API для сохранения результата.
+
+    Рекорд обновляется только по записи игры (поле replay, base64), которую
+    сервер пересчитывает сам. Без записи засчитывается только сыгранная игра.
+    """
     data = request.get_json()
     username = data.get('username', '').strip()
-    score = data.get('score', 0)
 
     if not username:
         return jsonify({'error': 'Требуется имя пользователя'}), 400
 
-    users = load_users()
-
-    if username in users:
-        users[username]['games_played'] += 1
-        if score > users[username]['high_score']:
-            users[username]['high_score'] = score
+    if username not in store:
+        return jsonify({'error': 'Пользователь не найден'}), 404
+
+    verified = 'replay' in data
+    score = 0
+    if verified:
+        score, error = verify_submission(data, username)
+        if error:
+            message, status = error
+            return jsonify({'error': message}), status
+
+    result = store.record_score(username, score)
+    if result is None:
+        return jsonify({'error': 'Пользователь не найден'}), 404
+
+    stats, new_record = result
+    leaderboard_index.update(username, stats['high_score'])
+    if verified:
+        period_boards.record(username, score)
+    scores_changed(username)
+    return jsonify({
+        'success': True,
+        'stats': stats,
+        'score': score,
+        'verified': verified,
+        'new_record': new_record
+    })
 
-        save_users(users)
 
-        return jsonify({
+@app.route('/api/save_scores', methods=['POST'])
+def save_scores():
+    """API для пакетного сохранения результатов (турнирные киоски, синхронизация).
+
+    Тело: {"results": [{"username": ..., "replay": ...}, ...]}. Каждый элемент
+    проверяется как в /api/save_score, записи игр пересчитываются параллельно,
+    а все принятые результаты записываются в хранилище за один раз.
+    Ответ содержит итог по каждому элементу в том же порядке.
+    """
+    data = request.get_json(silent=True) or {}
+    results = data.get('results')
+
+    if not isinstance(results, list) or not results:
+        return jsonify({'error': 'Требуется список результатов'}), 400
+
+    if len(results) > MAX_BULK_RESULTS:
+        return jsonify({'error': f'Не больше {MAX_BULK_RESULTS} результатов за запрос'}), 413
+
+    outcomes = [None] * len(results)
+    accepted = []   # (индекс, имя, подтверждён, очки)
+    to_verify = []  # (индекс, имя, запись игры)
+
+    for i, item in enumerate(results):
+        username = item.get('username') if isinstance(item, dict) else None
+        username = username.strip() if isinstance(username, str) else ''
+        if not username:
+            outcomes[i] = ('Требуется имя пользователя', 400)
+        elif username not in store:
+            outcomes[i] = ('Пользователь не найден', 404)
+        elif 'replay' in item:
+            replay_data, error = decode_replay(item)
+            if error:
+                outcomes[i] = error
+            else:
+                to_verify.append((i, username, replay_data))
+        else:
+            accepted.append((i, username, False, 0))
+
+    verified = verify_submissions([(username, replay_data) for _, username, replay_data in to_verify])
+    for (i, username, _), (score, error) in zip(to_verify, verified):
+        if error:
+            outcomes[i] = error
+        else:
+            accepted.append((i, username, True, score))
+
+    # Порядок отправки сохраняется, чтобы new_record считался как при поштучной отправке
+    accepted.sort(key=lambda entry: entry[0])
+    records = store.record_scores([(username, score) for _, username, _, score in accepted])
+
+    saved = 0
+    for (i, username, is_verified, score), record in zip(accepted, records):
+        if record is None:
+            outcomes[i] = ('Пользователь не найден', 404)
+            continue
+        stats, new_record = record
+        leaderboard_index.update(username, stats['high_score'])
+        if is_verified:
+            period_boards.record(username, score)
+        outcomes[i] = {
             'success': True,
-            'stats': users[username],
-            'new_record': score == users[username]['high_score'] and score > 0
-        })
+            'stats': stats,
+            'score': score,
+            'verified': is_verified,
+            'new_record': new_record
+        }
+        saved += 1
 
-    return jsonify({'error': 'Пользователь не найден'}), 404
+    for username in {username for _, username, _, _ in accepted}:
+        scores_changed(username)
+
+    items = []
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, tuple):
+            message, status = outcome
+            outcome = {'success': False, 'error': message, 'status': status}
+        items.append({'index': i, **outcome})
+
+    return jsonify({'success': True, 'saved': saved, 'results': items})
 
 
 @app.route('/api/stats/<username>')
 def get_stats(username):
     """API для получения статистики пользователя"""
-    users = load_users()
+    def build():
+        stats = store.get_user(username)
+
+        if stats is not None:
+            return {'success': True, 'stats': stats}, 200
 
-    if username in users:
-        return jsonify({'success': True, 'stats': users[username]})
+        return {'error': 'Пользователь не найден'}, 404
 
-    return jsonify({'error': 'Пользователь не найден'}), 404
+    return response_cache.respond(('stats', username), (user_tag(username),), build)
 
 
 @app.route('/api/leaderboard')
 def leaderboard():
-    """API для получения таблицы лидеров"""
-    users = load_users()
+    """API для получения таблицы лидеров.
 
-    # Сортировать по лучшему результату
-    sorted_users = sorted([(username, data)
-                           for username, data in users.items()],
-                          key=lambda x: x[1]['high_score'],
-                          reverse=True)[:10]  # Топ 10
+    Параметры: offset и limit (по умолчанию топ 10, не больше 100),
+    period=daily|weekly - лучшие результаты за текущий день или неделю.
+    """
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(LEADERBOARD_MAX_LIMIT, max(1, int(request.args.get('limit', 10))))
+    except ValueError:
+        return jsonify({'error': 'Некорректные параметры'}), 400
+
+    period = request.args.get('period')
+    if period is not None and period not in PERIODS:
+        return jsonify({'error': 'Неизвестный период'}), 400
+
+    def build():
+        board = leaderboard_index if period is None else period_boards.board(period)
+        leaderboard_data = []
+        for rank, username, score in board.page(offset, limit):
+            stats = store.get_user(username) or {'games_played': 0}
+            leaderboard_data.append({
+                'rank': rank,
+                'username': username,
+                'high_score': score,
+                'games_played': stats['games_played']
+            })
+
+        return {'success': True, 'leaderboard': leaderboard_data, 'total': len(board)}, 200
+
+    # Ключ периода в ключе кэша: с началом нового дня или недели ответ строится заново
+    current_period = period_key(period) if period else None
+    return response_cache.respond(('leaderboard', offset, limit, period, current_period),
+                                  (LEADERBOARD_TAG,), build)
+
+
+@app.route('/api/rank/<username>')
+def get_rank(username):
+    """API для получения места пользователя в таблице лидеров"""
+    def build():
+        rank = leaderboard_index.rank(username)
+        if rank is None:
+            return {'error': 'Пользователь не найден'}, 404
+
+        return {
+            'success': True,
+            'username': username,
+            'rank': rank,
+            'high_score': leaderboard_index.score(username),
+            'total': len(leaderboard_index)
+        }, 200
 
-    leaderboard_data = [{
-        'username': username,
-        'high_score': data['high_score'],
-        'games_played': data['games_played']
-    } for username, data in sorted_users]
+    return response_cache.respond(('rank', username), (LEADERBOARD_TAG,), build)
 
-    return jsonify({'success': True, 'leaderboard': leaderboard_data})
+
+# Шаблоны компилируются при старте, а не первым запросом к странице
+with phase('templates'):
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)
 
 
 if __name__ == '__main__':
+    if '--startup-report' in sys.argv[1:]:
+        # Замер холодного старта в новом процессе (см. startup.py)
+        print_report(report())
+        sys.exit()
+
     # Создать директорию для шаблонов, если не существует
     os.makedirs('templates', exist_ok=True)
     os.makedirs('static', exist_ok=True)
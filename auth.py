@@ -8,12 +8,8 @@ class AuthManager:
     def login_user(self, username):
         """Login user and load their data"""
         self.current_user = username
-        user_data = self.db.get_user_data(username)
-        
-        # Ensure user data exists in database
-        self.db.save_user_data(username, user_data)
-        
-        return user_data
+        # Ensure user data exists in database without overwriting scores
+        return self.db.ensure_user(username)
     
     def get_user_stats(self, username):
         """Get user statistics"""
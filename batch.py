@@ -0,0 +1,267 @@
+import numpy as np
+from pieces import PIECE_TYPES, ROTATIONS, ROTATION_KICKS
+from engine import (ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE,
+                    ACTION_HARD_DROP, LINE_CLEAR_DURATION, LINE_CLEAR_FLASH_DELAY)
+from randomizer import create_randomizer, DEFAULT_RANDOMIZER
+from rules import (GRAVITY_MIN, GRAVITY_START, GRAVITY_STEP, LEVEL_POINTS, LINE_POINTS, SPAWN_ROW,
+                   fall_speed, spawn_column)
+
+# Number of piece types pre-generated per board at a time
+QUEUE_SIZE = 256
+
+
+def _rotation_table():
+    """Cell offsets for every piece type and rotation: arrays of shape (7, 4, 4)"""
+    dx = np.zeros((len(PIECE_TYPES), 4, 4), dtype=np.int32)
+    dy = np.zeros((len(PIECE_TYPES), 4, 4), dtype=np.int32)
+    for t, piece_type in enumerate(PIECE_TYPES):
+        for r, coords in enumerate(ROTATIONS[piece_type]):
+            for c, (cx, cy) in enumerate(coords):
+                dx[t, r, c] = cx
+                dy[t, r, c] = cy
+    return dx, dy
+
+
+CELL_DX, CELL_DY = _rotation_table()
+
+# Points by number of lines cleared at once, indexed by the per-board line count
+LINE_POINTS_TABLE = np.array(LINE_POINTS, dtype=np.int64)
+
+
+class BatchEngine:
+    """N independent games stepped in lockstep with NumPy.
+
+    Boards are stored as an (N, height) array of row bitmasks. Each call to
+    step() applies one action per board and then advances every board by
+    dt milliseconds, exactly like calling TetrisEngine.apply_action() and
+    TetrisEngine.update() on N scalar engines created with the same seeds.
+    """
+
+    def __init__(self, n, seeds=None, width=10, height=20, randomizer=DEFAULT_RANDOMIZER):
+        if seeds is None:
+            seeds = range(n)
+        seeds = list(seeds)
+        if len(seeds) != n:
+            raise ValueError("Need one seed per board")
+
+        self.n = n
+        self.width = width
+        self.height = height
+        self.full_mask = (1 << width) - 1
+        self.row_index = np.arange(height)
+
+        # Board and piece state
+        self.rows = np.zeros((n, height), dtype=np.int32)
+        self.piece = np.zeros(n, dtype=np.int32)
+        self.rotation = np.zeros(n, dtype=np.int32)
+        self.x = np.zeros(n, dtype=np.int32)
+        self.y = np.zeros(n, dtype=np.int32)
+        self.next_piece = np.zeros(n, dtype=np.int32)
+
+        # Scoring and timing
+        self.score = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.lines_cleared = np.zeros(n, dtype=np.int64)
+        self.pieces_placed = np.zeros(n, dtype=np.int64)
+        self.fall_time = np.zeros(n, dtype=np.float64)
+        self.fall_speed = np.full(n, fall_speed(1), dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+
+        # Line clearing state
+        self.clearing = np.zeros(n, dtype=bool)
+        self.clearing_rows = np.zeros((n, height), dtype=bool)
+        self.line_clear_animation_time = np.zeros(n, dtype=np.float64)
+        self.line_clear_flash_time = np.zeros(n, dtype=np.float64)
+
+        # Per-board randomizers, consumed in the same order as TetrisEngine.new_piece()
+        self.randomizers = [create_randomizer(randomizer, seed) for seed in seeds]
+        self.queue = np.zeros((n, QUEUE_SIZE), dtype=np.int32)
+        self.queue_pos = np.zeros(n, dtype=np.int32)
+        self._refill(np.arange(n))
+
+        # Same draw order as TetrisEngine.__init__: the first spawn takes a fresh
+        # piece and draws a next piece, which is then replaced by another draw
+        everyone = np.arange(n)
+        self.next_piece[:] = self._take(everyone)
+        self._spawn(everyone)
+        self.next_piece[:] = self._take(everyone)
+
+    def _refill(self, idx):
+        """Pre-generate piece types for the given boards"""
+        for i in idx:
+            self.queue[i] = np.frombuffer(self.randomizers[i].take(QUEUE_SIZE), dtype=np.uint8)
+            self.queue_pos[i] = 0
+
+    def _take(self, idx):
+        """Pop the next queued piece type for each board in idx"""
+        exhausted = idx[self.queue_pos[idx] >= QUEUE_SIZE]
+        if exhausted.size:
+            self._refill(exhausted)
+        types = self.queue[idx, self.queue_pos[idx]]
+        self.queue_pos[idx] += 1
+        return types
+
+    def collides(self, idx, x, y, rotation):
+        """Vectorized TetrisEngine.check_collision for boards idx"""
+        piece = self.piece[idx]
+        nx = x[:, None] + CELL_DX[piece, rotation]
+        ny = y[:, None] + CELL_DY[piece, rotation]
+        outside = (nx < 0) | (nx >= self.width) | (ny >= self.height)
+        cx = np.clip(nx, 0, self.width - 1)
+        cy = np.clip(ny, 0, self.height - 1)
+        filled = (self.rows[idx[:, None], cy] >> cx) & 1
+        occupied = (ny >= 0) & (filled == 1)
+        return np.any(outside | occupied, axis=1)
+
+    def _spawn(self, idx):
+        """Vectorized TetrisEngine.spawn_new_piece"""
+        if not idx.size:
+            return
+        self.piece[idx] = self.next_piece[idx]
+        self.rotation[idx] = 0
+        self.x[idx] = spawn_column(self.width)
+        self.y[idx] = SPAWN_ROW
+        self.game_over[idx] |= self.collides(idx, self.x[idx], self.y[idx], self.rotation[idx])
+        self.next_piece[idx] = self._take(idx)
+
+    def _move(self, idx, dx, dy):
+        """Vectorized TetrisEngine.move_piece; returns the per-board success mask"""
+        nx = self.x[idx] + dx
+        ny = self.y[idx] + dy
+        ok = ~self.collides(idx, nx, ny, self.rotation[idx])
+        moved = idx[ok]
+        self.x[moved] = nx[ok]
+        self.y[moved] = ny[ok]
+        return ok
+
+    def _rotate(self, idx):
+        """Vectorized TetrisEngine.rotate_piece including wall kicks"""
+        rotated = (self.rotation[idx] + 1) % 4
+        pending = np.ones(idx.size, dtype=bool)
+        for dx, dy in ROTATION_KICKS:
+            if not pending.any():
+                break
+            sub = idx[pending]
+            nx = self.x[sub] + dx
+            ny = self.y[sub] + dy
+            ok = ~self.collides(sub, nx, ny, rotated[pending])
+            done = sub[ok]
+            self.x[done] = nx[ok]
+            self.y[done] = ny[ok]
+            self.rotation[done] = rotated[pending][ok]
+            pending[np.flatnonzero(pending)[ok]] = False
+
+    def _place(self, idx):
+        """Vectorized TetrisEngine.place_piece"""
+        piece = self.piece[idx]
+        rotation = self.rotation[idx]
+        for c in range(4):
+            nx = self.x[idx] + CELL_DX[piece, rotation, c]
+            ny = self.y[idx] + CELL_DY[piece, rotation, c]
+            inside = (ny >= 0) & (ny < self.height) & (nx >= 0) & (nx < self.width)
+            self.rows[idx[inside], ny[inside]] |= 1 << nx[inside]
+        self.pieces_placed[idx] += 1
+
+    def _full_rows(self, idx):
+        """Boolean (len(idx), height) mask of completed rows"""
+        return self.rows[idx] == self.full_mask
+
+    def _start_line_clear(self, idx, full):
+        """Vectorized TetrisEngine.start_line_clear_animation"""
+        self.clearing[idx] = True
+        self.clearing_rows[idx] = full
+        self.line_clear_animation_time[idx] = 0
+        self.line_clear_flash_time[idx] = 0
+
+        lines = full.sum(axis=1)
+        self.lines_cleared[idx] += lines
+        self.score[idx] += LINE_POINTS_TABLE[np.minimum(lines, len(LINE_POINTS_TABLE) - 1)]
+
+        new_level = self.score[idx] // LEVEL_POINTS + 1
+        up = new_level > self.level[idx]
+        leveled = idx[up]
+        self.level[leveled] = new_level[up]
+        self.fall_speed[leveled] = np.maximum(GRAVITY_MIN, GRAVITY_START - (self.level[leveled] - 1) * GRAVITY_STEP)
+
+    def _finish_line_clear(self, idx):
+        """Vectorized TetrisEngine.finish_line_clear"""
+        full = self.clearing_rows[idx]
+        # Move cleared rows to the top (keeping the others in order), then empty them
+        order = np.argsort(np.where(full, -1, self.row_index), axis=1, kind='stable')
+        rows = np.take_along_axis(self.rows[idx], order, axis=1)
+        rows[self.row_index < full.sum(axis=1)[:, None]] = 0
+        self.rows[idx] = rows
+
+        self.clearing[idx] = False
+        self.clearing_rows[idx] = False
+        self.line_clear_animation_time[idx] = 0
+        self.line_clear_flash_time[idx] = 0
+        self._spawn(idx)
+
+    def _hard_drop(self, idx):
+        """Vectorized TetrisEngine.hard_drop"""
+        falling = idx
+        while falling.size:
+            falling = falling[self._move(falling, 0, 1)]
+        self._place(idx)
+
+        # Legacy immediate clear_lines()
+        full = self._full_rows(idx)
+        has_lines = full.any(axis=1)
+        cleared = idx[has_lines]
+        if cleared.size:
+            self._start_line_clear(cleared, full[has_lines])
+            self._finish_line_clear(cleared)
+        self._spawn(idx)
+
+    def apply_actions(self, actions):
+        """Apply one action per board (ACTION_* codes from engine.py)"""
+        actions = np.asarray(actions)
+        # Input is ignored during the line clear animation, as in TetrisEngine.apply_action
+        alive = ~self.game_over & ~self.clearing
+        for action, handler in ((ACTION_LEFT, lambda idx: self._move(idx, -1, 0)),
+                                (ACTION_RIGHT, lambda idx: self._move(idx, 1, 0)),
+                                (ACTION_SOFT_DROP, lambda idx: self._move(idx, 0, 1)),
+                                (ACTION_ROTATE, self._rotate),
+                                (ACTION_HARD_DROP, self._hard_drop)):
+            idx = np.flatnonzero(alive & (actions == action))
+            if idx.size:
+                handler(idx)
+
+    def update(self, dt):
+        """Advance every running board by dt milliseconds"""
+        alive = ~self.game_over
+        self.fall_time[alive] += dt
+
+        # Line clearing animation
+        clearing = alive & self.clearing
+        self.line_clear_animation_time[clearing] += dt
+        finished = clearing & (self.line_clear_animation_time >= LINE_CLEAR_DURATION)
+        flashing = clearing & ~finished & (self.line_clear_animation_time >= LINE_CLEAR_FLASH_DELAY)
+        self.line_clear_flash_time[flashing] += dt
+        if finished.any():
+            self._finish_line_clear(np.flatnonzero(finished))
+
+        # Natural piece falling (boards that just finished clearing skip this tick)
+        falling = np.flatnonzero(alive & ~self.clearing & ~finished & (self.fall_time >= self.fall_speed))
+        if falling.size:
+            landed = falling[~self._move(falling, 0, 1)]
+            if landed.size:
+                self._place(landed)
+                full = self._full_rows(landed)
+                has_lines = full.any(axis=1)
+                if has_lines.any():
+                    self._start_line_clear(landed[has_lines], full[has_lines])
+                self._spawn(landed[~has_lines])
+            self.fall_time[falling] = 0
+
+        return ~self.game_over
+
+    def step(self, actions, dt=16):
+        """Apply actions and advance time; returns the mask of running boards"""
+        self.apply_actions(actions)
+        return self.update(dt)
+
+    def board_rows(self, i):
+        """Row bitmasks of board i as a list (same layout as BitBoard.rows)"""
+        return self.rows[i].tolist()
@@ -0,0 +1,379 @@
+"""Benchmark suite for the engine, the pygame renderer and the web API.
+
+Runs headless (SDL's dummy video driver) and prints results as JSON:
+
+    python benchmarks.py --output bench.json
+    python benchmarks.py --only engine games --quick
+    python benchmarks.py --baseline bench.json --tolerance 0.15
+
+With --baseline, every result is compared against the saved run and the
+exit status is 1 if anything got slower by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from board import BOARD_BACKENDS
+from engine import TetrisEngine, ACTION_NONE, ACTION_HARD_DROP
+from pieces import ROTATIONS
+
+# Timed runs per benchmark; the best one is reported
+REPEAT = 5
+
+# Default allowed slowdown before a result counts as a regression
+TOLERANCE = 0.10
+
+
+def best_of(func, repeat=REPEAT):
+    """Run func() repeat times and return the shortest wall-clock time"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def rate(value):
+    return {'value': value, 'unit': 'ops/s', 'higher_is_better': True}
+
+
+def duration_ms(value):
+    return {'value': value * 1000, 'unit': 'ms', 'higher_is_better': False}
+
+
+def size_bytes(value):
+    return {'value': value, 'unit': 'bytes', 'higher_is_better': False}
+
+
+def scripted_boards(backend, count=32, seed=0):
+    """Engines with reproducible garbage stacks of varying height (one hole per row)"""
+    rng = random.Random(seed)
+    engines = []
+    for i in range(count):
+        engine = TetrisEngine(board_backend=backend, seed=i)
+        stack = rng.randrange(0, 15)
+        for y in range(engine.height - stack, engine.height):
+            hole = rng.randrange(engine.width)
+            for x in range(engine.width):
+                if x != hole:
+                    engine.board.place(x, y, ((0, 0),), (128, 128, 128))
+        engines.append(engine)
+    return engines
+
+
+def full_row_board(backend, rows=4):
+    """Board whose bottom rows are complete, ready for finish_line_clear()"""
+    engine = TetrisEngine(board_backend=backend, seed=0)
+    for y in range(engine.height - rows - 3, engine.height):
+        for x in range(engine.width):
+            if y >= engine.height - rows or x % 3:
+                engine.board.place(x, y, ((0, 0),), (0, 255, 255))
+    return engine
+
+
+def bench_engine(scale):
+    """Board hot paths of the game rules, for every board backend"""
+    results = {}
+    for backend in sorted(BOARD_BACKENDS):
+        engines = scripted_boards(backend)
+        # Every rotation state of every piece, tested the way the engine and
+        # the placement search do it (board.piece_collides)
+        probes = [(x, y, piece_type, rotation)
+                  for piece_type, rotations in ROTATIONS.items()
+                  for rotation in range(len(rotations))
+                  for x in range(-1, 11)
+                  for y in range(0, 20, 3)]
+        calls = len(engines) * len(probes) * scale
+
+        def collisions():
+            for _ in range(scale):
+                for engine in engines:
+                    check = engine.board.piece_collides
+                    for x, y, piece_type, rotation in probes:
+                        check(x, y, piece_type, rotation)
+        results[f'engine.check_collision[{backend}]'] = rate(calls / best_of(collisions))
+
+        rounds = 200 * scale
+
+        def lines():
+            for _ in range(rounds):
+                for engine in engines:
+                    engine.check_lines_to_clear()
+        results[f'engine.check_lines_to_clear[{backend}]'] = rate(
+            rounds * len(engines) / best_of(lines))
+
+        engine = full_row_board(backend)
+        full_rows = engine.check_lines_to_clear()
+        template = engine.board.copy()
+        clears = 500 * scale
+
+        def finish():
+            for _ in range(clears):
+                engine.board = template.copy()
+                engine.clearing_lines = full_rows
+                engine.finish_line_clear()
+        results[f'engine.finish_line_clear[{backend}]'] = rate(clears / best_of(finish))
+    return results
+
+
+def play_random_game(seed, max_ticks=20000, tick_ms=16):
+    """Seeded game of random inputs straight through the engine rules"""
+    engine = TetrisEngine(seed=seed)
+    rng = random.Random(seed)
+    actions = list(range(ACTION_NONE, ACTION_HARD_DROP + 1))
+    weights = [8, 2, 2, 1, 2, 1]
+    for _ in range(max_ticks):
+        engine.apply_action(rng.choices(actions, weights)[0])
+        if not engine.update(tick_ms):
+            break
+    return engine
+
+
+def bench_games(scale):
+    """Complete seeded games per second"""
+    from selfplay import play_game
+
+    results = {}
+    games = 20 * scale
+    results['games.random_inputs'] = rate(
+        games / best_of(lambda: [play_random_game(seed) for seed in range(games)], repeat=3))
+    bot_games = 2 * scale
+    results['games.greedy_bot_100_pieces'] = rate(
+        bot_games / best_of(lambda: [play_game(seed, 'greedy', 100) for seed in range(bot_games)],
+                            repeat=3))
+    return results
+
+
+def bench_snapshot(scale):
+    """Snapshot encoding of a game's state every 50 ms tick: speed and frame size"""
+    from snapshot import SnapshotEncoder, SnapshotDecoder, pack_state
+
+    states = []
+    for seed in range(5 * scale):
+        engine = TetrisEngine(seed=seed)
+        rng = random.Random(seed)
+        # Slower, human-like input than play_random_game so games last
+        actions = (1, 2, 3, 4, 5)
+        weights = (4, 4, 2, 3, 1)
+        while not engine.game_over and len(states) < 2000 * (seed + 1):
+            if rng.random() < 0.25:
+                engine.apply_action(rng.choices(actions, weights)[0])
+            engine.update(50)
+            states.append(pack_state(engine))
+
+    engine = TetrisEngine(seed=0)
+
+    def pack():
+        for _ in range(len(states)):
+            pack_state(engine)
+
+    frames = []
+
+    def encode():
+        encoder = SnapshotEncoder()
+        frames[:] = [frame for frame in map(encoder.encode, states) if frame is not None]
+
+    def decode():
+        decoder = SnapshotDecoder()
+        for frame in frames:
+            decoder.decode(frame)
+
+    results = {
+        'snapshot.pack_state': rate(len(states) / best_of(pack)),
+        'snapshot.encode': rate(len(states) / best_of(encode)),
+    }
+    results['snapshot.decode'] = rate(len(frames) / best_of(decode))
+    results['snapshot.bytes_per_tick'] = size_bytes(sum(map(len, frames)) / len(states))
+    results['snapshot.bytes_per_frame'] = size_bytes(sum(map(len, frames)) / len(frames))
+    return results
+
+
+def bench_render(scale):
+    """TetrisGame.draw() frame time off-screen, per render mode"""
+    import pygame
+    from game import TetrisGame, RENDER_MODES
+
+    pygame.init()
+    screen = pygame.display.set_mode((800, 600))
+    results = {}
+    frames = 300 * scale
+    for mode in RENDER_MODES:
+        def run():
+            game = TetrisGame(screen, 'bench', None, seed=1, render_mode=mode)
+            game.engine.board = scripted_boards('bitboard', count=1)[0].board
+            rng = random.Random(0)
+            draw_time = 0.0
+            for _ in range(frames):
+                if rng.random() < 0.1:
+                    game.engine.apply_action(rng.randrange(1, 5))
+                    game.sync_animation()
+                game.tick()
+                start = time.perf_counter()
+                game.draw()
+                draw_time += time.perf_counter() - start
+            return draw_time
+        results[f'render.draw[{mode}]'] = duration_ms(min(run() for _ in range(REPEAT)) / frames)
+    pygame.quit()
+    return results
+
+
+def bench_api(scale):
+    """Requests per second through Flask's test client (storage in a temp dir)"""
+    workdir = tempfile.mkdtemp(prefix='tetris-bench-')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    store = None
+    try:
+        from app import app, store
+
+        client = app.test_client()
+        users = [f'player{i}' for i in range(200)]
+        for name in users:
+            client.post('/api/login', json={'username': name})
+        requests = 100 * scale
+
+        def login():
+            for i in range(requests):
+                client.post('/api/login', json={'username': users[i % len(users)]})
+
+        def save_score():
+            for i in range(requests):
+                client.post('/api/save_score', json={'username': users[i % len(users)]})
+
+        batch = [{'username': name} for name in users[:100]]
+
+        def save_scores():
+            for _ in range(requests // len(batch)):
+                client.post('/api/save_scores', json={'results': batch})
+
+        def leaderboard():
+            for _ in range(requests):
+                client.get('/api/leaderboard')
+
+        etag = client.get('/api/leaderboard').headers.get('ETag', '')
+
+        def leaderboard_not_modified():
+            for _ in range(requests):
+                client.get('/api/leaderboard', headers={'If-None-Match': etag})
+
+        return {
+            'api.login': rate(requests / best_of(login, repeat=3)),
+            'api.save_score': rate(requests / best_of(save_score, repeat=3)),
+            # Results per second when submitted in batches of 100
+            'api.save_scores': rate(requests // len(batch) * len(batch) / best_of(save_scores, repeat=3)),
+            'api.leaderboard': rate(requests / best_of(leaderboard, repeat=3)),
+            'api.leaderboard_304': rate(requests / best_of(leaderboard_not_modified, repeat=3)),
+        }
+    finally:
+        if store is not None:
+            store.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+BENCHMARKS = {
+    'engine': bench_engine,
+    'games': bench_games,
+    'snapshot': bench_snapshot,
+    'render': bench_render,
+    'api': bench_api,
+}
+
+
+def run(names, scale=1):
+    """Run the selected benchmark groups; groups whose dependencies are missing are skipped"""
+    results = {}
+    skipped = {}
+    for name in names:
+        try:
+            results.update(BENCHMARKS[name](scale))
+        except ImportError as e:
+            skipped[name] = str(e)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'scale': scale,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """Per-benchmark change against a baseline report; returns (rows, regressions)"""
+    rows = []
+    regressions = []
+    base_results = baseline.get('results', {})
+    for name, result in sorted(report['results'].items()):
+        base = base_results.get(name)
+        if not base or not base['value']:
+            rows.append((name, result['value'], None, None))
+            continue
+        change = result['value'] / base['value'] - 1
+        # Positive speedup means faster, whichever direction the unit goes
+        speedup = change if result['higher_is_better'] else -change
+        rows.append((name, result['value'], base['value'], speedup))
+        if speedup < -tolerance:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_comparison(rows, regressions, file=sys.stderr):
+    for name, value, base, speedup in rows:
+        if base is None:
+            print(f"  {name:42s} {value:14.2f}  (new)", file=file)
+        else:
+            flag = '  REGRESSION' if name in regressions else ''
+            print(f"  {name:42s} {value:14.2f}  baseline {base:14.2f}  {speedup:+7.1%}{flag}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the TetrisBlitz benchmark suite")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="benchmark groups to run")
+    parser.add_argument('--quick', action='store_true', help="fewer iterations (noisier)")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--baseline', help="JSON report to compare against")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="allowed slowdown as a fraction (default 0.10)")
+    args = parser.parse_args(argv)
+
+    report = run(args.only or list(BENCHMARKS), scale=1 if args.quick else 5)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.tolerance)
+        report['baseline'] = {'path': args.baseline, 'regressions': regressions}
+        print_comparison(rows, regressions)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+            status = 1
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
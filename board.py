@@ -0,0 +1,263 @@
+from pieces import TETRIS_SHAPES, ROTATIONS, ROTATION_MASKS, row_masks
+from rules import GARBAGE_COLOR
+
+# Palette used by the compact color plane: index 0 is an empty cell,
+# indices 1..7 are the standard piece colors in TETRIS_SHAPES order,
+# the last index is garbage (GARBAGE_COLOR from rules.json).
+DEFAULT_PALETTE = [0] + [shape['color'] for shape in TETRIS_SHAPES.values()] + [GARBAGE_COLOR]
+
+# Cache of row masks for arbitrary coordinates: coords tuple -> (min_dx, width, ((dy, mask), ...)),
+# seeded with every rotation state of every piece
+_SHAPE_MASKS = {coords: masks
+                for piece_type, states in ROTATIONS.items()
+                for coords, masks in zip(states, ROTATION_MASKS[piece_type])}
+
+
+# Board width -> {type: ({x: ((dy, mask shifted to x), ...)}, ...) per rotation}
+_PLACED_MASKS = {}
+
+
+def placed_masks(width):
+    """Row masks of every rotation state already shifted to every x where it fits in width.
+
+    An x missing from a state's dict puts the piece outside the walls.
+    """
+    table = _PLACED_MASKS.get(width)
+    if table is None:
+        table = _PLACED_MASKS[width] = {
+            piece_type: tuple({x: tuple((dy, mask << (x + min_dx)) for dy, mask in masks)
+                               for x in range(-min_dx, width - width_ - min_dx + 1)}
+                              for min_dx, width_, masks in states)
+            for piece_type, states in ROTATION_MASKS.items()}
+    return table
+
+
+def shape_masks(coords):
+    """Return (min_dx, width, row masks) for a set of piece coordinates"""
+    key = tuple(coords)
+    masks = _SHAPE_MASKS.get(key)
+    if masks is None:
+        masks = _SHAPE_MASKS[key] = row_masks(key)
+    return masks
+
+
+class ListBoard:
+    """Original board: a list of rows holding color tuples (0 for empty)"""
+
+    def __init__(self, width=10, height=20):
+        self.width = width
+        self.height = height
+        self.grid = [[0 for _ in range(width)] for _ in range(height)]
+
+    def collides(self, x, y, coords):
+        """Check if a piece collides with the grid or boundaries"""
+        for dx, dy in coords:
+            nx, ny = x + dx, y + dy
+            if (nx < 0 or nx >= self.width or
+                ny >= self.height or
+                (ny >= 0 and self.grid[ny][nx])):
+                return True
+        return False
+
+    def piece_collides(self, x, y, piece_type, rotation):
+        """collides() for a rotation state of a piece"""
+        return self.collides(x, y, ROTATIONS[piece_type][rotation])
+
+    def place(self, x, y, coords, color):
+        """Write piece cells into the grid"""
+        for dx, dy in coords:
+            nx, ny = x + dx, y + dy
+            if 0 <= ny < self.height and 0 <= nx < self.width:
+                self.grid[ny][nx] = color
+
+    def full_rows(self):
+        """Return indices of completed rows"""
+        return [y for y in range(self.height) if all(self.grid[y])]
+
+    def clear_rows(self, rows):
+        """Remove the given rows and shift everything above down"""
+        if not rows:
+            return
+        # Delete every target row first: inserting as we go would shift the remaining indices
+        cleared = set(rows)
+        kept = [row for y, row in enumerate(self.grid) if y not in cleared]
+        self.grid = [[0 for _ in range(self.width)] for _ in range(self.height - len(kept))] + kept
+
+    def push_rows(self, count, hole, color):
+        """Insert count rows filled except column hole at the bottom, shifting the board up.
+
+        Returns True if filled cells were pushed off the top.
+        """
+        count = min(count, self.height)
+        overflow = any(any(row) for row in self.grid[:count])
+        row = [color] * self.width
+        row[hole] = 0
+        self.grid = self.grid[count:] + [row[:] for _ in range(count)]
+        return overflow
+
+    def get_cell(self, x, y):
+        """Return the color at (x, y) or 0 if empty"""
+        return self.grid[y][x]
+
+    def row_masks(self):
+        """Occupancy as a tuple of row bitmasks (bit x set when cell x is filled)"""
+        return tuple(sum(1 << x for x, cell in enumerate(row) if cell) for row in self.grid)
+
+    def copy(self):
+        """Create an independent copy of the board"""
+        board = ListBoard(self.width, self.height)
+        board.grid = [row[:] for row in self.grid]
+        return board
+
+
+class BitBoard:
+    """Board with one integer bitmask per row and a compact color plane.
+
+    Bit x of rows[y] is set when cell (x, y) is occupied; colors holds a
+    palette index per cell so the grid can still be drawn in color.
+    """
+
+    def __init__(self, width=10, height=20):
+        self.width = width
+        self.height = height
+        self.full_mask = (1 << width) - 1
+        self.rows = [0] * height
+        self.colors = bytearray(width * height)
+        self.palette = list(DEFAULT_PALETTE)
+        self.palette_index = {color: i for i, color in enumerate(self.palette) if color}
+        self.piece_masks = placed_masks(width)
+
+    @property
+    def grid(self):
+        """List-of-lists view of the board, as ListBoard stores it"""
+        palette = self.palette
+        colors = self.colors
+        w = self.width
+        return [[palette[c] for c in colors[y * w:(y + 1) * w]] for y in range(self.height)]
+
+    def collides(self, x, y, coords):
+        """Check if a piece collides with the grid or boundaries"""
+        masks = _SHAPE_MASKS.get(coords)
+        if masks is None:
+            masks = shape_masks(coords)
+        min_dx, width, masks = masks
+        shift = x + min_dx
+        if shift < 0 or shift + width > self.width:
+            return True
+        rows = self.rows
+        height = self.height
+        for dy, mask in masks:
+            ny = y + dy
+            if ny >= height:
+                return True
+            if ny >= 0 and rows[ny] & (mask << shift):
+                return True
+        return False
+
+    def piece_collides(self, x, y, piece_type, rotation):
+        """collides() for a rotation state of a piece, from placed_masks().
+
+        The hot path of the engine and the placement search: no hashing of
+        coordinates and no shifting, the masks are looked up already at x.
+        """
+        masks = self.piece_masks[piece_type][rotation].get(x)
+        if masks is None:
+            return True
+        rows = self.rows
+        height = self.height
+        for dy, mask in masks:
+            ny = y + dy
+            if ny >= height:
+                return True
+            if ny >= 0 and rows[ny] & mask:
+                return True
+        return False
+
+    def color_index(self, color):
+        """Return the palette index for a color, adding it if needed"""
+        index = self.palette_index.get(color)
+        if index is None:
+            index = len(self.palette)
+            self.palette.append(color)
+            self.palette_index[color] = index
+        return index
+
+    def place(self, x, y, coords, color):
+        """Write piece cells into the bitmasks and color plane"""
+        index = self.color_index(color)
+        for dx, dy in coords:
+            nx, ny = x + dx, y + dy
+            if 0 <= ny < self.height and 0 <= nx < self.width:
+                self.rows[ny] |= 1 << nx
+                self.colors[ny * self.width + nx] = index
+
+    def full_rows(self):
+        """Return indices of completed rows"""
+        full = self.full_mask
+        return [y for y, row in enumerate(self.rows) if row == full]
+
+    def clear_rows(self, rows):
+        """Remove the given rows and shift everything above down"""
+        if not rows:
+            return
+        cleared = set(rows)
+        w = self.width
+        kept = [y for y in range(self.height) if y not in cleared]
+        count = self.height - len(kept)
+        self.rows = [0] * count + [self.rows[y] for y in kept]
+        colors = bytearray(count * w)
+        for y in kept:
+            colors += self.colors[y * w:(y + 1) * w]
+        self.colors = colors
+
+    def push_rows(self, count, hole, color):
+        """Insert count rows filled except column hole at the bottom, shifting the board up.
+
+        Returns True if filled cells were pushed off the top.
+        """
+        count = min(count, self.height)
+        overflow = any(self.rows[:count])
+        w = self.width
+        index = self.color_index(color)
+        row_colors = bytes(0 if x == hole else index for x in range(w))
+        self.rows = self.rows[count:] + [self.full_mask & ~(1 << hole)] * count
+        self.colors = self.colors[count * w:] + row_colors * count
+        return overflow
+
+    def get_cell(self, x, y):
+        """Return the color at (x, y) or 0 if empty"""
+        return self.palette[self.colors[y * self.width + x]]
+
+    def row_masks(self):
+        """Occupancy as a tuple of row bitmasks (bit x set when cell x is filled)"""
+        return tuple(self.rows)
+
+    def copy(self):
+        """Create an independent copy of the board"""
+        board = BitBoard.__new__(BitBoard)
+        board.width = self.width
+        board.height = self.height
+        board.full_mask = self.full_mask
+        board.piece_masks = self.piece_masks
+        board.rows = self.rows[:]
+        board.colors = bytearray(self.colors)
+        board.palette = self.palette[:]
+        board.palette_index = dict(self.palette_index)
+        return board
+
+
+BOARD_BACKENDS = {
+    'list': ListBoard,
+    'bitboard': BitBoard,
+}
+
+DEFAULT_BACKEND = 'bitboard'
+
+
+def create_board(backend=DEFAULT_BACKEND, width=10, height=20):
+    """Create a board using the named backend"""
+    try:
+        board_class = BOARD_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown board backend: {backend}")
+    return board_class(width, height)
@@ -1,18 +1,48 @@
+import importlib.util
+import json
 import os
-try:
+from leaderboard import Leaderboard
+from sqlite_store import SQLiteUserStore
+
+# Replit DB is only imported when that backend is used: the replit package is
+# slow to import and the web service (app.py) never needs it
+REPLIT_DB_AVAILABLE = importlib.util.find_spec('replit') is not None
+
+def replit_db():
     from replit import db
-    REPLIT_DB_AVAILABLE = True
-except ImportError:
-    REPLIT_DB_AVAILABLE = False
-    # Fallback to file-based storage
-    import json
+    return db
+
+# Storage backend: 'replit', 'json' or 'sqlite'. By default Replit DB when
+# available, otherwise the JSON file. 'sqlite' is shared with app.py.
+DB_BACKENDS = ('replit', 'json', 'sqlite')
+DB_BACKEND = os.environ.get('TETRIS_DB_BACKEND')
+SQLITE_PATH = os.environ.get('TETRIS_DB_PATH', 'tetris.db')
+
+# Desktop and web user files imported into SQLite on first use
+JSON_FILES = ('tetris_users.json', 'web_tetris_users.json')
+
+def open_sqlite_store(path=SQLITE_PATH):
+    """Open the shared SQLite store, importing the old JSON files once"""
+    store = SQLiteUserStore(path)
+    store.migrate_json(JSON_FILES)
+    return store
 
 class DatabaseManager:
-    def __init__(self):
-        self.use_replit_db = REPLIT_DB_AVAILABLE
+    def __init__(self, backend=None):
+        backend = backend or DB_BACKEND or ('replit' if REPLIT_DB_AVAILABLE else 'json')
+        if backend not in DB_BACKENDS:
+            raise ValueError(f"Unknown database backend: {backend}")
+        if backend == 'replit' and not REPLIT_DB_AVAILABLE:
+            raise ValueError("Replit DB is not available")
+        self.backend = backend
+        self.use_replit_db = backend == 'replit'
+        self.replit = replit_db() if self.use_replit_db else None
+        self.sqlite = open_sqlite_store() if backend == 'sqlite' else None
         self.file_path = "tetris_users.json"
+        # Score index for json/replit, built from storage on the first get_leaderboard()
+        self.leaderboard = None
         
-        if not self.use_replit_db:
+        if backend == 'json':
             self.init_file_db()
     
     def init_file_db(self):
@@ -23,8 +53,11 @@ class DatabaseManager:
     
     def get_user_data(self, username):
         """Get user data from database"""
-        if self.use_replit_db:
-            return db.get(f"user_{username}", {
+        if self.sqlite:
+            data = self.sqlite.get_user(username) or {"high_score": 0, "games_played": 0}
+            return {"username": username, **data}
+        elif self.use_replit_db:
+            return self.replit.get(f"user_{username}", {
                 "username": username,
                 "high_score": 0,
                 "games_played": 0
@@ -45,10 +78,31 @@ class DatabaseManager:
                     "games_played": 0
                 }
     
+    def ensure_user(self, username):
+        """Create the user if missing and return their data"""
+        if self.sqlite:
+            # INSERT OR IGNORE: never touches an existing user's scores
+            data, _ = self.sqlite.create_user(username)
+            return {"username": username, **data}
+        if self.use_replit_db:
+            exists = f"user_{username}" in self.replit
+        else:
+            try:
+                with open(self.file_path, 'r') as f:
+                    exists = username in json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                exists = False
+        user_data = self.get_user_data(username)
+        if not exists:
+            self.save_user_data(username, user_data)
+        return user_data
+    
     def save_user_data(self, username, user_data):
         """Save user data to database"""
-        if self.use_replit_db:
-            db[f"user_{username}"] = user_data
+        if self.sqlite:
+            self.sqlite.save_user(username, user_data)
+        elif self.use_replit_db:
+            self.replit[f"user_{username}"] = user_data
         else:
             try:
                 with open(self.file_path, 'r') as f:
@@ -60,9 +114,16 @@ class DatabaseManager:
             
             with open(self.file_path, 'w') as f:
                 json.dump(data, f, indent=2)
+        
+        if self.leaderboard is not None:
+            self.leaderboard.set(username, user_data.get("high_score", 0))
     
     def update_user_score(self, username, score):
         """Update user's high score if the new score is higher"""
+        if self.sqlite:
+            # Increment and max in a single statement
+            return {"username": username, **self.sqlite.update_user_score(username, score)}
+        
         user_data = self.get_user_data(username)
         user_data["games_played"] += 1
         
@@ -74,19 +135,22 @@ class DatabaseManager:
     
     def get_leaderboard(self, limit=10):
         """Get top players (for future use)"""
-        if self.use_replit_db:
-            users = []
-            for key in db.keys():
-                if key.startswith("user_"):
-                    users.append(db[key])
-        else:
-            try:
-                with open(self.file_path, 'r') as f:
-                    data = json.load(f)
-                users = list(data.values())
-            except (FileNotFoundError, json.JSONDecodeError):
-                users = []
-        
-        # Sort by high score
-        users.sort(key=lambda x: x.get("high_score", 0), reverse=True)
-        return users[:limit]
+        if self.sqlite:
+            return [{"username": username, **data} for username, data in self.sqlite.top(limit)]
+        return [self.get_user_data(username) for _, username, _ in self.get_leaderboard_index().top(limit)]
+    
+    def get_leaderboard_index(self):
+        """Leaderboard of all users' high scores, loaded once and kept up to date on writes"""
+        if self.leaderboard is None:
+            if self.use_replit_db:
+                scores = [(key[len("user_"):], self.replit[key].get("high_score", 0))
+                          for key in self.replit.keys() if key.startswith("user_")]
+            else:
+                try:
+                    with open(self.file_path, 'r') as f:
+                        data = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    data = {}
+                scores = [(username, user.get("high_score", 0)) for username, user in data.items()]
+            self.leaderboard = Leaderboard(scores)
+        return self.leaderboard
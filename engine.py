@@ -0,0 +1,270 @@
+from pieces import TetrisPiece, ROTATION_KICKS
+from board import create_board, DEFAULT_BACKEND, GARBAGE_COLOR
+from randomizer import create_randomizer, DEFAULT_RANDOMIZER
+from rules import (LINE_CLEAR_DURATION, LINE_CLEAR_FLASH_DELAY, SPAWN_ROW, fall_speed,
+                   level_for_score, line_points, spawn_column)
+
+# Input actions understood by TetrisEngine.apply_action
+ACTION_NONE = 0
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_SOFT_DROP = 3
+ACTION_ROTATE = 4
+ACTION_HARD_DROP = 5
+
+
+class TetrisEngine:
+    """Pure game rules: no pygame, no wall clock.
+
+    The engine only advances when update() is called with an explicit
+    time step in milliseconds, so it can run headless and faster than
+    real time (bots, replay verification, load tests).
+    """
+
+    def __init__(self, width=10, height=20, board_backend=DEFAULT_BACKEND, seed=None,
+                 randomizer=DEFAULT_RANDOMIZER):
+        self.width = width
+        self.height = height
+        self.board = create_board(board_backend, width, height)
+        self.randomizer = create_randomizer(randomizer, seed)
+        self.seed = self.randomizer.seed
+
+        # Game state
+        self.current_piece = None
+        self.next_piece = None
+        self.score = 0
+        self.level = 1
+        self.lines_cleared = 0
+        self.fall_time = 0
+        self.fall_speed = fall_speed(1)  # milliseconds
+        self.paused = False
+        self.game_over = False
+        self.pieces_placed = 0
+
+        # Line clearing state
+        self.clearing_lines = []
+        self.line_clear_animation_time = 0
+        self.line_clear_flash_time = 0
+
+        # Garbage from a versus opponent waiting to rise: [(rows, hole column)]
+        self.pending_garbage = []
+
+        # Optional input recorder (see replay.ReplayRecorder)
+        self.recorder = None
+
+        # Initialize pieces
+        self.spawn_new_piece()
+        self.next_piece = self.new_piece()
+
+    def new_piece(self):
+        """Create the next piece from the engine's own randomizer"""
+        return TetrisPiece(self.randomizer.next())
+
+    def spawn_new_piece(self):
+        """Spawn a new piece at the top of the grid"""
+        if self.pending_garbage:
+            self.rise_garbage()
+
+        if self.next_piece:
+            self.current_piece = self.next_piece
+        else:
+            self.current_piece = self.new_piece()
+
+        self.current_piece.x = spawn_column(self.width)
+        self.current_piece.y = SPAWN_ROW
+
+        # Check for game over
+        piece = self.current_piece
+        if self.board.piece_collides(piece.x, piece.y, piece.type, piece.rotation):
+            self.game_over = True
+
+        self.next_piece = self.new_piece()
+
+    def queue_garbage(self, count, hole):
+        """Queue garbage rows (full except the hole column); they rise before the next piece spawns"""
+        self.pending_garbage.append((count, hole))
+
+    def rise_garbage(self):
+        """Push the queued garbage rows in from the bottom; overflowing the top ends the game"""
+        for count, hole in self.pending_garbage:
+            if self.board.push_rows(count, hole, GARBAGE_COLOR):
+                self.game_over = True
+        self.pending_garbage = []
+
+    def check_collision(self, x, y, coords):
+        """Check if a piece collides with the grid or boundaries"""
+        return self.board.collides(x, y, coords)
+
+    def place_piece(self):
+        """Place the current piece on the grid"""
+        if not self.current_piece:
+            return
+        self.board.place(self.current_piece.x, self.current_piece.y,
+                         self.current_piece.coords, self.current_piece.color)
+        self.pieces_placed += 1
+
+    def check_lines_to_clear(self):
+        """Check for completed lines and return them"""
+        return self.board.full_rows()
+
+    def start_line_clear_animation(self, lines_to_clear):
+        """Start the line clearing animation"""
+        self.clearing_lines = lines_to_clear
+        self.line_clear_animation_time = 0
+        self.line_clear_flash_time = 0
+
+        # Update score immediately
+        lines_cleared = len(lines_to_clear)
+        self.lines_cleared += lines_cleared
+
+        # Scoring and gravity curve from rules.json
+        self.score += line_points(lines_cleared)
+
+        new_level = level_for_score(self.score)
+        if new_level > self.level:
+            self.level = new_level
+            self.fall_speed = fall_speed(self.level)
+
+    def finish_line_clear(self):
+        """Complete the line clearing process"""
+        # Remove completed lines
+        self.board.clear_rows(self.clearing_lines)
+
+        # Reset animation state and spawn new piece
+        self.clearing_lines = []
+        self.line_clear_animation_time = 0
+        self.line_clear_flash_time = 0
+        self.spawn_new_piece()
+
+    def clear_lines(self):
+        """Legacy function for immediate line clearing (kept for compatibility)"""
+        lines_to_clear = self.check_lines_to_clear()
+        if lines_to_clear:
+            self.start_line_clear_animation(lines_to_clear)
+            self.finish_line_clear()
+
+    def move_piece(self, dx, dy):
+        """Move the current piece if the target position is free"""
+        piece = self.current_piece
+        if not piece:
+            return False
+        new_x = piece.x + dx
+        new_y = piece.y + dy
+
+        if not self.board.piece_collides(new_x, new_y, piece.type, piece.rotation):
+            piece.x = new_x
+            piece.y = new_y
+            return True
+        return False
+
+    def rotate_piece(self):
+        """Rotate the current piece"""
+        piece = self.current_piece
+        if not piece:
+            return
+        rotation = (piece.rotation + 1) % 4
+
+        # Try rotation at current position, then wall kicks
+        collides = self.board.piece_collides
+        for dx, dy in ROTATION_KICKS:
+            if not collides(piece.x + dx, piece.y + dy, piece.type, rotation):
+                piece.x += dx
+                piece.y += dy
+                piece.rotation = rotation
+                return
+
+    def hard_drop(self):
+        """Drop piece to the bottom instantly"""
+        while self.move_piece(0, 1):
+            pass
+        self.place_piece()
+        self.clear_lines()
+        self.spawn_new_piece()
+
+    def toggle_pause(self):
+        """Pause or resume the game"""
+        if not self.game_over:
+            self.paused = not self.paused
+            if self.recorder:
+                self.recorder.pause()
+
+    def apply_action(self, action):
+        """Apply one input action; ignored while paused, during a line clear or after game over"""
+        # The placed piece is still current_piece until the cleared rows are removed:
+        # a hard drop now would place it again and score the same rows twice
+        if self.game_over or self.paused or self.clearing_lines:
+            return
+        if self.recorder:
+            self.recorder.action(action)
+        if action == ACTION_LEFT:
+            self.move_piece(-1, 0)
+        elif action == ACTION_RIGHT:
+            self.move_piece(1, 0)
+        elif action == ACTION_SOFT_DROP:
+            self.move_piece(0, 1)
+        elif action == ACTION_ROTATE:
+            self.rotate_piece()
+        elif action == ACTION_HARD_DROP:
+            self.hard_drop()
+
+    def update(self, dt):
+        """Advance the game by dt milliseconds; returns False once the game is over"""
+        if self.game_over:
+            return False
+
+        if self.paused:
+            return True
+
+        if self.recorder:
+            self.recorder.frame(dt)
+
+        self.fall_time += dt
+
+        # Handle line clearing animation
+        if self.clearing_lines:
+            self.line_clear_animation_time += dt
+            if self.line_clear_animation_time >= LINE_CLEAR_DURATION:
+                self.finish_line_clear()
+                return True
+            elif self.line_clear_animation_time >= LINE_CLEAR_FLASH_DELAY:
+                self.line_clear_flash_time += dt
+
+        # Natural piece falling (only if not clearing lines)
+        if not self.clearing_lines and self.fall_time >= self.fall_speed:
+            if not self.move_piece(0, 1):
+                self.place_piece()
+                lines_cleared = self.check_lines_to_clear()
+                if lines_cleared:
+                    self.start_line_clear_animation(lines_cleared)
+                else:
+                    self.spawn_new_piece()
+            self.fall_time = 0
+
+        return True
+
+    def snapshot(self):
+        """Capture the full game state (used for replay seeking)"""
+        return {
+            'board': self.board.copy(),
+            'current_piece': self.current_piece.copy() if self.current_piece else None,
+            'next_piece': self.next_piece.copy() if self.next_piece else None,
+            'randomizer': self.randomizer.getstate(),
+            'garbage': list(self.pending_garbage),
+            'state': (self.score, self.level, self.lines_cleared, self.fall_time,
+                      self.fall_speed, self.paused, self.game_over, self.pieces_placed,
+                      list(self.clearing_lines), self.line_clear_animation_time,
+                      self.line_clear_flash_time),
+        }
+
+    def restore(self, snapshot):
+        """Restore a state captured by snapshot()"""
+        self.board = snapshot['board'].copy()
+        self.current_piece = snapshot['current_piece'].copy() if snapshot['current_piece'] else None
+        self.next_piece = snapshot['next_piece'].copy() if snapshot['next_piece'] else None
+        self.randomizer.setstate(snapshot['randomizer'])
+        self.pending_garbage = list(snapshot['garbage'])
+        (self.score, self.level, self.lines_cleared, self.fall_time,
+         self.fall_speed, self.paused, self.game_over, self.pieces_placed,
+         clearing_lines, self.line_clear_animation_time,
+         self.line_clear_flash_time) = snapshot['state']
+        self.clearing_lines = list(clearing_lines)
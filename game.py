@@ -1,10 +1,21 @@
 import pygame
-import random
 import time
-from pieces import TetrisPiece, TETRIS_SHAPES
+from engine import (TetrisEngine, ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP,
+                    ACTION_ROTATE, ACTION_HARD_DROP)
+from board import DEFAULT_BACKEND
+from randomizer import DEFAULT_RANDOMIZER
+from replay import ReplayRecorder
+from renderer import BlockSprites, DirtyRectRenderer, build_background
+from text_cache import get_font, get_overlay, render_text
+from timestep import STEP_MS
+
+RENDER_MODES = ('full', 'dirty')
 
 class TetrisGame:
-    def __init__(self, screen, username, auth_manager):
+    """Pygame front end: input, animation and drawing over a TetrisEngine"""
+
+    def __init__(self, screen, username, auth_manager, board_backend=DEFAULT_BACKEND, seed=None,
+                 randomizer=DEFAULT_RANDOMIZER, replay_path=None, render_mode='full'):
         self.screen = screen
         self.username = username
         self.auth_manager = auth_manager
@@ -16,6 +27,12 @@ class TetrisGame:
         self.GRID_X = 300
         self.GRID_Y = 50
         
+        # HUD layout
+        self.INFO_X = 50
+        self.NEXT_X = 600
+        self.NEXT_Y = 80
+        self.NEXT_BOX_SIZE = 120
+        
         # Modern Classic Color Palette
         self.BACKGROUND_COLOR = (224, 224, 224)  # Светло-серый фон
         self.GAME_FIELD_COLOR = (208, 208, 208)  # Игровое поле
@@ -24,134 +41,126 @@ class TetrisGame:
         self.WHITE = (255, 255, 255)
         self.LIGHT_GRAY = (200, 200, 200)
         
-        # Game state
-        self.grid = [[0 for _ in range(self.GRID_WIDTH)] for _ in range(self.GRID_HEIGHT)]
-        self.current_piece = None
-        self.next_piece = None
-        self.score = 0
-        self.level = 1
-        self.lines_cleared = 0
-        self.fall_time = 0
-        self.fall_speed = 500  # milliseconds
-        self.paused = False
-        self.game_over = False
+        # Game rules and state
+        self.engine = TetrisEngine(self.GRID_WIDTH, self.GRID_HEIGHT, board_backend, seed, randomizer)
+        
+        # Input recording: the engine only sees whole milliseconds so replays are exact
+        self.recorder = None
+        if replay_path:
+            self.recorder = ReplayRecorder.for_engine(self.engine, replay_path, username)
+        self.dt_remainder = 0.0
         
         # Animation system
         self.animation_time = 0
         self.piece_pos_x = 0.0  # Smooth floating position
         self.piece_pos_y = 0.0
+        self.prev_pos_x = 0.0  # Position at the previous simulation step
+        self.prev_pos_y = 0.0
+        self.render_alpha = 1.0
         self.target_pos_x = 0.0
         self.target_pos_y = 0.0
         self.move_animation_speed = 8.0  # Animation speed multiplier
-        
-        # Line clearing animation
-        self.clearing_lines = []
-        self.line_clear_animation_time = 0
-        self.line_clear_flash_time = 0
-        
-        # Initialize pieces
-        self.spawn_new_piece()
-        self.next_piece = TetrisPiece()
-        
-        # Fonts
-        self.font = pygame.font.Font(None, 24)
-        self.big_font = pygame.font.Font(None, 36)
+        self.animated_piece = None
+        self.sync_animation()
+        
+        # Fonts (shared, created once per size)
+        self.font = get_font(24)
+        self.big_font = get_font(36)
+        
+        # Rendering: cached block sprites, static background, optional dirty rectangles
+        self.sprites = BlockSprites(self.CELL_SIZE - 2)
+        self.preview_sprites = BlockSprites(16)
+        self.background = None
+        if render_mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {render_mode}")
+        self.render_mode = render_mode
+        self.renderer = DirtyRectRenderer(self) if render_mode == 'dirty' else None
         
         # Last update time
         self.last_time = time.time() * 1000
 
-    def spawn_new_piece(self):
-        """Spawn a new piece at the top of the grid"""
-        if self.next_piece:
-            self.current_piece = self.next_piece
-        else:
-            self.current_piece = TetrisPiece()
-        
-        self.current_piece.x = self.GRID_WIDTH // 2 - 1
-        self.current_piece.y = 0
-        
-        # Initialize smooth animation positions
-        self.piece_pos_x = float(self.current_piece.x)
-        self.piece_pos_y = float(self.current_piece.y)
-        self.target_pos_x = float(self.current_piece.x)
-        self.target_pos_y = float(self.current_piece.y)
-        
-        # Check for game over
-        if self.check_collision(self.current_piece.x, self.current_piece.y, self.current_piece.coords):
-            self.game_over = True
-        
-        self.next_piece = TetrisPiece()
+    # Read-only views of the engine state used by drawing and main.py
+    @property
+    def board(self):
+        return self.engine.board
+
+    @property
+    def grid(self):
+        """Grid of color tuples (0 for empty), regardless of board backend"""
+        return self.engine.board.grid
+
+    @property
+    def current_piece(self):
+        return self.engine.current_piece
+
+    @property
+    def next_piece(self):
+        return self.engine.next_piece
+
+    @property
+    def score(self):
+        return self.engine.score
+
+    @property
+    def level(self):
+        return self.engine.level
+
+    @property
+    def lines_cleared(self):
+        return self.engine.lines_cleared
+
+    @property
+    def fall_speed(self):
+        return self.engine.fall_speed
+
+    @property
+    def clearing_lines(self):
+        return self.engine.clearing_lines
+
+    @property
+    def line_clear_flash_time(self):
+        return self.engine.line_clear_flash_time
+
+    @property
+    def paused(self):
+        return self.engine.paused
+
+    @property
+    def game_over(self):
+        return self.engine.game_over
+
+    def sync_animation(self):
+        """Track the engine's piece: snap to new pieces, follow moves smoothly"""
+        piece = self.engine.current_piece
+        if piece is None:
+            return
+        if piece is not self.animated_piece:
+            # Initialize smooth animation positions for a freshly spawned piece
+            self.animated_piece = piece
+            self.piece_pos_x = self.prev_pos_x = float(piece.x)
+            self.piece_pos_y = self.prev_pos_y = float(piece.y)
+        self.target_pos_x = float(piece.x)
+        self.target_pos_y = float(piece.y)
 
     def check_collision(self, x, y, coords):
         """Check if a piece collides with the grid or boundaries"""
-        for dx, dy in coords:
-            nx, ny = x + dx, y + dy
-            if (nx < 0 or nx >= self.GRID_WIDTH or 
-                ny >= self.GRID_HEIGHT or 
-                (ny >= 0 and self.grid[ny][nx])):
-                return True
-        return False
-
-    def place_piece(self):
-        """Place the current piece on the grid"""
-        if not self.current_piece:
-            return
-        for dx, dy in self.current_piece.coords:
-            nx, ny = self.current_piece.x + dx, self.current_piece.y + dy
-            if 0 <= ny < self.GRID_HEIGHT and 0 <= nx < self.GRID_WIDTH:
-                self.grid[ny][nx] = self.current_piece.color
+        return self.engine.check_collision(x, y, coords)
 
-    def check_lines_to_clear(self):
-        """Check for completed lines and return them"""
-        lines_to_clear = []
-        
-        # Find completed lines
-        for y in range(self.GRID_HEIGHT):
-            if all(self.grid[y]):
-                lines_to_clear.append(y)
-        
-        return lines_to_clear
-    
-    def start_line_clear_animation(self, lines_to_clear):
-        """Start the line clearing animation"""
-        self.clearing_lines = lines_to_clear
-        self.line_clear_animation_time = 0
-        self.line_clear_flash_time = 0
-        
-        # Update score immediately
-        lines_cleared = len(lines_to_clear)
-        self.lines_cleared += lines_cleared
-        
-        # Scoring system: 1 line = 1 point, 2 lines = 4 points, 3 lines = 9 points, 4 lines = 16 points
-        points = lines_cleared ** 2
-        self.score += points
-        
-        # Level up every 500 points
-        new_level = (self.score // 500) + 1
-        if new_level > self.level:
-            self.level = new_level
-            # Increase fall speed with level (max speed cap)
-            self.fall_speed = max(50, 500 - (self.level - 1) * 30)
-    
-    def finish_line_clear(self):
-        """Complete the line clearing process"""
-        # Remove completed lines
-        for y in sorted(self.clearing_lines, reverse=True):
-            del self.grid[y]
-            self.grid.insert(0, [0 for _ in range(self.GRID_WIDTH)])
-        
-        # Reset animation state and spawn new piece
-        self.clearing_lines = []
-        self.line_clear_animation_time = 0
-        self.line_clear_flash_time = 0
-        self.spawn_new_piece()
-    
-    def clear_lines(self):
-        """Legacy function for immediate line clearing (kept for compatibility)"""
-        lines_to_clear = self.check_lines_to_clear()
-        if lines_to_clear:
-            self.start_line_clear_animation(lines_to_clear)
-            self.finish_line_clear()
+    def move_piece(self, dx, dy):
+        """Move the current piece with smooth animation"""
+        moved = self.engine.move_piece(dx, dy)
+        self.sync_animation()
+        return moved
+
+    def rotate_piece(self):
+        """Rotate the current piece"""
+        self.engine.rotate_piece()
+        self.sync_animation()
+
+    def hard_drop(self):
+        """Drop piece to the bottom instantly"""
+        self.engine.hard_drop()
+        self.sync_animation()
 
     def handle_input(self, event):
         """Handle keyboard input"""
@@ -161,7 +170,7 @@ class TetrisGame:
         if event.type == pygame.KEYDOWN:
             # Pause can be toggled even when paused
             if event.key == pygame.K_p:
-                self.paused = not self.paused
+                self.engine.toggle_pause()
                 return
             
             # Other controls only work when not paused
@@ -169,74 +178,50 @@ class TetrisGame:
                 return
                 
             if event.key == pygame.K_LEFT or event.key == pygame.K_a:
-                self.move_piece(-1, 0)
+                self.engine.apply_action(ACTION_LEFT)
             elif event.key == pygame.K_RIGHT or event.key == pygame.K_d:
-                self.move_piece(1, 0)
+                self.engine.apply_action(ACTION_RIGHT)
             elif event.key == pygame.K_DOWN or event.key == pygame.K_s:
-                self.move_piece(0, 1)
+                self.engine.apply_action(ACTION_SOFT_DROP)
             elif event.key == pygame.K_UP or event.key == pygame.K_w or event.key == pygame.K_SPACE:
-                self.rotate_piece()
+                self.engine.apply_action(ACTION_ROTATE)
             elif event.key == pygame.K_c:
-                self.hard_drop()
+                self.engine.apply_action(ACTION_HARD_DROP)
+            self.sync_animation()
 
-    def move_piece(self, dx, dy):
-        """Move the current piece with smooth animation"""
-        if not self.current_piece:
+    def update(self):
+        """Update game state with animations, advancing by the wall-clock time since the last call"""
+        if self.game_over:
+            self.close()
             return False
-        new_x = self.current_piece.x + dx
-        new_y = self.current_piece.y + dy
         
-        if not self.check_collision(new_x, new_y, self.current_piece.coords):
-            self.current_piece.x = new_x
-            self.current_piece.y = new_y
-            
-            # Update animation targets
-            self.target_pos_x = float(new_x)
-            self.target_pos_y = float(new_y)
-            
+        if self.paused:
             return True
-        return False
-
-    def rotate_piece(self):
-        """Rotate the current piece"""
-        if not self.current_piece:
-            return
-        rotated_coords = self.current_piece.get_rotated_coords()
-        
-        # Try rotation at current position
-        if not self.check_collision(self.current_piece.x, self.current_piece.y, rotated_coords):
-            self.current_piece.coords = rotated_coords
-            return
         
-        # Try wall kicks
-        kicks = [(1, 0), (-1, 0), (0, -1), (2, 0), (-2, 0)]
-        for dx, dy in kicks:
-            if not self.check_collision(self.current_piece.x + dx, self.current_piece.y + dy, rotated_coords):
-                self.current_piece.x += dx
-                self.current_piece.y += dy
-                self.current_piece.coords = rotated_coords
-                return
-
-    def hard_drop(self):
-        """Drop piece to the bottom instantly"""
-        while self.move_piece(0, 1):
-            pass
-        self.place_piece()
-        self.clear_lines()
-        self.spawn_new_piece()
+        current_time = time.time() * 1000
+        dt = current_time - self.last_time + self.dt_remainder
+        self.last_time = current_time
+        self.dt_remainder = dt - int(dt)
+        return self.advance(int(dt))
 
-    def update(self):
-        """Update game state with animations"""
+    def tick(self, dt=STEP_MS):
+        """Advance by one fixed simulation step (see timestep.FixedTimestep)"""
         if self.game_over:
+            self.close()
             return False
         
         if self.paused:
             return True
         
-        current_time = time.time() * 1000
-        dt = current_time - self.last_time
-        self.fall_time += dt
-        self.last_time = current_time
+        return self.advance(dt)
+
+    def advance(self, dt):
+        """Run the engine and the piece animation for dt whole milliseconds"""
+        self.prev_pos_x = self.piece_pos_x
+        self.prev_pos_y = self.piece_pos_y
+        
+        running = self.engine.update(dt)
+        self.sync_animation()
         
         # Update smooth piece position animations
         if self.current_piece:
@@ -252,122 +237,137 @@ class TetrisGame:
             if abs(self.piece_pos_y - self.target_pos_y) < 0.01:
                 self.piece_pos_y = self.target_pos_y
         
-        # Handle line clearing animation
-        if self.clearing_lines:
-            self.line_clear_animation_time += dt
-            if self.line_clear_animation_time >= 500:  # 0.5 seconds total
-                self.finish_line_clear()
-                return True
-            elif self.line_clear_animation_time >= 200:  # Flash for 0.2 seconds
-                self.line_clear_flash_time += dt
-        
-        # Natural piece falling (only if not clearing lines)
-        if not self.clearing_lines and self.fall_time >= self.fall_speed:
-            if not self.move_piece(0, 1):
-                self.place_piece()
-                lines_cleared = self.check_lines_to_clear()
-                if lines_cleared:
-                    self.start_line_clear_animation(lines_cleared)
-                else:
-                    self.spawn_new_piece()
-            self.fall_time = 0
-        
-        return True
+        return running
+
+    def set_interpolation(self, alpha):
+        """Draw the piece this far (0..1) between the previous and the latest step"""
+        self.render_alpha = alpha
+
+    def render_position(self):
+        """Piece position to draw, interpolated between simulation steps"""
+        alpha = self.render_alpha
+        if alpha >= 1.0:
+            return self.piece_pos_x, self.piece_pos_y
+        return (self.prev_pos_x + (self.piece_pos_x - self.prev_pos_x) * alpha,
+                self.prev_pos_y + (self.piece_pos_y - self.prev_pos_y) * alpha)
+
+    def close(self):
+        """Finish the replay recording, if any"""
+        if self.recorder:
+            self.recorder.close(self.score)
 
     def draw(self):
-        """Draw the game"""
-        # Fill background with light gray
-        self.screen.fill(self.BACKGROUND_COLOR)
-        
-        # Draw grid background
-        grid_rect = pygame.Rect(self.GRID_X, self.GRID_Y, 
-                               self.GRID_WIDTH * self.CELL_SIZE, 
-                               self.GRID_HEIGHT * self.CELL_SIZE)
-        pygame.draw.rect(self.screen, self.GAME_FIELD_COLOR, grid_rect)
-        
-        # Draw grid lines (subtle)
-        for x in range(self.GRID_WIDTH + 1):
-            pygame.draw.line(self.screen, self.GRID_LINE_COLOR,
-                           (self.GRID_X + x * self.CELL_SIZE, self.GRID_Y),
-                           (self.GRID_X + x * self.CELL_SIZE, self.GRID_Y + self.GRID_HEIGHT * self.CELL_SIZE), 1)
-        
-        for y in range(self.GRID_HEIGHT + 1):
-            pygame.draw.line(self.screen, self.GRID_LINE_COLOR,
-                           (self.GRID_X, self.GRID_Y + y * self.CELL_SIZE),
-                           (self.GRID_X + self.GRID_WIDTH * self.CELL_SIZE, self.GRID_Y + y * self.CELL_SIZE), 1)
+        """Draw the game.
+
+        In 'dirty' render mode returns the list of changed rectangles for
+        pygame.display.update(); returns None when the whole screen was
+        repainted and should be flipped.
+        """
+        if self.renderer:
+            return self.renderer.draw()
+        
+        # Background with the game field and grid lines already drawn
+        self.screen.blit(self.get_background(), (0, 0))
         
         # Draw placed pieces with modern flat style and line clearing animation
+        grid = self.grid
+        flashing = self.flashing_rows()
         for y in range(self.GRID_HEIGHT):
+            row = grid[y]
             for x in range(self.GRID_WIDTH):
-                if self.grid[y][x]:
-                    # Check if this line is being cleared
-                    is_clearing_line = y in self.clearing_lines
-                    flash_effect = False
-                    
-                    if is_clearing_line and self.line_clear_flash_time > 0:
-                        # Flash effect during line clearing
-                        flash_intensity = int((self.line_clear_flash_time / 50) % 2)
-                        flash_effect = flash_intensity == 1
-                    
-                    # Main block
-                    rect = pygame.Rect(self.GRID_X + x * self.CELL_SIZE + 1,
-                                     self.GRID_Y + y * self.CELL_SIZE + 1,
-                                     self.CELL_SIZE - 2, self.CELL_SIZE - 2)
-                    
-                    if flash_effect:
-                        # White flash during clearing
-                        pygame.draw.rect(self.screen, (255, 255, 255), rect)
-                    else:
-                        pygame.draw.rect(self.screen, self.grid[y][x], rect)
-                    
-                    # Subtle border for definition
-                    border_color = tuple(max(0, c - 30) for c in self.grid[y][x])
-                    pygame.draw.rect(self.screen, border_color, rect, 1)
-        
-        # Draw current piece with smooth animation
+                color = row[x]
+                if color:
+                    # White flash during clearing
+                    sprite = self.sprites.get(color, self.WHITE if y in flashing else None)
+                    self.screen.blit(sprite, (self.GRID_X + x * self.CELL_SIZE + 1,
+                                              self.GRID_Y + y * self.CELL_SIZE + 1))
+        
+        self.draw_current_piece()
+        
+        # Draw UI
+        self.draw_ui()
+        
+        if self.paused:
+            self.draw_pause_overlay()
+        return None
+
+    def invalidate(self):
+        """Repaint everything on the next draw (the screen was drawn over by a menu)"""
+        if self.renderer:
+            self.renderer.invalidate()
+
+    def get_background(self):
+        """Cached static background surface"""
+        if self.background is None:
+            self.background = build_background(self)
+        return self.background
+
+    def field_rect(self):
+        return pygame.Rect(self.GRID_X, self.GRID_Y,
+                           self.GRID_WIDTH * self.CELL_SIZE,
+                           self.GRID_HEIGHT * self.CELL_SIZE)
+
+    def stats_rect(self):
+        """Screen area of the score/level/lines panel"""
+        return pygame.Rect(self.INFO_X, 80, self.GRID_X - self.INFO_X - 10, 90)
+
+    def next_piece_rect(self):
+        """Screen area of the next piece panel (title and preview box)"""
+        return pygame.Rect(self.NEXT_X, self.NEXT_Y, self.NEXT_BOX_SIZE, 30 + self.NEXT_BOX_SIZE)
+
+    def flashing_rows(self):
+        """Rows drawn white in this phase of the line clear flash"""
+        if self.clearing_lines and self.line_clear_flash_time > 0:
+            # Flash effect during line clearing
+            if int((self.line_clear_flash_time / 50) % 2) == 1:
+                return self.clearing_lines
+        return ()
+
+    def draw_current_piece(self):
+        """Draw current piece with smooth animation; returns the drawn rectangles"""
+        rects = []
         if self.current_piece and not self.clearing_lines:
+            sprite = self.sprites.get(self.current_piece.color)
+            pos_x, pos_y = self.render_position()
             for dx, dy in self.current_piece.coords:
                 # Use animated position for smooth movement
-                px = self.piece_pos_x + dx
-                py = self.piece_pos_y + dy
-                
-                # Convert to pixel coordinates
-                pixel_x = self.GRID_X + px * self.CELL_SIZE + 1
-                pixel_y = self.GRID_Y + py * self.CELL_SIZE + 1
+                px = pos_x + dx
+                py = pos_y + dy
                 
                 # Only draw visible parts
                 if (0 <= px < self.GRID_WIDTH and py >= 0 and 
                     py < self.GRID_HEIGHT):
-                    rect = pygame.Rect(pixel_x, pixel_y, 
-                                     self.CELL_SIZE - 2, self.CELL_SIZE - 2)
-                    
-                    # Main block
-                    pygame.draw.rect(self.screen, self.current_piece.color, rect)
-                    
-                    # Subtle border for definition  
-                    border_color = tuple(max(0, c - 30) for c in self.current_piece.color)
-                    pygame.draw.rect(self.screen, border_color, rect, 1)
-        
-        # Draw UI
-        self.draw_ui()
-        
-        if self.paused:
-            self.draw_pause_overlay()
+                    # Convert to pixel coordinates
+                    rect = pygame.Rect(self.GRID_X + px * self.CELL_SIZE + 1,
+                                       self.GRID_Y + py * self.CELL_SIZE + 1,
+                                       self.CELL_SIZE - 2, self.CELL_SIZE - 2)
+                    self.screen.blit(sprite, rect)
+                    rects.append(rect)
+        return rects
 
     def draw_ui(self):
         """Draw user interface elements"""
-        # Information panel (left side, aligned)
-        info_x = 50
-        score_text = self.font.render(f"SCORE: {self.score}", True, self.TEXT_COLOR)
-        self.screen.blit(score_text, (info_x, 80))
+        self.draw_stats()
+        self.draw_controls()
         
-        level_text = self.font.render(f"LEVEL: {self.level}", True, self.TEXT_COLOR)
-        self.screen.blit(level_text, (info_x, 110))
+        # Next piece panel (right side)
+        self.draw_next_piece()
+
+    def draw_stats(self, surface=None):
+        """Information panel (left side, aligned)"""
+        surface = surface or self.screen
+        score_text = render_text(f"SCORE: {self.score}", 24, self.TEXT_COLOR)
+        surface.blit(score_text, (self.INFO_X, 80))
         
-        lines_text = self.font.render(f"LINES: {self.lines_cleared}", True, self.TEXT_COLOR)
-        self.screen.blit(lines_text, (info_x, 140))
+        level_text = render_text(f"LEVEL: {self.level}", 24, self.TEXT_COLOR)
+        surface.blit(level_text, (self.INFO_X, 110))
         
-        # Controls panel (left side, below info)
+        lines_text = render_text(f"LINES: {self.lines_cleared}", 24, self.TEXT_COLOR)
+        surface.blit(lines_text, (self.INFO_X, 140))
+
+    def draw_controls(self, surface=None):
+        """Controls panel (left side, below info)"""
+        surface = surface or self.screen
         controls_y_start = 200
         controls = [
             "CONTROLS:",
@@ -381,65 +381,53 @@ class TetrisGame:
         
         for i, text in enumerate(controls):
             color = self.TEXT_COLOR if i == 0 else self.LIGHT_GRAY
-            font_to_use = self.font if i == 0 else pygame.font.Font(None, 20)
-            control_text = font_to_use.render(text, True, color)
-            self.screen.blit(control_text, (info_x, controls_y_start + i * 22))
-        
-        # Next piece panel (right side)
-        self.draw_next_piece()
+            size = 24 if i == 0 else 20
+            control_text = render_text(text, size, color)
+            surface.blit(control_text, (self.INFO_X, controls_y_start + i * 22))
 
-    def draw_next_piece(self):
+    def draw_next_piece(self, surface=None):
         """Draw the next piece preview with modern styling"""
         if not self.next_piece:
             return
+        surface = surface or self.screen
         
         # Next piece box with title
-        next_x = 600
-        next_y = 80
-        box_width = 120
-        box_height = 120
+        next_x = self.NEXT_X
+        next_y = self.NEXT_Y
+        box_width = self.NEXT_BOX_SIZE
+        box_height = self.NEXT_BOX_SIZE
         
         # Draw title
-        title_text = self.font.render("NEXT", True, self.TEXT_COLOR)
-        self.screen.blit(title_text, (next_x, next_y))
+        title_text = render_text("NEXT", 24, self.TEXT_COLOR)
+        surface.blit(title_text, (next_x, next_y))
         
         # Draw preview box background
         preview_box = pygame.Rect(next_x, next_y + 30, box_width, box_height)
-        pygame.draw.rect(self.screen, self.WHITE, preview_box)
-        pygame.draw.rect(self.screen, self.LIGHT_GRAY, preview_box, 2)
+        pygame.draw.rect(surface, self.WHITE, preview_box)
+        pygame.draw.rect(surface, self.LIGHT_GRAY, preview_box, 2)
         
         # Center the piece in the box
         piece_center_x = next_x + box_width // 2
         piece_center_y = next_y + 30 + box_height // 2
         
+        sprite = self.preview_sprites.get(self.next_piece.color)
         for dx, dy in self.next_piece.coords:
             x = piece_center_x + dx * 18 - 9  # Center and scale
             y = piece_center_y + dy * 18 - 9
-            rect = pygame.Rect(x, y, 16, 16)
-            
-            # Main block
-            pygame.draw.rect(self.screen, self.next_piece.color, rect)
-            
-            # Subtle border
-            border_color = tuple(max(0, c - 30) for c in self.next_piece.color)
-            pygame.draw.rect(self.screen, border_color, rect, 1)
+            surface.blit(sprite, (x, y))
 
     def draw_pause_overlay(self):
         """Draw pause overlay with darkening effect"""
         # Dark semi-transparent overlay as specified
-        overlay = pygame.Surface((800, 600))
-        overlay.set_alpha(int(255 * 0.7))  # 70% transparency
-        overlay.fill((51, 51, 51))  # #333333 dark gray
+        overlay = get_overlay((800, 600), (51, 51, 51), int(255 * 0.7))  # 70% transparency, #333333
         self.screen.blit(overlay, (0, 0))
         
         # Large PAUSED text in white
-        pause_font = pygame.font.Font(None, 72)
-        pause_text = pause_font.render("PAUSED", True, (255, 255, 255))
+        pause_text = render_text("PAUSED", 72, (255, 255, 255))
         text_rect = pause_text.get_rect(center=(400, 280))
         self.screen.blit(pause_text, text_rect)
         
         # Instruction text below in white
-        instruction_font = pygame.font.Font(None, 28)
-        resume_text = instruction_font.render("Press P to resume or ESC for menu", True, (255, 255, 255))
+        resume_text = render_text("Press P to resume or ESC for menu", 28, (255, 255, 255))
         resume_rect = resume_text.get_rect(center=(400, 340))
         self.screen.blit(resume_text, resume_rect)
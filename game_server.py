@@ -0,0 +1,554 @@
+"""Server-authoritative multiplayer game server over WebSockets.
+
+    python game_server.py --port 8765
+    python game_server.py --load 2000 --url ws://127.0.0.1:8765 --duration 30
+    python game_server.py --bench 1000 2000 4000
+
+Every board is a TetrisEngine run on the server. One asyncio task advances
+all boards on a shared tick (TICK_MS); clients only send input actions and
+receive, once per tick, what changed on their match's boards. In versus
+matches clearing 2, 3 or 4 lines at once sends 1, 2 or 4 garbage rows to
+the opponent; the first player to top out loses.
+
+Protocol (JSON text messages):
+  client -> server  {"type": "join", "username": ..., "mode": "solo" | "versus"}
+                    {"type": "input", "action": 1..5}        (engine.ACTION_*)
+                    {"type": "matches"}                       (live matches to watch)
+                    {"type": "spectate", "match": id}
+                    {"type": "stats"}
+  server -> client  {"type": "start", "match": id, "board": i, "players": [...], "seed": n, "palette": [...]}
+                    {"type": "end", "winner": name or null, "scores": [...]}
+                    {"type": "spectating", "match": id, "players": [...], "palette": [...]}
+                    {"type": "matches", "matches": [...]} / {"type": "waiting"} /
+                    {"type": "error", "error": ...} / {"type": "stats", ...}
+  and one binary message per tick in which some board changed:
+                    b'T' + tick (u32) + per changed board: index (u8), length (u16),
+                    snapshot frame (see snapshot.py; static/snapshot.js decodes it)
+
+Snapshot frames are XOR deltas of the board state, usually about ten bytes;
+each tick message is encoded once per match and the same frame is written
+to every player and spectator of it (spectator.py). A spectator first gets
+a keyframe message of the current state.
+
+--load drives a running server with synthetic WebSocket clients; --bench
+runs the tick loop in-process with null connections to measure how many
+boards one core can host within the tick budget.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from array import array
+from collections import deque
+from urllib.parse import urlsplit
+
+from board import DEFAULT_PALETTE
+from engine import TetrisEngine, ACTION_LEFT, ACTION_HARD_DROP
+from snapshot import pack_state
+from spectator import SpectatorHub
+from ws_protocol import connect, serve
+
+DEFAULT_PORT = 8765
+
+# Shared simulation tick of every board (20 Hz)
+TICK_MS = 50
+
+# Inputs applied to a board per tick; the rest wait for the next tick
+MAX_INPUTS_PER_TICK = 4
+
+# Inputs queued per board; older ones are dropped when a client floods
+MAX_QUEUED_INPUTS = 32
+
+# Boards hosted at once before new players are turned away
+MAX_BOARDS = 5000
+
+# Unread outgoing bytes after which a slow client is disconnected
+MAX_BUFFERED = 256 * 1024
+
+# Garbage rows sent for clearing 0..4 lines at once
+GARBAGE_FOR_LINES = (0, 0, 1, 2, 4)
+
+# Tick durations kept for the statistics
+TICK_HISTORY = 1024
+
+# Live matches listed to spectators
+MAX_LISTED_MATCHES = 50
+
+MODES = ('solo', 'versus')
+
+# Colors of the cell indices in snapshots (None for empty)
+PALETTE = [None] + ['#%02x%02x%02x' % color for color in DEFAULT_PALETTE[1:]]
+
+
+def compact_json(payload):
+    return json.dumps(payload, separators=(',', ':'))
+
+
+class Player:
+    """A connected client and, during a match, its board"""
+
+    def __init__(self, ws, username='guest'):
+        self.ws = ws
+        self.username = username
+        self.match = None
+        self.index = 0
+        self.engine = None
+        self.inputs = deque(maxlen=MAX_QUEUED_INPUTS)
+        self.lines_seen = 0
+        self.sent_key = None
+
+    def start(self, match, index, seed):
+        self.match = match
+        self.index = index
+        self.engine = TetrisEngine(seed=seed)
+        self.inputs.clear()
+        self.lines_seen = 0
+        self.sent_key = None
+
+
+def state_key(engine):
+    """Cheap summary that changes whenever the packed state may have changed"""
+    piece = engine.current_piece
+    return (piece.x, piece.y, piece.rotation, engine.pieces_placed, len(engine.clearing_lines),
+            len(engine.pending_garbage), engine.game_over)
+
+
+def board_state(player):
+    """Packed state of a player's board, or None if it did not change"""
+    engine = player.engine
+    # On most ticks nothing moved, locked, cleared or arrived: skip packing the state
+    key = state_key(engine)
+    if key == player.sent_key:
+        return None
+    player.sent_key = key
+    return pack_state(engine)
+
+
+class Match:
+    """One solo board or two versus boards sharing a piece sequence"""
+
+    def __init__(self, match_id, players, mode, seed, channel):
+        self.id = match_id
+        self.players = players
+        self.mode = mode
+        self.seed = seed
+        # Snapshot encoders of the boards, shared by players and spectators
+        self.channel = channel
+        self.rng = random.Random(seed)
+        for index, player in enumerate(players):
+            player.start(self, index, seed)
+            # Spread gravity steps of different matches over the ticks so that
+            # matches started together do not all move their pieces on the same tick
+            player.engine.fall_time = seed % player.engine.fall_speed
+
+    def advance(self, dt):
+        """Apply queued inputs and run every board for dt milliseconds"""
+        for player in self.players:
+            engine = player.engine
+            inputs = player.inputs
+            for _ in range(min(len(inputs), MAX_INPUTS_PER_TICK)):
+                engine.apply_action(inputs.popleft())
+            engine.update(dt)
+        if self.mode == 'versus':
+            self.send_garbage()
+
+    def send_garbage(self):
+        """Turn this tick's line clears into garbage for the opponents"""
+        for player in self.players:
+            engine = player.engine
+            cleared = engine.lines_cleared - player.lines_seen
+            if not cleared:
+                continue
+            player.lines_seen = engine.lines_cleared
+            rows = GARBAGE_FOR_LINES[min(cleared, 4)]
+            if rows:
+                hole = self.rng.randrange(engine.width)
+                for other in self.players:
+                    if other is not player and not other.engine.game_over:
+                        other.engine.queue_garbage(rows, hole)
+
+    def frame(self, tick):
+        """Encoded binary tick message with every changed board, or None"""
+        return self.channel.encode_tick(tick, [board_state(player) for player in self.players])
+
+    def finished(self):
+        # Solo: the only board topped out; versus (two boards): either did
+        for player in self.players:
+            if player.engine.game_over:
+                return True
+        return False
+
+    def winner(self):
+        if self.mode == 'solo':
+            return None
+        alive = [player for player in self.players if not player.engine.game_over]
+        return alive[0].username if len(alive) == 1 else None
+
+
+class GameServer:
+    """Matchmaking, the shared tick loop and the per-connection protocol"""
+
+    def __init__(self, tick_ms=TICK_MS, max_boards=MAX_BOARDS):
+        self.tick_ms = tick_ms
+        self.max_boards = max_boards
+        self.matches = {}
+        self.waiting = None
+        self.next_match_id = 1
+        self.boards = 0
+        self.connections = 0
+        self.ticks = 0
+        self.overruns = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.dropped_clients = 0
+        self.tick_times = array('d', bytes(8 * TICK_HISTORY))
+        self.spectators = SpectatorHub()
+        self.match_list = None
+
+    # Connections
+
+    async def handle(self, ws):
+        """Serve one client connection until it closes"""
+        player = Player(ws)
+        viewer = None
+        self.connections += 1
+        try:
+            while True:
+                message = await ws.recv()
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    continue
+                if not isinstance(data, dict):
+                    continue
+                kind = data.get('type')
+                if kind == 'input':
+                    action = data.get('action')
+                    if player.match is not None and type(action) is int \
+                            and ACTION_LEFT <= action <= ACTION_HARD_DROP:
+                        player.inputs.append(action)
+                elif kind == 'join':
+                    if viewer is not None:
+                        self.spectators.unsubscribe(viewer)
+                    self.join(player, data.get('mode', 'solo'), data.get('username'))
+                elif kind == 'matches':
+                    ws.send(self.list_matches())
+                elif kind == 'spectate':
+                    self.leave(player)
+                    viewer = self.spectate(ws, data.get('match'), viewer) or viewer
+                elif kind == 'stats':
+                    ws.send(compact_json({'type': 'stats', **self.stats()}))
+        finally:
+            self.connections -= 1
+            self.leave(player)
+            if viewer is not None:
+                self.spectators.unsubscribe(viewer)
+
+    def join(self, player, mode, username=None):
+        """Put a player into a new match (or the versus queue)"""
+        if mode not in MODES:
+            player.ws.send(compact_json({'type': 'error', 'error': 'unknown mode'}))
+            return
+        self.leave(player)
+        if isinstance(username, str) and username.strip():
+            player.username = username.strip()[:32]
+        if self.boards + (2 if mode == 'versus' else 1) > self.max_boards:
+            player.ws.send(compact_json({'type': 'error', 'error': 'server full'}))
+            return
+        if mode == 'solo':
+            self.start_match([player], mode)
+        elif self.waiting is None:
+            self.waiting = player
+            player.ws.send(compact_json({'type': 'waiting'}))
+        else:
+            opponent, self.waiting = self.waiting, None
+            self.start_match([opponent, player], mode)
+
+    def leave(self, player):
+        """Remove a player from the queue or forfeit its match"""
+        if self.waiting is player:
+            self.waiting = None
+        match = player.match
+        if match is not None:
+            player.engine.game_over = True
+            self.finish(match)
+
+    def start_match(self, players, mode):
+        match_id = self.next_match_id
+        self.next_match_id += 1
+        names = [player.username for player in players]
+        channel = self.spectators.open(match_id, len(players), {'mode': mode, 'players': names})
+        match = Match(match_id, players, mode, random.getrandbits(32), channel)
+        self.matches[match_id] = match
+        self.match_list = None
+        self.boards += len(players)
+        for player in players:
+            player.ws.send(compact_json({
+                'type': 'start', 'match': match_id, 'board': player.index, 'mode': mode,
+                'players': names, 'seed': match.seed, 'tick_ms': self.tick_ms, 'palette': PALETTE,
+            }))
+        return match
+
+    def list_matches(self):
+        """Live matches for spectators (the oldest MAX_LISTED_MATCHES), encoded once per change"""
+        if self.match_list is None:
+            matches = []
+            for match in self.matches.values():
+                matches.append({'match': match.id, 'mode': match.mode,
+                                'players': [player.username for player in match.players],
+                                'viewers': len(match.channel.viewers)})
+                if len(matches) == MAX_LISTED_MATCHES:
+                    break
+            self.match_list = compact_json({'type': 'matches', 'matches': matches})
+        return self.match_list
+
+    def spectate(self, ws, match_id, viewer=None):
+        """Subscribe a connection to a match's feed; returns its Viewer or None"""
+        match = self.matches.get(match_id)
+        if match is None:
+            ws.send(compact_json({'type': 'error', 'error': 'no such match'}))
+            return None
+        ws.send(compact_json({
+            'type': 'spectating', 'match': match.id, 'mode': match.mode,
+            'players': [player.username for player in match.players],
+            'tick_ms': self.tick_ms, 'palette': PALETTE,
+        }))
+        return self.spectators.subscribe(ws, match.id, viewer)
+
+    def finish(self, match):
+        """End a match and tell its players the result"""
+        if self.matches.pop(match.id, None) is None:
+            return
+        self.match_list = None
+        self.boards -= len(match.players)
+        message = compact_json({
+            'type': 'end', 'match': match.id, 'winner': match.winner(),
+            'scores': [player.engine.score for player in match.players],
+        })
+        self.spectators.close(match.id, message)
+        for player in match.players:
+            player.match = None
+            if not player.ws.closed:
+                player.ws.send(message)
+
+    # Tick loop
+
+    def broadcast(self, players, frame):
+        for player in players:
+            ws = player.ws
+            if ws.closed:
+                continue
+            ws.send_frame(frame)
+            self.frames_sent += 1
+            self.bytes_sent += len(frame)
+            if ws.buffered() > MAX_BUFFERED:
+                # Never let one slow reader make the server buffer without bound
+                self.dropped_clients += 1
+                ws.abort()
+
+    def tick(self):
+        """Advance every match by one tick and send the changed boards"""
+        self.ticks += 1
+        finished = []
+        for match in self.matches.values():
+            match.advance(self.tick_ms)
+            frame = match.frame(self.ticks)
+            if frame is not None:
+                self.broadcast(match.players, frame)
+                self.spectators.publish(match.channel, frame)
+            if match.finished():
+                finished.append(match)
+        for match in finished:
+            self.finish(match)
+
+    def timed_tick(self):
+        start = time.perf_counter()
+        self.tick()
+        self.tick_times[self.ticks % TICK_HISTORY] = (time.perf_counter() - start) * 1000
+
+    async def run(self):
+        """Tick forever at tick_ms; missed ticks are skipped, not run back to back"""
+        loop = asyncio.get_running_loop()
+        interval = self.tick_ms / 1000
+        next_time = loop.time()
+        while True:
+            next_time += interval
+            self.timed_tick()
+            delay = next_time - loop.time()
+            if delay < 0:
+                self.overruns += 1
+                next_time = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        samples = sorted(self.tick_times[:min(self.ticks, TICK_HISTORY)]) or [0.0]
+        return {
+            'boards': self.boards,
+            'matches': len(self.matches),
+            'connections': self.connections,
+            'ticks': self.ticks,
+            'tick_ms': self.tick_ms,
+            'tick_p50_ms': samples[len(samples) // 2],
+            'tick_p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            'tick_max_ms': samples[-1],
+            'overruns': self.overruns,
+            'frames_sent': self.frames_sent,
+            'bytes_sent': self.bytes_sent,
+            'dropped_clients': self.dropped_clients,
+            'spectators': self.spectators.stats(),
+        }
+
+
+async def run_server(host, port, tick_ms, max_boards):
+    server = GameServer(tick_ms, max_boards)
+    listener = await serve(server.handle, host, port, backlog=1024)
+    print(f"Game server on ws://{host}:{port} ({tick_ms} ms tick, up to {max_boards} boards)")
+    async with listener:
+        await server.run()
+
+
+# Load generation
+
+RANDOM_ACTIONS = (1, 2, 3, 4, 5)
+RANDOM_WEIGHTS = (4, 4, 2, 3, 1)
+
+
+async def synthetic_client(host, port, mode, seed, deadline, input_rate, totals, connecting):
+    """Join matches and send random inputs until the deadline, rejoining after each game"""
+    rng = random.Random(seed)
+    async with connecting:
+        ws = await connect(host, port)
+    join = compact_json({'type': 'join', 'username': f'bot{seed}', 'mode': mode})
+    ws.send(join)
+
+    async def receive():
+        while True:
+            message = await ws.recv()
+            totals['messages'] += 1
+            totals['bytes'] += len(message)
+            if isinstance(message, str) and message.startswith('{"type":"end"'):
+                totals['games'] += 1
+                ws.send(join)
+
+    receiver = asyncio.ensure_future(receive())
+    try:
+        loop = asyncio.get_running_loop()
+        while loop.time() < deadline and not receiver.done():
+            await asyncio.sleep(rng.expovariate(input_rate))
+            action = rng.choices(RANDOM_ACTIONS, RANDOM_WEIGHTS)[0]
+            ws.send(compact_json({'type': 'input', 'action': action}))
+            totals['inputs'] += 1
+    finally:
+        receiver.cancel()
+        try:
+            await ws.close()
+        except ConnectionError:
+            pass
+
+
+async def run_load(url, boards, duration, input_rate, mode):
+    """Connect boards synthetic clients to a running server and report both sides' numbers"""
+    address = urlsplit(url)
+    host, port = address.hostname, address.port or DEFAULT_PORT
+    totals = {'messages': 0, 'bytes': 0, 'inputs': 0, 'games': 0}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    # Open connections a hundred at a time so the listen backlog does not overflow
+    connecting = asyncio.Semaphore(100)
+
+    start = loop.time()
+    results = await asyncio.gather(
+        *(synthetic_client(host, port, mode, seed, deadline, input_rate, totals, connecting)
+          for seed in range(boards)),
+        return_exceptions=True)
+    elapsed = loop.time() - start
+    failed = sum(isinstance(result, Exception) for result in results)
+
+    ws = await connect(host, port)
+    ws.send(compact_json({'type': 'stats'}))
+    server_stats = json.loads(await ws.recv())
+    await ws.close()
+    return {
+        'clients': boards,
+        'failed_clients': failed,
+        'seconds': elapsed,
+        'inputs_per_s': totals['inputs'] / elapsed,
+        'messages_per_s': totals['messages'] / elapsed,
+        'kbytes_per_s': totals['bytes'] / elapsed / 1024,
+        'games_finished': totals['games'],
+        'server': server_stats,
+    }
+
+
+class NullSocket:
+    """Stands in for a client connection in --bench: frames are counted, not sent"""
+
+    closed = False
+
+    def __init__(self):
+        self.sent_bytes = 0
+
+    def send_frame(self, frame):
+        self.sent_bytes += len(frame)
+
+    def send(self, message):
+        self.sent_bytes += len(message)
+
+    def buffered(self):
+        return 0
+
+    def abort(self):
+        self.closed = True
+
+
+def bench(boards, seconds, input_rate, tick_ms=TICK_MS, seed=0):
+    """Run the tick loop back to back for boards versus players; returns tick timings"""
+    rng = random.Random(seed)
+    server = GameServer(tick_ms, max_boards=boards)
+    players = [Player(NullSocket(), f'bot{i}') for i in range(boards)]
+    input_chance = input_rate * tick_ms / 1000
+    for tick in range(int(seconds * 1000 / tick_ms)):
+        for player in players:
+            if player.match is None and server.waiting is not player:
+                server.join(player, 'versus')
+            elif player.match is not None and rng.random() < input_chance:
+                player.inputs.append(rng.choices(RANDOM_ACTIONS, RANDOM_WEIGHTS)[0])
+        server.timed_tick()
+    stats = server.stats()
+    stats['tick_budget_used'] = stats['tick_p99_ms'] / tick_ms
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multiplayer Tetris game server over WebSockets")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--tick-ms', type=int, default=TICK_MS)
+    parser.add_argument('--max-boards', type=int, default=MAX_BOARDS)
+    parser.add_argument('--load', type=int, metavar='BOARDS', help="run synthetic clients against --url")
+    parser.add_argument('--url', default=f'ws://127.0.0.1:{DEFAULT_PORT}')
+    parser.add_argument('--mode', choices=MODES, default='versus', help="match type of synthetic clients")
+    parser.add_argument('--duration', type=float, default=20.0, help="seconds of load")
+    parser.add_argument('--input-rate', type=float, default=5.0, help="inputs per second per board")
+    parser.add_argument('--bench', type=int, nargs='+', metavar='BOARDS',
+                        help="measure in-process tick time for these board counts")
+    args = parser.parse_args()
+
+    if args.bench:
+        for boards in args.bench:
+            stats = bench(boards, args.duration, args.input_rate, args.tick_ms)
+            print(json.dumps({'boards': boards, **stats}))
+    elif args.load:
+        print(json.dumps(asyncio.run(run_load(args.url, args.load, args.duration, args.input_rate, args.mode)),
+                         indent=2))
+    else:
+        try:
+            asyncio.run(run_server(args.host, args.port, args.tick_ms, args.max_boards))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
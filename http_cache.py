@@ -0,0 +1,141 @@
+"""Cache of pre-serialized JSON responses with ETag / Last-Modified support.
+
+Read endpoints build their payload once; the serialized bytes are kept
+until a write invalidates one of the entry's tags (for example
+'leaderboard' or 'user:<name>'). Every response carries a content-hash
+ETag and Last-Modified, and conditional requests that still match get an
+empty 304 without touching storage or the serializer.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from flask import Response, json, request
+
+# Cached responses kept before the least recently used are dropped
+CACHE_SIZE = 4096
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'last_modified', 'modified_time')
+
+    def __init__(self, body, modified_time):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.modified_time = int(modified_time)
+        self.last_modified = formatdate(self.modified_time, usegmt=True)
+
+
+class ResponseCache:
+    """LRU of serialized 200 responses, invalidated by tag"""
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.tags = {}
+        # Invalidation count per tag (and for clear()): a response built while
+        # one of its tags was invalidated is returned but not cached
+        self.generations = {}
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, *tags):
+        """Drop every cached response built from data with any of these tags"""
+        with self.lock:
+            for tag in tags:
+                self.generations[tag] = self.generations.get(tag, 0) + 1
+                for key in self.tags.pop(tag, ()):
+                    entry = self.entries.pop(key, None)
+                    if entry is not None:
+                        self._untag(key, entry[1], skip=tag)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self.epoch += 1
+
+    def _generation(self, tags):
+        return self.epoch, tuple(self.generations.get(tag, 0) for tag in tags)
+
+    def _untag(self, key, tags, skip=None):
+        for tag in tags:
+            if tag != skip:
+                keys = self.tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.tags[tag]
+
+    def get(self, key, tags, build):
+        """Cached response for key, or build() -> (payload, status) and cache it if 200.
+
+        Returns (CachedResponse or None, payload, status); payload is only
+        set when the response was not cacheable.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], None, 200
+            self.misses += 1
+            generation = self._generation(tags)
+        payload, status = build()
+        if status != 200:
+            return None, payload, status
+        cached = CachedResponse(json.dumps(payload).encode('utf-8') + b'\n', time.time())
+        with self.lock:
+            if self._generation(tags) != generation:
+                # Invalidated while building: the data may predate the write
+                return cached, None, 200
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self._untag(key, old[1])
+            self.entries[key] = (cached, tuple(tags))
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                old_key, (_, old_tags) = self.entries.popitem(last=False)
+                self._untag(old_key, old_tags)
+        return cached, None, 200
+
+    def respond(self, key, tags, build):
+        """Flask response for a cached GET endpoint, answering 304 when the client is current"""
+        cached, payload, status = self.get(key, tags, build)
+        if cached is None:
+            return Response(json.dumps(payload) + '\n', status, mimetype='application/json')
+        # Clients may store the response but must revalidate it on every poll
+        return cached_response(cached, 'no-cache')
+
+
+def cached_response(cached, cache_control):
+    """Flask response for a CachedResponse: 304 if the request's validators match"""
+    headers = {
+        'ETag': cached.etag,
+        'Last-Modified': cached.last_modified,
+        'Cache-Control': cache_control,
+    }
+    if not_modified(cached):
+        return Response(status=304, headers=headers)
+    return Response(cached.body, 200, headers=headers, mimetype='application/json')
+
+
+def not_modified(cached):
+    """Whether the request's validators match the cached response"""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # ETags take precedence over dates
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or cached.etag in candidates or 'W/' + cached.etag in candidates
+    if_modified_since = request.headers.get('If-Modified-Since')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return False
+        return cached.modified_time <= since
+    return False
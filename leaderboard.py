@@ -0,0 +1,159 @@
+"""Incrementally maintained leaderboards.
+
+Leaderboard keeps every player's best score in a list sorted by
+(-score, username) and updates it with bisect on each score write, so the
+top N, a page of ranks, or one player's rank never require sorting all
+players. It is built from storage once at startup; scores other processes
+write later are applied one by one (app.sync_shared_store).
+
+PeriodLeaderboards keeps one such board per day and per ISO week for the
+current periods; a new board starts empty when the period changes. With a
+store (sqlite_store.SQLiteUserStore) period results are also saved, so they
+survive restarts and are shared by every process using the database.
+"""
+import datetime
+import threading
+import time
+from bisect import bisect_left, insort
+
+
+class Leaderboard:
+    """Best score per player, ordered by score (descending) then name"""
+
+    def __init__(self, scores=()):
+        self.lock = threading.Lock()
+        self._load(scores)
+
+    def _load(self, scores):
+        self.scores = {}
+        for username, score in scores:
+            if score > self.scores.get(username, -1):
+                self.scores[username] = score
+        self.entries = sorted((-score, username) for username, score in self.scores.items())
+
+    def merge(self, scores):
+        """Raise players' scores to the given ones, e.g. re-read from storage.
+
+        Runs under the lock and only ever keeps the better score, so a
+        concurrent update() is never overwritten by an older snapshot.
+        """
+        with self.lock:
+            for username, score in scores:
+                if score > self.scores.get(username, -1):
+                    self.scores[username] = score
+            self.entries = sorted((-score, username) for username, score in self.scores.items())
+
+    @classmethod
+    def from_store(cls, store):
+        """Build from a user store's (username, high_score) pairs"""
+        return cls(store.scores())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, username):
+        return username in self.scores
+
+    def update(self, username, score):
+        """Record a score; keeps the best one. Returns True if the board changed"""
+        with self.lock:
+            old = self.scores.get(username)
+            if old is not None:
+                if score <= old:
+                    return False
+                del self.entries[bisect_left(self.entries, (-old, username))]
+            self.scores[username] = score
+            insort(self.entries, (-score, username))
+            return True
+
+    def set(self, username, score):
+        """Replace a player's score, even with a lower one"""
+        with self.lock:
+            old = self.scores.get(username)
+            if old is not None:
+                del self.entries[bisect_left(self.entries, (-old, username))]
+            self.scores[username] = score
+            insort(self.entries, (-score, username))
+
+    def remove(self, username):
+        with self.lock:
+            old = self.scores.pop(username, None)
+            if old is not None:
+                del self.entries[bisect_left(self.entries, (-old, username))]
+
+    def score(self, username):
+        return self.scores.get(username)
+
+    def rank(self, username):
+        """1-based rank of a player, or None if the player has no score"""
+        with self.lock:
+            score = self.scores.get(username)
+            if score is None:
+                return None
+            return bisect_left(self.entries, (-score, username)) + 1
+
+    def page(self, offset=0, limit=10):
+        """Entries offset..offset+limit as (rank, username, score)"""
+        with self.lock:
+            entries = self.entries[offset:offset + limit]
+        return [(offset + i + 1, username, -negative_score)
+                for i, (negative_score, username) in enumerate(entries)]
+
+    def top(self, limit=10):
+        return self.page(0, limit)
+
+
+PERIODS = ('daily', 'weekly')
+
+
+def period_key(period, timestamp=None):
+    """Identifier of the day or ISO week containing timestamp (UTC)"""
+    day = datetime.datetime.fromtimestamp(time.time() if timestamp is None else timestamp,
+                                          datetime.timezone.utc).date()
+    if period == 'daily':
+        return day.isoformat()
+    if period == 'weekly':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    raise ValueError(f"Unknown period: {period}")
+
+
+class PeriodLeaderboards:
+    """Daily and weekly boards of the best score set within the current period"""
+
+    def __init__(self, clock=time.time, store=None):
+        self.clock = clock
+        self.store = store
+        self.lock = threading.Lock()
+        self.boards = {}
+
+    def board(self, period):
+        """Board of the current day or week, started empty (or from the store) when the period changes"""
+        key = period_key(period, self.clock())
+        with self.lock:
+            current = self.boards.get(period)
+            if current is None or current[0] != key:
+                scores = self.store.period_scores(key) if self.store is not None else ()
+                current = (key, Leaderboard(scores))
+                self.boards[period] = current
+            return current[1]
+
+    def record(self, username, score):
+        """Add a finished game's score to every period board"""
+        boards = [(period_key(period, self.clock()), self.board(period)) for period in PERIODS]
+        if self.store is not None:
+            self.store.record_period_scores([(key, username, score) for key, _ in boards])
+        for _, board in boards:
+            board.update(username, score)
+
+    def apply(self, key, username, score):
+        """Add a score another process saved for period key (only if that board is loaded)"""
+        with self.lock:
+            boards = [board for board_key, board in self.boards.values() if board_key == key]
+        for board in boards:
+            board.update(username, score)
+
+    def reload(self):
+        """Drop the boards so they are read from the store again"""
+        with self.lock:
+            self.boards.clear()
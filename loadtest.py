@@ -0,0 +1,161 @@
+"""HTTP load generator for the web API (serve.py / app.py).
+
+    python loadtest.py --url http://127.0.0.1:5000 --concurrency 16 --duration 10
+    python loadtest.py --url http://127.0.0.1:5000 --target-p99 50
+
+Each client thread keeps one connection open and sends a mix of requests:
+leaderboard, rank and stats polls (with If-None-Match, as the browser
+does) and unverified score saves. Reports requests per second and latency
+percentiles. With --target-p99 the concurrency is doubled until the 99th
+percentile latency exceeds the target, and the best rate within it is
+reported. Results are printed as JSON.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+USERS = 200
+
+# Share of each request kind in the mix (the rest are leaderboard polls)
+SAVE_SHARE = 0.1
+RANK_SHARE = 0.15
+STATS_SHARE = 0.15
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Client(threading.Thread):
+    """One keep-alive connection sending requests until the deadline"""
+
+    def __init__(self, host, port, seed, deadline):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+        self.etags = {}
+
+    def request(self, conn, method, path, body=None):
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        elif path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        response.read()
+        etag = response.getheader('ETag')
+        if etag:
+            self.etags[path] = etag
+        return response.status
+
+    def next_request(self):
+        username = f'load{self.rng.randrange(USERS)}'
+        roll = self.rng.random()
+        if roll < SAVE_SHARE:
+            return 'POST', '/api/save_score', {'username': username}
+        roll -= SAVE_SHARE
+        if roll < RANK_SHARE:
+            return 'GET', f'/api/rank/{username}', None
+        roll -= RANK_SHARE
+        if roll < STATS_SHARE:
+            return 'GET', f'/api/stats/{username}', None
+        return 'GET', '/api/leaderboard', None
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        while time.perf_counter() < self.deadline:
+            method, path, body = self.next_request()
+            start = time.perf_counter()
+            try:
+                status = self.request(conn, method, path, body)
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                self.errors += 1
+        conn.close()
+
+
+def register_users(host, port):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    for i in range(USERS):
+        conn.request('POST', '/api/login', json.dumps({'username': f'load{i}'}),
+                     {'Content-Type': 'application/json'})
+        conn.getresponse().read()
+    conn.close()
+
+
+def run_load(host, port, concurrency, duration):
+    """Drive the server with concurrency clients for duration seconds"""
+    deadline = time.perf_counter() + duration
+    clients = [Client(host, port, seed, deadline) for seed in range(concurrency)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': sum(client.errors for client in clients),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per run")
+    parser.add_argument('--target-p99', type=float, metavar='MS',
+                        help="find the highest rate whose p99 latency stays under MS")
+    parser.add_argument('--max-concurrency', type=int, default=256)
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    register_users(host, port)
+    # Other workers see the new users after their next sync (app.SYNC_INTERVAL)
+    time.sleep(1.5)
+
+    if args.target_p99 is None:
+        print(json.dumps(run_load(host, port, args.concurrency, args.duration), indent=2))
+        return
+
+    runs = []
+    best = None
+    concurrency = 1
+    while concurrency <= args.max_concurrency:
+        result = run_load(host, port, concurrency, args.duration)
+        runs.append(result)
+        if result['p99_ms'] > args.target_p99:
+            break
+        if best is None or result['rps'] > best['rps']:
+            best = result
+        concurrency *= 2
+    print(json.dumps({'target_p99_ms': args.target_p99, 'best': best, 'runs': runs}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,37 @@
+import atexit
+import os
 import pygame
 import sys
 from game import TetrisGame
 from auth import AuthManager
+from replay import replay_filename
+from text_cache import get_overlay, render_text
+from timestep import FixedTimestep
+from profiler import create_profiler
+
+# 'dirty' redraws only changed screen areas, 'full' repaints every frame
+RENDER_MODE = os.environ.get('TETRIS_RENDER_MODE', 'dirty')
+
+# Rendering frame rate cap; the game logic always runs at a fixed 125 Hz
+MAX_FPS = int(os.environ.get('TETRIS_MAX_FPS', 60))
+
+# Frame timing (TETRIS_PROFILE=1); a no-op unless enabled
+profiler = create_profiler()
+atexit.register(profiler.dump)
+
+def new_game(screen, username, auth_manager):
+    """Start a game that records its replay to the replays directory"""
+    game = TetrisGame(screen, username, auth_manager, replay_path=replay_filename(username),
+                      render_mode=RENDER_MODE)
+    profiler.instrument(game)
+    return game
+
+def present(rects):
+    """Show a drawn frame: only the dirty rectangles, or the whole screen"""
+    if rects is None:
+        pygame.display.flip()
+    elif rects:
+        pygame.display.update(rects)
 
 def main():
     """Main entry point for the Tetris game"""
@@ -27,41 +57,70 @@ def main():
             sys.exit()
     
     # Initialize game
-    game = TetrisGame(screen, username, auth_manager)
+    game = new_game(screen, username, auth_manager)
+    timestep = FixedTimestep()
     
-    # Main game loop
+    # Main game loop: fixed simulation steps, rendering as often as MAX_FPS allows
     running = True
     while running:
+        profiler.begin_frame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
+                if event.key == pygame.K_F3 and profiler.enabled:
+                    # Toggle the frame timing overlay
+                    profiler.toggle_overlay()
+                    game.invalidate()
+                elif event.key == pygame.K_ESCAPE:
                     # Show menu
                     action = show_menu(screen, clock, auth_manager, username)
                     if action == "quit":
                         running = False
                     elif action == "restart":
-                        game = TetrisGame(screen, username, auth_manager)
+                        game.close()
+                        game = new_game(screen, username, auth_manager)
                     elif action == "stats":
                         show_stats(screen, clock, auth_manager, username)
+                    # The menu drew over the game screen and its time doesn't count
+                    game.invalidate()
+                    timestep.reset()
                 else:
                     game.handle_input(event)
         
-        if not game.update():
+        profiler.mark('input')
+        
+        game_running = True
+        for _ in range(timestep.advance()):
+            if not game.tick():
+                game_running = False
+                break
+        
+        if not game_running:
             # Game over
             action = show_game_over(screen, clock, game.score, auth_manager, username)
             if action == "play_again":
-                game = TetrisGame(screen, username, auth_manager)
+                game = new_game(screen, username, auth_manager)
             elif action == "main_menu":
                 # Return to main menu
                 main()
                 return
-        
-        game.draw()
-        pygame.display.flip()
-        clock.tick(60)
+            timestep.reset()
+        
+        profiler.mark('update')
+        
+        game.set_interpolation(timestep.alpha)
+        rects = game.draw()
+        profiler.mark('draw')
+        overlay_rect = profiler.draw_overlay(screen)
+        if overlay_rect and rects is not None:
+            rects.append(overlay_rect)
+        present(rects)
+        profiler.mark('present')
+        clock.tick(MAX_FPS)
+        profiler.end_frame()
     
+    game.close()
     pygame.quit()
     sys.exit()
 
@@ -74,9 +133,6 @@ def show_login_screen(screen, clock, auth_manager):
     INPUT_BG_COLOR = (255, 255, 255)
     INPUT_BORDER_COLOR = (150, 150, 150)
     
-    font = pygame.font.Font(None, 48)  # Larger title
-    input_font = pygame.font.Font(None, 24)
-    small_font = pygame.font.Font(None, 18)
     username = ""
     
     while True:
@@ -98,15 +154,15 @@ def show_login_screen(screen, clock, auth_manager):
         screen.fill(BACKGROUND_COLOR)
         
         # Title
-        title = font.render("TETRIS", True, TEXT_COLOR)
+        title = render_text("TETRIS", 48, TEXT_COLOR)
         screen.blit(title, (400 - title.get_width() // 2, 180))
         
         # Subtitle
-        subtitle = input_font.render("Modern Classic Edition", True, TEXT_COLOR)
+        subtitle = render_text("Modern Classic Edition", 24, TEXT_COLOR)
         screen.blit(subtitle, (400 - subtitle.get_width() // 2, 230))
         
         # Instructions
-        inst = input_font.render("Enter your username:", True, TEXT_COLOR)
+        inst = render_text("Enter your username:", 24, TEXT_COLOR)
         screen.blit(inst, (400 - inst.get_width() // 2, 290))
         
         # Input box with modern styling
@@ -115,7 +171,7 @@ def show_login_screen(screen, clock, auth_manager):
         pygame.draw.rect(screen, INPUT_BORDER_COLOR, input_rect, 2)
         
         # Username text
-        text_surface = input_font.render(username, True, TEXT_COLOR)
+        text_surface = render_text(username, 24, TEXT_COLOR)
         screen.blit(text_surface, (input_rect.x + 8, input_rect.y + 8))
         
         # Blinking cursor animation
@@ -127,7 +183,7 @@ def show_login_screen(screen, clock, auth_manager):
                            (cursor_x, input_rect.y + 26), 2)
         
         # Enter instruction
-        enter_text = small_font.render("Press ENTER to start", True, (120, 120, 120))
+        enter_text = render_text("Press ENTER to start", 18, (120, 120, 120))
         screen.blit(enter_text, (400 - enter_text.get_width() // 2, 380))
         
         pygame.display.flip()
@@ -142,9 +198,6 @@ def show_menu(screen, clock, auth_manager, username):
     MENU_BORDER_COLOR = (150, 150, 150)
     SELECTED_COLOR = (100, 100, 255)
     
-    font = pygame.font.Font(None, 36)
-    small_font = pygame.font.Font(None, 24)
-    
     menu_items = [
         ("Resume", "resume"),
         ("Restart", "restart"),
@@ -169,9 +222,7 @@ def show_menu(screen, clock, auth_manager, username):
                     return menu_items[selected][1]
         
         # Semi-transparent overlay
-        overlay = pygame.Surface((800, 600))
-        overlay.set_alpha(180)
-        overlay.fill(BACKGROUND_COLOR)
+        overlay = get_overlay((800, 600), BACKGROUND_COLOR, 180)
         screen.blit(overlay, (0, 0))
         
         # Menu box with modern styling
@@ -180,13 +231,13 @@ def show_menu(screen, clock, auth_manager, username):
         pygame.draw.rect(screen, MENU_BORDER_COLOR, menu_rect, 2)
         
         # Title
-        title = font.render("PAUSED", True, TEXT_COLOR)
+        title = render_text("PAUSED", 36, TEXT_COLOR)
         screen.blit(title, (400 - title.get_width() // 2, 230))
         
         # Menu items
         for i, (text, action) in enumerate(menu_items):
             color = SELECTED_COLOR if i == selected else TEXT_COLOR
-            item_text = small_font.render(text, True, color)
+            item_text = render_text(text, 24, color)
             screen.blit(item_text, (400 - item_text.get_width() // 2, 270 + i * 35))
         
         pygame.display.flip()
@@ -200,10 +251,6 @@ def show_stats(screen, clock, auth_manager, username):
     STATS_BG_COLOR = (255, 255, 255)
     STATS_BORDER_COLOR = (150, 150, 150)
     
-    font = pygame.font.Font(None, 36)
-    small_font = pygame.font.Font(None, 24)
-    tiny_font = pygame.font.Font(None, 18)
-    
     stats = auth_manager.get_user_stats(username)
     
     while True:
@@ -219,23 +266,23 @@ def show_stats(screen, clock, auth_manager, username):
         pygame.draw.rect(screen, STATS_BORDER_COLOR, stats_rect, 2)
         
         # Title
-        title = font.render("STATISTICS", True, TEXT_COLOR)
+        title = render_text("STATISTICS", 36, TEXT_COLOR)
         screen.blit(title, (400 - title.get_width() // 2, 210))
         
         # Username
-        username_text = small_font.render(f"Player: {username}", True, TEXT_COLOR)
+        username_text = render_text(f"Player: {username}", 24, TEXT_COLOR)
         screen.blit(username_text, (400 - username_text.get_width() // 2, 280))
         
         # High score
-        score_text = small_font.render(f"Best Score: {stats['high_score']}", True, TEXT_COLOR)
+        score_text = render_text(f"Best Score: {stats['high_score']}", 24, TEXT_COLOR)
         screen.blit(score_text, (400 - score_text.get_width() // 2, 320))
         
         # Games played
-        games_text = small_font.render(f"Games Played: {stats['games_played']}", True, TEXT_COLOR)
+        games_text = render_text(f"Games Played: {stats['games_played']}", 24, TEXT_COLOR)
         screen.blit(games_text, (400 - games_text.get_width() // 2, 360))
         
         # Instructions
-        inst = tiny_font.render("Press any key to return", True, (120, 120, 120))
+        inst = render_text("Press any key to return", 18, (120, 120, 120))
         screen.blit(inst, (400 - inst.get_width() // 2, 420))
         
         pygame.display.flip()
@@ -273,31 +320,24 @@ def show_game_over(screen, clock, score, auth_manager, username):
         fade_alpha = min(180, fade_alpha + 3)
         
         # Dark semi-transparent overlay
-        overlay = pygame.Surface((800, 600))
-        overlay.set_alpha(fade_alpha)
-        overlay.fill((51, 51, 51))  # #333333 dark gray
+        overlay = get_overlay((800, 600), (51, 51, 51), fade_alpha)  # #333333 dark gray
         screen.blit(overlay, (0, 0))
         
         if fade_alpha >= 180:  # Only show content when fully faded
             # Large GAME OVER text in white
-            title_font = pygame.font.Font(None, 64)
-            title = title_font.render("GAME OVER", True, (255, 255, 255))
+            title = render_text("GAME OVER", 64, (255, 255, 255))
             screen.blit(title, (400 - title.get_width() // 2, 150))
             
-            # Score information
-            score_font = pygame.font.Font(None, 32)
-            
             # New record notification
             if is_new_record:
-                record_text = score_font.render("NEW RECORD!", True, (100, 255, 100))
+                record_text = render_text("NEW RECORD!", 32, (100, 255, 100))
                 screen.blit(record_text, (400 - record_text.get_width() // 2, 220))
             
             # Final score
-            final_score_text = score_font.render(f"FINAL SCORE: {score}", True, (255, 255, 255))
+            final_score_text = render_text(f"FINAL SCORE: {score}", 32, (255, 255, 255))
             screen.blit(final_score_text, (400 - final_score_text.get_width() // 2, 260))
             
             # Menu buttons
-            button_font = pygame.font.Font(None, 28)
             button_y_start = 350
             button_height = 40
             button_width = 180
@@ -318,7 +358,7 @@ def show_game_over(screen, clock, score, auth_manager, username):
                     text_color = (255, 255, 255)
                 
                 # Button text
-                button_text = button_font.render(text, True, text_color)
+                button_text = render_text(text, 28, text_color)
                 text_x = button_rect.x + (button_width - button_text.get_width()) // 2
                 text_y = button_rect.y + (button_height - button_text.get_height()) // 2
                 screen.blit(button_text, (text_x, text_y))
@@ -340,9 +380,6 @@ def show_main_menu(screen, clock):
     BUTTON_TEXT_HOVER_COLOR = (255, 255, 255)
     DECORATIVE_ALPHA = 30
     
-    title_font = pygame.font.Font(None, 64)
-    button_font = pygame.font.Font(None, 32)
-    
     menu_items = [
         ("НОВАЯ ИГРА", "new_game"),
         ("ВЫХОД", "quit")
@@ -364,6 +401,13 @@ def show_main_menu(screen, clock):
             'size': random.randint(40, 80)
         })
     
+    # Decorative surfaces never change, so render them once
+    for piece in decorative_pieces:
+        surf = pygame.Surface((piece['size'], piece['size']), pygame.SRCALPHA)
+        color_with_alpha = (*piece['color'], DECORATIVE_ALPHA)
+        surf.fill(color_with_alpha)
+        piece['surface'] = pygame.transform.rotate(surf, piece['rotation'])
+    
     fade_alpha = 0
     fade_in = True
     
@@ -389,26 +433,19 @@ def show_main_menu(screen, clock):
         
         # Draw decorative background tetrominos
         for piece in decorative_pieces:
-            surf = pygame.Surface((piece['size'], piece['size']), pygame.SRCALPHA)
-            color_with_alpha = (*piece['color'], DECORATIVE_ALPHA)
-            surf.fill(color_with_alpha)
-            rotated_surf = pygame.transform.rotate(surf, piece['rotation'])
-            screen.blit(rotated_surf, (piece['x'], piece['y']))
+            screen.blit(piece['surface'], (piece['x'], piece['y']))
         
         # Apply fade overlay
         if fade_alpha < 255:
-            fade_overlay = pygame.Surface((800, 600))
-            fade_overlay.set_alpha(255 - fade_alpha)
-            fade_overlay.fill(BACKGROUND_COLOR)
+            fade_overlay = get_overlay((800, 600), BACKGROUND_COLOR, 255 - fade_alpha)
             screen.blit(fade_overlay, (0, 0))
         
         # Title
-        title = title_font.render("TETRIS GAME", True, TEXT_COLOR)
+        title = render_text("TETRIS GAME", 64, TEXT_COLOR)
         screen.blit(title, (400 - title.get_width() // 2, 150))
         
         # Subtitle
-        subtitle_font = pygame.font.Font(None, 24)
-        subtitle = subtitle_font.render("Modern Classic Edition", True, TEXT_COLOR)
+        subtitle = render_text("Modern Classic Edition", 24, TEXT_COLOR)
         screen.blit(subtitle, (400 - subtitle.get_width() // 2, 210))
         
         # Menu buttons
@@ -429,7 +466,7 @@ def show_main_menu(screen, clock):
             pygame.draw.rect(screen, (150, 150, 150), button_rect, 2)
             
             # Button text
-            button_text = button_font.render(text, True, text_color)
+            button_text = render_text(text, 32, text_color)
             text_x = button_rect.x + (button_width - button_text.get_width()) // 2
             text_y = button_rect.y + (button_height - button_text.get_height()) // 2
             screen.blit(button_text, (text_x, text_y))
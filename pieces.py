@@ -1,65 +1,91 @@
 import random
+from rules import SHAPES, WALL_KICKS
 
-# Tetris piece shapes using coordinate system - Classic Colors
-TETRIS_SHAPES = {
-    'I': {
-        'coords': [(0, -1), (0, 0), (0, 1), (0, 2)],
-        'color': (0, 255, 255)  # Бирюзовый
-    },
-    'O': {
-        'coords': [(0, 0), (1, 0), (0, 1), (1, 1)],
-        'color': (255, 255, 0)  # Жёлтый
-    },
-    'T': {
-        'coords': [(0, 0), (-1, 0), (1, 0), (0, 1)],
-        'color': (128, 0, 128)  # Фиолетовый
-    },
-    'S': {
-        'coords': [(0, 0), (1, 0), (0, -1), (-1, -1)],
-        'color': (0, 128, 0)  # Зелёный
-    },
-    'Z': {
-        'coords': [(0, 0), (-1, 0), (0, -1), (1, -1)],
-        'color': (255, 0, 0)  # Красный
-    },
-    'L': {
-        'coords': [(0, 0), (-1, 0), (1, 0), (1, 1)],
-        'color': (255, 165, 0)  # Оранжевый
-    },
-    'J': {
-        'coords': [(0, 0), (-1, 0), (1, 0), (-1, 1)],
-        'color': (0, 0, 255)  # Синий
-    }
-}
+# Tetris piece shapes using coordinate system - defined in rules.json
+TETRIS_SHAPES = SHAPES
+
+# Piece type names in a fixed order (used for seeded generation and indexing)
+PIECE_TYPES = tuple(TETRIS_SHAPES.keys())
+
+# Offsets tried for a rotation: in place first, then the wall kicks from the rules
+ROTATION_KICKS = ((0, 0),) + WALL_KICKS
+
+
+def _rotation_states(coords):
+    """All four rotation states, each rotated 90 degrees clockwise: (x, y) -> (y, -x)"""
+    states = []
+    for _ in range(4):
+        states.append(tuple(coords))
+        coords = [(dy, -dx) for dx, dy in coords]
+    return tuple(states)
+
+
+def _bounding_box(coords):
+    """Bounding box of a rotation state as (min_dx, min_dy, max_dx, max_dy)"""
+    xs = [dx for dx, dy in coords]
+    ys = [dy for dx, dy in coords]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+# Precomputed, immutable rotation tables: ROTATIONS[type][rotation] -> coords tuple
+ROTATIONS = {piece_type: _rotation_states(shape['coords'])
+             for piece_type, shape in TETRIS_SHAPES.items()}
+
+# BOUNDS[type][rotation] -> (min_dx, min_dy, max_dx, max_dy)
+BOUNDS = {piece_type: tuple(_bounding_box(coords) for coords in states)
+          for piece_type, states in ROTATIONS.items()}
+
+
+def row_masks(coords):
+    """Row bitmasks of a set of cells as (min_dx, width, ((dy, mask), ...)).
+
+    Bit i of a mask is column min_dx + i; rows are sorted by dy.
+    """
+    min_dx = min(dx for dx, dy in coords)
+    width = max(dx for dx, dy in coords) - min_dx + 1
+    rows = {}
+    for dx, dy in coords:
+        rows[dy] = rows.get(dy, 0) | (1 << (dx - min_dx))
+    return (min_dx, width, tuple(sorted(rows.items())))
+
+
+# ROTATION_MASKS[type][rotation] -> row_masks() of that state, for BitBoard collision tests
+ROTATION_MASKS = {piece_type: tuple(row_masks(coords) for coords in states)
+                  for piece_type, states in ROTATIONS.items()}
 
 class TetrisPiece:
     def __init__(self, piece_type=None):
         if piece_type is None:
-            piece_type = random.choice(list(TETRIS_SHAPES.keys()))
+            piece_type = random.choice(PIECE_TYPES)
         
         self.type = piece_type
         self.color = TETRIS_SHAPES[piece_type]['color']
-        self.coords = TETRIS_SHAPES[piece_type]['coords'][:]  # Copy coordinates
+        self.rotations = ROTATIONS[piece_type]
+        self.rotation = 0  # Index into ROTATIONS[piece_type]
         self.x = 0
         self.y = 0
     
+    @property
+    def coords(self):
+        """Coordinates of the current rotation state (shared, immutable)"""
+        return self.rotations[self.rotation]
+    
     def get_absolute_coords(self):
         """Get absolute coordinates of all blocks"""
         return [(self.x + dx, self.y + dy) for dx, dy in self.coords]
     
     def get_rotated_coords(self):
         """Return coordinates rotated 90 degrees clockwise"""
-        # Rotate each coordinate: (x, y) -> (y, -x)
-        return [(dy, -dx) for dx, dy in self.coords]
+        return self.rotations[(self.rotation + 1) % 4]
     
     def rotate(self):
         """Rotate the piece 90 degrees clockwise"""
-        self.coords = self.get_rotated_coords()
+        self.rotation = (self.rotation + 1) % 4
     
     def copy(self):
         """Create a copy of this piece"""
         new_piece = TetrisPiece(self.type)
-        new_piece.coords = self.coords[:]
+        new_piece.rotation = self.rotation
         new_piece.x = self.x
         new_piece.y = self.y
         return new_piece
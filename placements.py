@@ -0,0 +1,159 @@
+from collections import OrderedDict, namedtuple
+from pieces import TETRIS_SHAPES, ROTATIONS, ROTATION_KICKS
+from engine import ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE, ACTION_HARD_DROP
+from rules import SPAWN_ROW, spawn_column
+
+# A final resting position: rotation index, x, landing row, and the input
+# actions (ending with a hard drop) that get the piece there from its start
+Placement = namedtuple('Placement', ['x', 'rotation', 'y', 'actions'])
+
+# How far wall kicks may lift a piece above its start row during the search
+MAX_KICK_RISE = 4
+
+
+def drop_table(rows, width, height):
+    """Per column, the first filled row at or below each row (height if none).
+
+    table[x][y] is where a cell falling down column x from row y would stop;
+    a piece's drop distance is the minimum over its cells.
+    """
+    table = []
+    for x in range(width):
+        bit = 1 << x
+        column = [height] * (height + 1)
+        for y in range(height - 1, -1, -1):
+            column[y] = y if rows[y] & bit else column[y + 1]
+        table.append(column)
+    return table
+
+
+def drop_distance(table, x, y, coords):
+    """How many rows a piece at (x, y) falls before landing"""
+    distance = None
+    for dx, dy in coords:
+        cy = y + dy
+        stop = table[x + dx][cy if cy > 0 else 0]
+        cell_distance = stop - cy - 1
+        if distance is None or cell_distance < distance:
+            distance = cell_distance
+    return distance
+
+
+def result_board(board, piece_type, placement, color=None):
+    """Copy of board with the piece placed and full rows removed; returns (board, lines)"""
+    if color is None:
+        color = TETRIS_SHAPES[piece_type]['color']
+    board = board.copy()
+    board.place(placement.x, placement.y, ROTATIONS[piece_type][placement.rotation], color)
+    full = board.full_rows()
+    board.clear_rows(full)
+    return board, len(full)
+
+
+class PlacementSearch:
+    """Enumerates every reachable final placement of a piece.
+
+    Starting from the piece's current position, the search explores left/right
+    moves and rotations (with the engine's wall kicks) and then drops straight
+    down. Placements that cover the same cells are merged, so symmetric pieces
+    (O, I, S, Z) are not reported twice. Results are cached per board, piece
+    and start position in a bounded LRU cache.
+    """
+
+    def __init__(self, cache_size=4096):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def placements(self, board, piece_type, x, y, rotation=0):
+        """Return all placements of piece_type starting at (x, y, rotation)"""
+        rows = board.row_masks()
+        key = (rows, piece_type, x, y, rotation)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        result = self._search(board, rows, piece_type, x, y, rotation)
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def _search(self, board, rows, piece_type, x, y, rotation):
+        collides = board.piece_collides
+        if collides(x, y, piece_type, rotation):
+            return ()
+
+        table = drop_table(rows, board.width, board.height)
+        min_y = y - MAX_KICK_RISE
+
+        # Breadth-first search over positions reachable before dropping
+        start = (x, y, rotation)
+        paths = {start: ()}
+        frontier = [start]
+        while frontier:
+            next_frontier = []
+            for state in frontier:
+                sx, sy, sr = state
+                path = paths[state]
+                moves = []
+                for dx, action in ((-1, ACTION_LEFT), (1, ACTION_RIGHT)):
+                    if not collides(sx + dx, sy, piece_type, sr):
+                        moves.append(((sx + dx, sy, sr), action))
+                nr = (sr + 1) % 4
+                for kx, ky in ROTATION_KICKS:
+                    if not collides(sx + kx, sy + ky, piece_type, nr):
+                        moves.append(((sx + kx, sy + ky, nr), ACTION_ROTATE))
+                        break
+                for new_state, action in moves:
+                    if new_state not in paths and new_state[1] >= min_y:
+                        paths[new_state] = path + (action,)
+                        next_frontier.append(new_state)
+            frontier = next_frontier
+
+        # Drop every reachable position and merge identical resting cells
+        states = ROTATIONS[piece_type]
+        found = {}
+        for (sx, sy, sr), path in paths.items():
+            coords = states[sr]
+            land_y = sy + drop_distance(table, sx, sy, coords)
+            cells = frozenset((sx + dx, land_y + dy) for dx, dy in coords)
+            placement = Placement(sx, sr, land_y, path + (ACTION_HARD_DROP,))
+            known = found.get(cells)
+            if known is None or len(placement.actions) < len(known.actions):
+                found[cells] = placement
+        return tuple(sorted(found.values(), key=lambda p: (p.rotation, p.x, p.y)))
+
+    def current_and_next(self, engine):
+        """Placements for the engine's current piece and for the next piece.
+
+        The next piece is searched on the current board from its spawn point.
+        """
+        piece = engine.current_piece
+        spawn_x = spawn_column(engine.width)
+        current = self.placements(engine.board, piece.type, piece.x, piece.y, piece.rotation)
+        upcoming = self.placements(engine.board, engine.next_piece.type, spawn_x, SPAWN_ROW)
+        return current, upcoming
+
+    def placement_pairs(self, engine):
+        """Yield (placement, next_placements, lines) for every current placement.
+
+        next_placements are searched on the board left after the current piece
+        lands and completed lines are removed; lines is how many were cleared.
+        """
+        piece = engine.current_piece
+        spawn_x = spawn_column(engine.width)
+        color = TETRIS_SHAPES[piece.type]['color']
+        for placement in self.placements(engine.board, piece.type, piece.x, piece.y, piece.rotation):
+            board, lines = result_board(engine.board, piece.type, placement, color)
+            yield placement, self.placements(board, engine.next_piece.type, spawn_x, SPAWN_ROW), lines
+
+    def clear_cache(self):
+        """Drop all cached results and reset hit statistics"""
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
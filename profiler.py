@@ -0,0 +1,174 @@
+"""Opt-in per-frame timing for the pygame client.
+
+Enable with TETRIS_PROFILE=1 (and TETRIS_PROFILE_DUMP=frames.csv to save the
+samples on exit); F3 toggles the overlay. When disabled, main.py uses
+NullProfiler, whose methods do nothing, and no game method is wrapped.
+"""
+import os
+import time
+from array import array
+from text_cache import render_text
+
+# Frames kept in the ring buffer
+RING_SIZE = 1024
+
+# Frames between refreshes of the overlay numbers
+OVERLAY_REFRESH = 30
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off"""
+
+    enabled = False
+    show_overlay = False
+
+    def begin_frame(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def instrument(self, game):
+        pass
+
+    def toggle_overlay(self):
+        pass
+
+    def draw_overlay(self, screen):
+        return None
+
+    def dump(self, path=None):
+        pass
+
+
+class FrameProfiler:
+    """Per-phase frame timings in a fixed-size ring buffer.
+
+    The main loop calls begin_frame(), mark(phase) after each phase and
+    end_frame(). Phases nested inside another (the HUD inside draw) are
+    timed by wrapping the game's methods with instrument(). Samples are
+    stored in preallocated arrays, so recording never allocates and the
+    overlay can read them at any time.
+    """
+
+    enabled = True
+    PHASES = ('input', 'update', 'draw', 'hud', 'present')
+    OVERLAY_RECT = (10, 450, 280, 140)
+
+    def __init__(self, capacity=RING_SIZE, clock=time.perf_counter, dump_path=None):
+        self.capacity = capacity
+        self.clock = clock
+        self.dump_path = dump_path
+        self.frames = array('d', bytes(8 * capacity))
+        self.samples = {phase: array('d', bytes(8 * capacity)) for phase in self.PHASES}
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.count = 0
+        self.frame_start = None
+        self.last = None
+        self.show_overlay = False
+        self.overlay_lines = []
+
+    def begin_frame(self):
+        self.frame_start = self.last = self.clock()
+
+    def mark(self, phase):
+        """Charge the time since the previous mark to phase"""
+        now = self.clock()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        """Store the finished frame (including time spent waiting for the frame cap)"""
+        if self.frame_start is None:
+            return
+        index = self.count % self.capacity
+        self.frames[index] = self.clock() - self.frame_start
+        current = self.current
+        for phase in self.PHASES:
+            self.samples[phase][index] = current[phase]
+            current[phase] = 0.0
+        self.count += 1
+
+    def timed(self, method, phase):
+        """Wrap a callable so its duration is added to phase"""
+        clock = self.clock
+        current = self.current
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                current[phase] += clock() - start
+        return wrapper
+
+    def instrument(self, game):
+        """Time the HUD drawing (the parts of draw_ui) of a TetrisGame instance"""
+        for name in ('draw_stats', 'draw_controls', 'draw_next_piece'):
+            setattr(game, name, self.timed(getattr(game, name), 'hud'))
+
+    def recent(self, values):
+        """Recorded values in the ring, oldest first"""
+        if self.count <= self.capacity:
+            return list(values[:self.count])
+        start = self.count % self.capacity
+        return list(values[start:]) + list(values[:start])
+
+    def summary(self):
+        """FPS, frame time percentiles and mean per-phase times (ms) over the ring"""
+        frames = sorted(self.recent(self.frames))
+        if not frames:
+            return None
+        total = sum(frames)
+        summary = {
+            'frames': len(frames),
+            'fps': len(frames) / total if total else 0.0,
+            'p50': frames[len(frames) // 2] * 1000,
+            'p99': frames[min(len(frames) - 1, int(len(frames) * 0.99))] * 1000,
+        }
+        for phase in self.PHASES:
+            values = self.recent(self.samples[phase])
+            summary[phase] = sum(values) / len(values) * 1000
+        return summary
+
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self.overlay_lines = []
+
+    def draw_overlay(self, screen):
+        """Draw the stats box; returns its rectangle, or None when hidden"""
+        if not self.show_overlay:
+            return None
+        if not self.overlay_lines or self.count % OVERLAY_REFRESH == 0:
+            summary = self.summary()
+            if summary:
+                self.overlay_lines = [
+                    f"FPS {summary['fps']:.0f}  p50 {summary['p50']:.1f} ms  p99 {summary['p99']:.1f} ms",
+                ] + [f"{phase:8s} {summary[phase]:6.2f} ms" for phase in self.PHASES]
+        x, y = self.OVERLAY_RECT[:2]
+        screen.fill((0, 0, 0), self.OVERLAY_RECT)
+        for i, line in enumerate(self.overlay_lines):
+            screen.blit(render_text(line, 18, (0, 255, 0)), (x + 6, y + 6 + i * 18))
+        return screen.get_rect().clip(self.OVERLAY_RECT)
+
+    def dump(self, path=None):
+        """Write the buffered samples (ms) as CSV"""
+        path = path or self.dump_path
+        if not path:
+            return
+        frames = self.recent(self.frames)
+        phases = [self.recent(self.samples[phase]) for phase in self.PHASES]
+        with open(path, 'w') as f:
+            f.write(','.join(('frame',) + self.PHASES) + '\n')
+            for i, frame in enumerate(frames):
+                f.write(','.join(f"{value * 1000:.4f}" for value in [frame] + [p[i] for p in phases]) + '\n')
+
+
+def create_profiler():
+    """FrameProfiler when TETRIS_PROFILE is set, otherwise a no-op NullProfiler"""
+    if os.environ.get('TETRIS_PROFILE', '') not in ('', '0'):
+        return FrameProfiler(dump_path=os.environ.get('TETRIS_PROFILE_DUMP'))
+    return NullProfiler()
@@ -0,0 +1,115 @@
+import random
+from pieces import PIECE_TYPES
+
+# Piece indices are generated this many at a time
+CHUNK_SIZE = 256
+
+
+class PieceRandomizer:
+    """Seeded per-game piece generator.
+
+    Piece types are generated in bulk as a bytearray of indices into
+    PIECE_TYPES and handed out from that queue, so spawning a piece does not
+    allocate. Two randomizers of the same kind and seed always produce the
+    same sequence.
+    """
+
+    kind = None
+
+    def __init__(self, seed=None, chunk_size=CHUNK_SIZE):
+        if seed is None:
+            seed = random.SystemRandom().randrange(1 << 32)
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+        self.queue = bytearray()
+        self.pos = 0
+
+    def generate(self, count):
+        """Generate at least count new piece indices"""
+        raise NotImplementedError
+
+    def _refill(self, needed):
+        """Drop consumed entries and append fresh ones until needed are queued"""
+        del self.queue[:self.pos]
+        self.pos = 0
+        while len(self.queue) < needed:
+            self.queue += self.generate(max(self.chunk_size, needed - len(self.queue)))
+
+    def next_index(self):
+        """Index into PIECE_TYPES of the next piece"""
+        if self.pos >= len(self.queue):
+            self._refill(1)
+        index = self.queue[self.pos]
+        self.pos += 1
+        return index
+
+    def next(self):
+        """Type name of the next piece"""
+        return PIECE_TYPES[self.next_index()]
+
+    def peek(self, count=1):
+        """Upcoming piece types without consuming them"""
+        if self.pos + count > len(self.queue):
+            self._refill(count)
+        return [PIECE_TYPES[i] for i in self.queue[self.pos:self.pos + count]]
+
+    def take(self, count):
+        """Consume the next count pieces at once as bytes of PIECE_TYPES indices"""
+        if self.pos + count > len(self.queue):
+            self._refill(count)
+        chunk = bytes(self.queue[self.pos:self.pos + count])
+        self.pos += count
+        return chunk
+
+    def getstate(self):
+        """Opaque state for snapshots"""
+        return (self.rng.getstate(), bytes(self.queue[self.pos:]))
+
+    def setstate(self, state):
+        """Restore a state returned by getstate()"""
+        rng_state, queue = state
+        self.rng.setstate(rng_state)
+        self.queue = bytearray(queue)
+        self.pos = 0
+
+
+class RandomRandomizer(PieceRandomizer):
+    """Every piece drawn independently and uniformly"""
+
+    kind = 'random'
+
+    def generate(self, count):
+        return bytes(self.rng.choices(range(len(PIECE_TYPES)), k=count))
+
+
+class BagRandomizer(PieceRandomizer):
+    """7-bag: each run of seven pieces is a shuffled copy of all piece types"""
+
+    kind = '7bag'
+
+    def generate(self, count):
+        pieces = bytearray()
+        while len(pieces) < count:
+            # Shuffle a fresh bag each time so chunk boundaries don't affect the sequence
+            bag = list(range(len(PIECE_TYPES)))
+            self.rng.shuffle(bag)
+            pieces += bytes(bag)
+        return pieces
+
+
+RANDOMIZERS = {
+    'random': RandomRandomizer,
+    '7bag': BagRandomizer,
+}
+
+DEFAULT_RANDOMIZER = 'random'
+
+
+def create_randomizer(kind=DEFAULT_RANDOMIZER, seed=None):
+    """Create a piece randomizer of the named kind"""
+    try:
+        randomizer_class = RANDOMIZERS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown randomizer: {kind}")
+    return randomizer_class(seed)
@@ -0,0 +1,181 @@
+import pygame
+
+
+def border_color(color):
+    """Darker outline used around every block"""
+    return tuple(max(0, c - 30) for c in color)
+
+
+def display_format(surface):
+    """Convert a surface to the display's pixel format when a display exists"""
+    if pygame.display.get_surface() is not None:
+        return surface.convert()
+    return surface
+
+
+class BlockSprites:
+    """Pre-rendered square blocks (fill plus a one pixel border), cached by color"""
+
+    def __init__(self, size):
+        self.size = size
+        self.cache = {}
+
+    def get(self, color, fill=None):
+        """Block for a piece color; fill overrides the inside (line clear flash)"""
+        if fill is None:
+            fill = color
+        key = (fill, color)
+        sprite = self.cache.get(key)
+        if sprite is None:
+            sprite = display_format(pygame.Surface((self.size, self.size)))
+            sprite.fill(fill)
+            pygame.draw.rect(sprite, border_color(color), sprite.get_rect(), 1)
+            self.cache[key] = sprite
+        return sprite
+
+
+def build_background(game):
+    """Static screen background: fill, game field and grid lines baked in"""
+    width, height = game.screen.get_size()
+    background = display_format(pygame.Surface((width, height)))
+    background.fill(game.BACKGROUND_COLOR)
+    pygame.draw.rect(background, game.GAME_FIELD_COLOR, game.field_rect())
+    for x in range(game.GRID_WIDTH + 1):
+        pygame.draw.line(background, game.GRID_LINE_COLOR,
+                         (game.GRID_X + x * game.CELL_SIZE, game.GRID_Y),
+                         (game.GRID_X + x * game.CELL_SIZE, game.GRID_Y + game.GRID_HEIGHT * game.CELL_SIZE), 1)
+    for y in range(game.GRID_HEIGHT + 1):
+        pygame.draw.line(background, game.GRID_LINE_COLOR,
+                         (game.GRID_X, game.GRID_Y + y * game.CELL_SIZE),
+                         (game.GRID_X + game.GRID_WIDTH * game.CELL_SIZE, game.GRID_Y + y * game.CELL_SIZE), 1)
+    return background
+
+
+class DirtyRectRenderer:
+    """Redraws only what changed since the previous frame.
+
+    A layer surface keeps the background, locked cells and static labels.
+    Each frame only changed cells are redrawn on the layer, the areas under
+    the old and new falling piece are restored from it, and the HUD is
+    re-rendered when its values change. draw() returns the list of changed
+    rectangles for pygame.display.update(), or None when the whole screen
+    was repainted and needs a flip.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.layer = None
+        self.cells = None
+        self.piece_rects = []
+        self.stats = None
+        self.next_type = None
+        self.paused = False
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Force a full repaint (after menus drew over the screen)"""
+        self.full_redraw = True
+
+    def cell_keys(self):
+        """Sprite key (fill, color) or None for every cell, row by row"""
+        game = self.game
+        flashing = game.flashing_rows()
+        keys = []
+        for y, row in enumerate(game.grid):
+            flash = y in flashing
+            for color in row:
+                if not color:
+                    keys.append(None)
+                elif flash:
+                    keys.append((game.WHITE, color))
+                else:
+                    keys.append((color, color))
+        return keys
+
+    def cell_rect(self, index):
+        game = self.game
+        x, y = index % game.GRID_WIDTH, index // game.GRID_WIDTH
+        return pygame.Rect(game.GRID_X + x * game.CELL_SIZE + 1,
+                           game.GRID_Y + y * game.CELL_SIZE + 1,
+                           game.CELL_SIZE - 2, game.CELL_SIZE - 2)
+
+    def draw_cell(self, index, key):
+        """Redraw one cell of the layer"""
+        rect = self.cell_rect(index)
+        self.layer.blit(self.game.get_background(), rect, rect)
+        if key:
+            fill, color = key
+            self.layer.blit(self.game.sprites.get(color, fill), rect)
+        return rect
+
+    def repaint(self):
+        """Rebuild the layer and paint the whole screen"""
+        game = self.game
+        self.layer = game.get_background().copy()
+        self.cells = self.cell_keys()
+        for index, key in enumerate(self.cells):
+            if key:
+                self.draw_cell(index, key)
+        game.draw_controls(self.layer)
+
+        game.screen.blit(self.layer, (0, 0))
+        self.piece_rects = game.draw_current_piece()
+        self.stats = (game.score, game.level, game.lines_cleared)
+        game.draw_stats()
+        self.next_type = game.next_piece.type if game.next_piece else None
+        game.draw_next_piece()
+        self.full_redraw = False
+
+    def draw(self):
+        game = self.game
+        screen = game.screen
+
+        if game.paused:
+            if self.paused:
+                return []
+            self.paused = True
+            self.repaint()
+            game.draw_pause_overlay()
+            self.full_redraw = True
+            return None
+        self.paused = False
+
+        if self.full_redraw or self.layer is None:
+            self.repaint()
+            return None
+
+        dirty = []
+
+        # Locked cells that changed since the last frame
+        cells = self.cell_keys()
+        previous = self.cells
+        for index, key in enumerate(cells):
+            if key != previous[index]:
+                dirty.append(self.draw_cell(index, key))
+        self.cells = cells
+
+        # Restore what was under the old piece, then draw the piece again
+        dirty.extend(self.piece_rects)
+        for rect in dirty:
+            screen.blit(self.layer, rect, rect)
+        self.piece_rects = game.draw_current_piece()
+        dirty.extend(self.piece_rects)
+
+        # HUD values
+        stats = (game.score, game.level, game.lines_cleared)
+        if stats != self.stats:
+            rect = game.stats_rect()
+            screen.blit(self.layer, rect, rect)
+            game.draw_stats()
+            self.stats = stats
+            dirty.append(rect)
+
+        next_type = game.next_piece.type if game.next_piece else None
+        if next_type != self.next_type:
+            rect = game.next_piece_rect()
+            screen.blit(self.layer, rect, rect)
+            game.draw_next_piece()
+            self.next_type = next_type
+            dirty.append(rect)
+
+        return dirty
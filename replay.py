@@ -0,0 +1,300 @@
+"""Compact binary replays: seed plus a time-stamped input stream.
+
+File layout (all integers are unsigned LEB128 varints unless noted):
+
+    magic b'TBRP', version byte, randomizer byte, seed, width, height,
+    username length, username (UTF-8)
+    records...
+
+Each record starts with one opcode byte:
+
+    OP_FRAME (0)      followed by the frame length in milliseconds
+    1..5              an engine input action (ACTION_LEFT .. ACTION_HARD_DROP)
+    OP_PAUSE (6)      pause toggle
+    OP_END (255)      followed by the final score; marks a complete replay
+
+Example:
+    python replay.py replays/Artem_20250818-120000.tbr --seek 600
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from engine import TetrisEngine, ACTION_NONE
+from rules import BOARD_HEIGHT, BOARD_WIDTH
+
+MAGIC = b'TBRP'
+VERSION = 1
+
+OP_FRAME = 0
+OP_PAUSE = 6
+OP_END = 255
+
+# Randomizer kinds by their byte code in the header
+RANDOMIZER_CODES = {'random': 0, '7bag': 1}
+RANDOMIZER_KINDS = {code: kind for kind, code in RANDOMIZER_CODES.items()}
+
+# Longest varint accepted (64-bit values); longer ones would make decoding
+# quadratic in their length as the integer grows
+MAX_VARINT_BYTES = 10
+
+# Buffered bytes written to disk once this size is reached
+FLUSH_SIZE = 4096
+
+# Frames between board snapshots kept by ReplayPlayer for seeking
+SNAPSHOT_INTERVAL = 600
+
+REPLAY_DIR = 'replays'
+
+
+class ReplayError(ValueError):
+    """Raised for malformed or unsupported replay data"""
+
+
+def encode_varint(value, out):
+    """Append value as an unsigned LEB128 varint to a bytearray"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    """Read a varint at pos; returns (value, new_pos)"""
+    value = 0
+    shift = 0
+    end = pos + MAX_VARINT_BYTES
+    while True:
+        if pos >= len(data):
+            raise ReplayError("Truncated varint")
+        if pos >= end:
+            raise ReplayError("Varint too long")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def replay_filename(username, directory=REPLAY_DIR):
+    """Path for a new replay file of this user"""
+    safe_name = re.sub(r'[^\w-]+', '_', username) or 'player'
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+    return os.path.join(directory, f"{safe_name}_{stamp}-{int(now * 1000) % 1000:03d}.tbr")
+
+
+class ReplayRecorder:
+    """Streams an engine's inputs to a file (or any binary file object).
+
+    Attach with engine.recorder = recorder; the engine reports every frame,
+    action and pause toggle. Data is buffered and written incrementally.
+    """
+
+    def __init__(self, target, seed, randomizer='random', width=10, height=20, username=''):
+        if isinstance(target, (str, os.PathLike)):
+            directory = os.path.dirname(target)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(target, 'wb')
+            self.owns_file = True
+        else:
+            self.file = target
+            self.owns_file = False
+        self.buffer = bytearray(MAGIC)
+        self.buffer.append(VERSION)
+        self.buffer.append(RANDOMIZER_CODES[randomizer])
+        encode_varint(seed, self.buffer)
+        encode_varint(width, self.buffer)
+        encode_varint(height, self.buffer)
+        name = username.encode('utf-8')
+        encode_varint(len(name), self.buffer)
+        self.buffer += name
+        self.frames = 0
+        self.closed = False
+
+    @classmethod
+    def for_engine(cls, engine, target, username=''):
+        """Create a recorder matching the engine's settings and attach it"""
+        recorder = cls(target, engine.seed, engine.randomizer.kind,
+                       engine.width, engine.height, username)
+        engine.recorder = recorder
+        return recorder
+
+    def frame(self, dt):
+        """Record one engine update of dt whole milliseconds"""
+        self.buffer.append(OP_FRAME)
+        encode_varint(int(dt), self.buffer)
+        self.frames += 1
+        if len(self.buffer) >= FLUSH_SIZE:
+            self.flush()
+
+    def action(self, action):
+        """Record one input action"""
+        if action != ACTION_NONE:
+            self.buffer.append(action)
+
+    def pause(self):
+        """Record a pause toggle"""
+        self.buffer.append(OP_PAUSE)
+
+    def flush(self):
+        """Write buffered records to the file"""
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.file.flush()
+            self.buffer.clear()
+
+    def close(self, score):
+        """Write the end marker with the final score and close the file"""
+        if self.closed:
+            return
+        self.buffer.append(OP_END)
+        encode_varint(score, self.buffer)
+        self.flush()
+        if self.owns_file:
+            self.file.close()
+        self.closed = True
+
+
+class ReplayPlayer:
+    """Re-simulates a replay headlessly.
+
+    play() runs to the end at full speed; seek(frame) jumps to any frame by
+    restoring the nearest snapshot taken every SNAPSHOT_INTERVAL frames
+    (snapshot_interval=0 disables snapshots). With max_frames or max_actions
+    set, a replay with more frames or inputs (actions and pauses) raises
+    ReplayError as soon as the limit is passed.
+    """
+
+    def __init__(self, data, snapshot_interval=SNAPSHOT_INTERVAL, max_frames=None, max_actions=None):
+        self.data = bytes(data)
+        self.snapshot_interval = snapshot_interval
+        self.max_frames = max_frames
+        self.max_actions = max_actions
+        self._parse_header()
+        # frame number -> (record offset, engine snapshot)
+        self.snapshots = {}
+        self.frame_count = None
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with open(path, 'rb') as f:
+            return cls(f.read(), **kwargs)
+
+    def _parse_header(self):
+        data = self.data
+        if data[:4] != MAGIC:
+            raise ReplayError("Not a replay file")
+        if len(data) < 6 or data[4] != VERSION:
+            raise ReplayError("Unsupported replay version")
+        if data[5] not in RANDOMIZER_KINDS:
+            raise ReplayError("Unknown randomizer")
+        self.randomizer = RANDOMIZER_KINDS[data[5]]
+        pos = 6
+        self.seed, pos = decode_varint(data, pos)
+        self.width, pos = decode_varint(data, pos)
+        self.height, pos = decode_varint(data, pos)
+        if (self.width, self.height) != (BOARD_WIDTH, BOARD_HEIGHT):
+            raise ReplayError("Unsupported board size")
+        name_length, pos = decode_varint(data, pos)
+        if pos + name_length > len(data):
+            raise ReplayError("Truncated username")
+        self.username = data[pos:pos + name_length].decode('utf-8', errors='replace')
+        self.records_start = pos + name_length
+        self.final_score = None
+
+    def new_engine(self):
+        """Fresh engine with the replay's seed and settings"""
+        return TetrisEngine(self.width, self.height, seed=self.seed, randomizer=self.randomizer)
+
+    def _run(self, engine, pos, frame, stop_frame=None):
+        """Apply records from pos; returns (pos, frame) where playback stopped"""
+        data = self.data
+        end = len(data)
+        apply_action = engine.apply_action
+        update = engine.update
+        interval = self.snapshot_interval
+        snapshots = self.snapshots
+        max_frames = self.max_frames
+        actions_left = self.max_actions
+        while pos < end:
+            if stop_frame is not None and frame >= stop_frame:
+                break
+            op = data[pos]
+            pos += 1
+            if op == OP_FRAME:
+                dt, pos = decode_varint(data, pos)
+                update(dt)
+                frame += 1
+                if max_frames is not None and frame > max_frames:
+                    raise ReplayError("Too many frames")
+                if interval and frame % interval == 0 and frame not in snapshots:
+                    snapshots[frame] = (pos, engine.snapshot())
+            elif op == OP_END:
+                self.final_score, pos = decode_varint(data, pos)
+                break
+            elif op <= OP_PAUSE:
+                if actions_left is not None:
+                    actions_left -= 1
+                    if actions_left < 0:
+                        raise ReplayError("Too many inputs")
+                if op == OP_PAUSE:
+                    engine.toggle_pause()
+                else:
+                    apply_action(op)
+            else:
+                raise ReplayError(f"Unknown opcode {op}")
+        if stop_frame is None:
+            self.frame_count = frame
+        return pos, frame
+
+    def play(self):
+        """Re-simulate the whole replay and return the final engine"""
+        engine = self.new_engine()
+        self._run(engine, self.records_start, 0)
+        return engine
+
+    def seek(self, frame):
+        """Engine state after the given number of frames"""
+        engine = self.new_engine()
+        pos, start = self.records_start, 0
+        known = [f for f in self.snapshots if f <= frame]
+        if known:
+            start = max(known)
+            pos, snapshot = self.snapshots[start]
+            engine.restore(snapshot)
+        self._run(engine, pos, start, stop_frame=frame)
+        return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-simulate a Tetris replay")
+    parser.add_argument('path', help="replay file")
+    parser.add_argument('--seek', type=int, help="show the state at this frame instead of the end")
+    args = parser.parse_args(argv)
+
+    player = ReplayPlayer.load(args.path)
+    start = time.perf_counter()
+    engine = player.play()
+    elapsed = time.perf_counter() - start
+    print(f"Player: {player.username}  seed: {player.seed}  randomizer: {player.randomizer}")
+    print(f"Frames: {player.frame_count}  simulated in {elapsed * 1000:.1f} ms")
+    print(f"Score: {engine.score}  lines: {engine.lines_cleared}  level: {engine.level}")
+    if player.final_score is None:
+        print("Replay is incomplete (no end marker)")
+    elif player.final_score != engine.score:
+        print(f"MISMATCH: recorded final score {player.final_score}")
+        return 1
+    if args.seek is not None:
+        state = player.seek(args.seek)
+        print(f"Frame {args.seek}: score {state.score}  lines {state.lines_cleared}")
+        for row in state.board.row_masks():
+            print(''.join('#' if row & (1 << x) else '.' for x in range(state.width)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
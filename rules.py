@@ -0,0 +1,96 @@
+"""The game rules shared by every client, loaded from rules.json.
+
+rules.json is the single definition of the piece shapes and colors, wall
+kicks, spawn position, gravity curve, scoring and line clear timing. The
+Python engine (pieces.py, engine.py, batch.py) builds its tables from it at
+import time and the web client fetches the same file from /api/rules, so a
+score means the same thing in every client and any game can be verified by
+re-simulation on the server.
+
+RULES_VERSION is the "version" field plus a hash of the content; replays
+and cached copies of the rules in browsers are only valid for one version.
+"""
+import hashlib
+import json
+import os
+
+# Fields every rules file must have, by section
+REQUIRED_FIELDS = {
+    'board': ('width', 'height'),
+    'spawn': ('column_offset', 'row'),
+    'gravity': ('start_ms', 'step_ms', 'min_ms'),
+    'scoring': ('line_points', 'level_points'),
+    'line_clear': ('duration_ms', 'flash_delay_ms'),
+}
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+
+
+class RulesError(ValueError):
+    """rules.json is missing a field or has an invalid value"""
+
+
+def load_rules(path=RULES_FILE):
+    """Parsed and validated rules"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    rules = json.loads(data)
+    for section, fields in REQUIRED_FIELDS.items():
+        for field in fields:
+            if field not in rules.get(section, {}):
+                raise RulesError(f"Missing {section}.{field}")
+    pieces = rules.get('pieces')
+    if not pieces or len(pieces) > 14:
+        # Cells are stored as 4-bit palette indices (snapshot.py), 0 empty and the last garbage
+        raise RulesError("Between 1 and 14 piece types are supported")
+    for piece in pieces:
+        if len(piece.get('coords', ())) != 4 or len(piece.get('color', ())) != 3:
+            raise RulesError(f"Piece {piece.get('type')} needs 4 cells and an RGB color")
+    if rules['scoring']['level_points'] <= 0 or not rules['scoring']['line_points']:
+        raise RulesError("Invalid scoring")
+    rules['hash'] = hashlib.blake2b(data, digest_size=8).hexdigest()
+    return rules
+
+
+RULES = load_rules()
+RULES_VERSION = f"{RULES['version']}-{RULES['hash']}"
+
+BOARD_WIDTH = RULES['board']['width']
+BOARD_HEIGHT = RULES['board']['height']
+SPAWN_COLUMN_OFFSET = RULES['spawn']['column_offset']
+SPAWN_ROW = RULES['spawn']['row']
+
+# Shapes in the order of the rules file: type -> {'coords': [(dx, dy)], 'color': (r, g, b)}
+SHAPES = {piece['type']: {'coords': [tuple(cell) for cell in piece['coords']],
+                          'color': tuple(piece['color'])}
+          for piece in RULES['pieces']}
+GARBAGE_COLOR = tuple(RULES['garbage_color'])
+WALL_KICKS = tuple(tuple(kick) for kick in RULES['wall_kicks'])
+
+GRAVITY_START = RULES['gravity']['start_ms']
+GRAVITY_STEP = RULES['gravity']['step_ms']
+GRAVITY_MIN = RULES['gravity']['min_ms']
+
+LINE_POINTS = tuple(RULES['scoring']['line_points'])
+LEVEL_POINTS = RULES['scoring']['level_points']
+
+LINE_CLEAR_DURATION = RULES['line_clear']['duration_ms']
+LINE_CLEAR_FLASH_DELAY = RULES['line_clear']['flash_delay_ms']
+
+
+def spawn_column(width):
+    return width // 2 + SPAWN_COLUMN_OFFSET
+
+
+def fall_speed(level):
+    """Milliseconds per gravity step at a level"""
+    return max(GRAVITY_MIN, GRAVITY_START - (level - 1) * GRAVITY_STEP)
+
+
+def line_points(lines):
+    """Points for clearing lines at once"""
+    return LINE_POINTS[min(lines, len(LINE_POINTS) - 1)]
+
+
+def level_for_score(score):
+    return score // LEVEL_POINTS + 1
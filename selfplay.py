@@ -0,0 +1,224 @@
+"""Self-play farm: plays many seeded games across worker processes.
+
+Example:
+    python selfplay.py --games 2000 --workers 8 --policy greedy
+
+Workers only import the headless engine (never pygame), so this runs on
+CPU-only servers.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from engine import TetrisEngine
+from placements import PlacementSearch, result_board
+from randomizer import RANDOMIZERS, DEFAULT_RANDOMIZER
+
+# Simulated frame length in milliseconds; game duration is reported in these ticks
+TICK_MS = 16
+
+
+def column_heights(rows, width, height):
+    """Height of each column measured from the floor"""
+    heights = [0] * width
+    for y, row in enumerate(rows):
+        if row:
+            for x in range(width):
+                if not heights[x] and row & (1 << x):
+                    heights[x] = height - y
+    return heights
+
+
+def count_holes(rows, width):
+    """Empty cells with at least one filled cell above them"""
+    holes = 0
+    covered = 0
+    for row in rows:
+        holes += bin(covered & ~row & ((1 << width) - 1)).count('1')
+        covered |= row
+    return holes
+
+
+class RandomPolicy:
+    """Picks a uniformly random reachable placement"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def choose(self, engine, placements):
+        return self.rng.choice(placements)
+
+
+class GreedyPolicy:
+    """One-piece lookahead scoring height, holes, bumpiness and cleared lines"""
+
+    HEIGHT_WEIGHT = -0.51
+    LINES_WEIGHT = 0.76
+    HOLES_WEIGHT = -0.36
+    BUMPINESS_WEIGHT = -0.18
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def evaluate(self, board, lines):
+        rows = board.row_masks()
+        heights = column_heights(rows, board.width, board.height)
+        bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+        return (self.HEIGHT_WEIGHT * sum(heights) +
+                self.LINES_WEIGHT * lines +
+                self.HOLES_WEIGHT * count_holes(rows, board.width) +
+                self.BUMPINESS_WEIGHT * bumpiness)
+
+    def choose(self, engine, placements):
+        piece_type = engine.current_piece.type
+        best = None
+        best_value = None
+        for placement in placements:
+            board, lines = result_board(engine.board, piece_type, placement)
+            value = self.evaluate(board, lines)
+            if best_value is None or value > best_value:
+                best, best_value = placement, value
+        return best
+
+
+POLICIES = {
+    'random': RandomPolicy,
+    'greedy': GreedyPolicy,
+}
+
+
+def play_game(seed, policy_name, max_pieces, randomizer=DEFAULT_RANDOMIZER):
+    """Play one game; returns (seed, score, lines, level, pieces, ticks)"""
+    engine = TetrisEngine(seed=seed, randomizer=randomizer)
+    policy = POLICIES[policy_name](seed)
+    search = PlacementSearch(cache_size=256)
+    ticks = 0
+    while not engine.game_over and engine.pieces_placed < max_pieces:
+        if not engine.clearing_lines:
+            piece = engine.current_piece
+            placements = search.placements(engine.board, piece.type, piece.x, piece.y, piece.rotation)
+            if placements:
+                for action in policy.choose(engine, placements).actions:
+                    engine.apply_action(action)
+        engine.update(TICK_MS)
+        ticks += 1
+    return (seed, engine.score, engine.lines_cleared, engine.level, engine.pieces_placed, ticks)
+
+
+def play_shard(seeds, policy_name, max_pieces, randomizer=DEFAULT_RANDOMIZER):
+    """Worker entry point: play a batch of seeds and return compact result tuples"""
+    return [play_game(seed, policy_name, max_pieces, randomizer) for seed in seeds]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Aggregator:
+    """Collects per-game results and summarizes them"""
+
+    FIELDS = ('score', 'lines', 'level', 'pieces', 'ticks')
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, results):
+        self.results.extend(results)
+
+    def histogram(self, values, buckets=10):
+        """Equal-width histogram as a list of (low, high, count)"""
+        low, high = min(values), max(values)
+        width = max(1, -(-(high - low + 1) // buckets))
+        counts = {}
+        for value in values:
+            start = low + (value - low) // width * width
+            counts[start] = counts.get(start, 0) + 1
+        return [(start, start + width - 1, counts[start]) for start in sorted(counts)]
+
+    def summary(self):
+        summary = {'games': len(self.results)}
+        if not self.results:
+            return summary
+        for i, field in enumerate(self.FIELDS, start=1):
+            values = sorted(result[i] for result in self.results)
+            summary[field] = {
+                'mean': sum(values) / len(values),
+                'min': values[0],
+                'p50': percentile(values, 0.50),
+                'p90': percentile(values, 0.90),
+                'p99': percentile(values, 0.99),
+                'max': values[-1],
+            }
+        summary['score_histogram'] = self.histogram([result[1] for result in self.results])
+        return summary
+
+
+def run(games, workers, policy_name, max_pieces, seed_base=0, shard_size=16, progress=None,
+        randomizer=DEFAULT_RANDOMIZER):
+    """Shard seeded games across a process pool and aggregate the results"""
+    seeds = list(range(seed_base, seed_base + games))
+    shards = [seeds[i:i + shard_size] for i in range(0, len(seeds), shard_size)]
+    aggregator = Aggregator()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_shard, shard, policy_name, max_pieces, randomizer) for shard in shards]
+        for future in as_completed(futures):
+            aggregator.add(future.result())
+            if progress:
+                progress(len(aggregator.results), games)
+    return aggregator
+
+
+def print_summary(summary, elapsed):
+    print(f"Games: {summary['games']} in {elapsed:.1f}s "
+          f"({summary['games'] / elapsed:.1f} games/s)")
+    for field in Aggregator.FIELDS:
+        stats = summary.get(field)
+        if stats:
+            print(f"  {field:7s} mean {stats['mean']:9.1f}  p50 {stats['p50']:7}  "
+                  f"p90 {stats['p90']:7}  p99 {stats['p99']:7}  max {stats['max']:7}")
+    if 'score_histogram' in summary:
+        print("  score histogram:")
+        peak = max(count for _, _, count in summary['score_histogram'])
+        for low, high, count in summary['score_histogram']:
+            bar = '#' * max(1, count * 40 // peak)
+            print(f"    {low:6}-{high:<6} {count:6} {bar}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded self-play games in parallel")
+    parser.add_argument('--games', type=int, default=200, help="number of games to play")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+    parser.add_argument('--max-pieces', type=int, default=1000, help="stop a game after this many pieces")
+    parser.add_argument('--randomizer', choices=sorted(RANDOMIZERS), default=DEFAULT_RANDOMIZER)
+    parser.add_argument('--seed', type=int, default=0, help="first seed; games use consecutive seeds")
+    parser.add_argument('--shard-size', type=int, default=16, help="games per worker task")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        if not args.json:
+            print(f"\r{done}/{total} games", end='', file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    aggregator = run(args.games, args.workers, args.policy, args.max_pieces,
+                     args.seed, args.shard_size, progress, args.randomizer)
+    elapsed = time.perf_counter() - start
+    summary = aggregator.summary()
+    if args.json:
+        summary['elapsed'] = elapsed
+        print(json.dumps(summary, indent=2))
+    else:
+        print(file=sys.stderr)
+        print_summary(summary, elapsed)
+
+
+if __name__ == "__main__":
+    main()
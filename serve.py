@@ -0,0 +1,111 @@
+"""Production server for the web version (app.py).
+
+    python serve.py                        # $PORT (default 5000), WEB_WORKERS processes
+    python serve.py --workers 2 --threads 8
+
+Serves app.py with debug off under gunicorn: one process per worker, each
+with a pool of request threads. Processes cannot share the in-memory JSON
+store, so the SQLite backend is used (TETRIS_DB_BACKEND=sqlite). Every
+worker keeps its own leaderboard index and response cache and picks up the
+other workers' writes within app.SYNC_INTERVAL (see app.sync_shared_store).
+
+Without gunicorn installed it falls back to werkzeug's threaded server in a
+single process.
+
+    python serve.py --startup-report       # cold start of one worker, then exit
+
+reports, for the same environment, the import time of each module app.py
+imports, its startup phases and the first requests' latency (startup.py).
+"""
+import argparse
+import os
+import sys
+
+DEFAULT_PORT = 5000
+DEFAULT_THREADS = 8
+
+# Request threads per worker kept free of replay verification (health checks, leaderboards)
+FREE_THREADS = 2
+
+
+def default_workers():
+    return int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+
+
+def configure(workers, threads=DEFAULT_THREADS):
+    """Environment for app.py; must be set before it is imported"""
+    backend = os.environ.setdefault('TETRIS_DB_BACKEND', 'sqlite')
+    if workers > 1 and backend != 'sqlite':
+        sys.exit(f"TETRIS_DB_BACKEND={backend} keeps users in one process; use sqlite with --workers > 1")
+    # Share the CPUs between the workers' replay verification pools
+    os.environ.setdefault('VERIFY_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+    # A request thread waits while its replay is verified: fewer pending
+    # verifications than threads, so slow replays cannot take every thread
+    os.environ.setdefault('VERIFY_MAX_PENDING', str(max(1, threads - FREE_THREADS)))
+
+
+def close_store(server, worker):
+    """gunicorn worker_exit hook: flush the worker's store"""
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.store.close()
+
+
+def run_gunicorn(host, port, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', threads)
+            self.cfg.set('keepalive', 5)
+            self.cfg.set('worker_exit', close_store)
+
+        def load(self):
+            # Imported in each worker after the fork: own SQLite connections and verifier pool
+            from app import app
+            return app
+
+    Server().run()
+
+
+def run_werkzeug(host, port):
+    from werkzeug.serving import run_simple
+    from app import app
+
+    run_simple(host, port, app, threaded=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', DEFAULT_PORT)))
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', DEFAULT_THREADS)))
+    parser.add_argument('--startup-report', action='store_true',
+                        help="measure a worker's cold start (imports, startup phases, first requests) and exit")
+    args = parser.parse_args()
+
+    if args.startup_report:
+        from startup import print_report, report
+        configure(args.workers, args.threads)
+        print_report(report())
+        return
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        if args.workers > 1:
+            print("gunicorn is not installed; serving with one werkzeug process", file=sys.stderr)
+        configure(1)
+        run_werkzeug(args.host, args.port)
+        return
+
+    configure(args.workers, args.threads)
+    run_gunicorn(args.host, args.port, args.workers, args.threads)
+
+
+if __name__ == '__main__':
+    main()
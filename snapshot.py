@@ -0,0 +1,259 @@
+"""Compact binary snapshots of a game's state for network sync and spectating.
+
+A state is a fixed-layout byte string: a 25-byte header (piece, next piece,
+score, lines, level, flags, rows being cleared, pending garbage) followed by
+the board as one 4-bit piece-type index per cell (100 bytes for 10x20).
+Row bitmasks are derived from the cells on decode (BoardState.row_masks).
+
+SnapshotEncoder turns successive states into frames:
+  keyframe  b'K' + seq (u16) + the full state
+  delta     b'D' + seq (u16) + runs of (skip, length, XOR bytes) against
+            the previous state, skip and length as varints
+A piece moving one cell costs about ten bytes; a locked piece with its new
+board cells a few dozen. A keyframe is sent first, every keyframe_interval
+frames, and whenever one is requested (a new subscriber). static/snapshot.js
+implements the same format for the browser.
+"""
+import re
+import struct
+
+from board import DEFAULT_PALETTE
+from pieces import TETRIS_SHAPES
+
+KEYFRAME = 0x4B  # 'K'
+DELTA = 0x44     # 'D'
+
+# Frames between keyframes
+KEYFRAME_INTERVAL = 200
+
+# width, height, piece type, piece x, piece y, rotation, next type,
+# score, lines, level, flags, clearing rows mask, pending garbage rows
+HEADER = struct.Struct('<BBBbbBBIIIBIB')
+FRAME_HEADER = struct.Struct('<BH')
+
+FLAG_GAME_OVER = 1
+FLAG_PAUSED = 2
+
+# Score, lines and level are u32; larger values (bot runs, never a real game) are sent capped
+COUNTER_MAX = 0xFFFFFFFF
+
+# Piece types as 1-based indices in TETRIS_SHAPES order, which is also the
+# order of board.DEFAULT_PALETTE (index 8 is garbage)
+PIECE_TYPES = list(TETRIS_SHAPES)
+TYPE_INDEX = {name: i + 1 for i, name in enumerate(PIECE_TYPES)}
+COLOR_INDEX = {color: i for i, color in enumerate(DEFAULT_PALETTE) if color}
+GARBAGE_INDEX = len(DEFAULT_PALETTE) - 1
+
+HIGH_NIBBLE = bytes(b >> 4 for b in range(256))
+LOW_NIBBLE = bytes(b & 0x0F for b in range(256))
+
+# Changed bytes, merging runs separated by at most two unchanged bytes
+# (cheaper to resend them than to start a new run)
+CHANGED_RUN = re.compile(rb'[^\x00](?:\x00{0,2}[^\x00])*')
+
+
+class SnapshotError(ValueError):
+    """Malformed frame, or a delta that does not follow the decoder's state"""
+
+
+def cell_indices(board):
+    """Piece-type index per cell, row by row, as bytes"""
+    colors = getattr(board, 'colors', None)
+    if colors is not None:
+        # BitBoard: the color plane holds indices into board.palette, which
+        # are ours only while the palette is still DEFAULT_PALETTE
+        palette = board.palette
+        if palette == DEFAULT_PALETTE:
+            return bytes(colors)
+        table = bytes(COLOR_INDEX.get(color, GARBAGE_INDEX) if color else 0 for color in palette)
+        return bytes(colors).translate(table.ljust(256, b'\0'))
+    return bytes(COLOR_INDEX.get(color, GARBAGE_INDEX) if color else 0
+                 for y in range(board.height) for color in board.grid[y])
+
+
+def pack_cells(cells):
+    """Two 4-bit cells per byte (cells has an even length)"""
+    high = cells[0::2]
+    low = cells[1::2]
+    # Each high cell shifted by 4 stays inside its own byte, so the whole
+    # plane is packed with two big-integer operations
+    packed = (int.from_bytes(high, 'big') << 4) | int.from_bytes(low, 'big')
+    return packed.to_bytes(len(high), 'big')
+
+
+def unpack_cells(packed):
+    cells = bytearray(len(packed) * 2)
+    cells[0::2] = packed.translate(HIGH_NIBBLE)
+    cells[1::2] = packed.translate(LOW_NIBBLE)
+    return bytes(cells)
+
+
+def pack_state(engine):
+    """State of a TetrisEngine (or TetrisGame.engine) as bytes"""
+    piece = engine.current_piece
+    next_piece = engine.next_piece
+    flags = (FLAG_GAME_OVER if engine.game_over else 0) | (FLAG_PAUSED if engine.paused else 0)
+    clearing = 0
+    for y in engine.clearing_lines:
+        clearing |= 1 << y
+    header = HEADER.pack(
+        engine.width, engine.height,
+        TYPE_INDEX[piece.type] if piece else 0,
+        piece.x if piece else 0, piece.y if piece else 0, piece.rotation if piece else 0,
+        TYPE_INDEX[next_piece.type] if next_piece else 0,
+        min(engine.score, COUNTER_MAX), min(engine.lines_cleared, COUNTER_MAX),
+        min(engine.level, COUNTER_MAX), flags, clearing,
+        min(255, sum(count for count, _ in engine.pending_garbage)))
+    return header + pack_cells(cell_indices(engine.board))
+
+
+class BoardState:
+    """Decoded snapshot"""
+
+    __slots__ = ('width', 'height', 'piece', 'x', 'y', 'rotation', 'next_piece', 'score',
+                 'lines', 'level', 'game_over', 'paused', 'clearing', 'garbage', 'cells')
+
+    def __init__(self, state):
+        (self.width, self.height, piece, self.x, self.y, self.rotation, next_piece,
+         self.score, self.lines, self.level, flags, clearing, self.garbage) = HEADER.unpack_from(state)
+        self.piece = PIECE_TYPES[piece - 1] if piece else None
+        self.next_piece = PIECE_TYPES[next_piece - 1] if next_piece else None
+        self.game_over = bool(flags & FLAG_GAME_OVER)
+        self.paused = bool(flags & FLAG_PAUSED)
+        self.clearing = [y for y in range(self.height) if clearing >> y & 1]
+        self.cells = unpack_cells(state[HEADER.size:])
+
+    def cell(self, x, y):
+        """Piece-type index at (x, y): 0 empty, 1..7 TETRIS_SHAPES order, 8 garbage"""
+        return self.cells[y * self.width + x]
+
+    def color(self, x, y):
+        """Color at (x, y) as the board stores it, or 0 if empty"""
+        return DEFAULT_PALETTE[self.cell(x, y)]
+
+    def row_masks(self):
+        """Occupancy as row bitmasks, as board.row_masks() returns it"""
+        w = self.width
+        return tuple(sum(1 << x for x in range(w) if self.cells[y * w + x]) for y in range(self.height))
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise SnapshotError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def xor_bytes(a, b):
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+
+def encode_delta(previous, state):
+    """Runs of XOR bytes turning previous into state (same length)"""
+    out = bytearray()
+    pos = 0
+    for run in CHANGED_RUN.finditer(xor_bytes(previous, state)):
+        start, end = run.span()
+        write_varint(out, start - pos)
+        write_varint(out, end - start)
+        out += run.group()
+        pos = end
+    return bytes(out)
+
+
+def apply_delta(previous, delta):
+    state = bytearray(previous)
+    pos = 0
+    offset = 0
+    while pos < len(delta):
+        skip, pos = read_varint(delta, pos)
+        length, pos = read_varint(delta, pos)
+        offset += skip
+        if offset + length > len(state) or pos + length > len(delta):
+            raise SnapshotError("Delta run out of range")
+        for i in range(length):
+            state[offset + i] ^= delta[pos + i]
+        pos += length
+        offset += length
+    return bytes(state)
+
+
+class SnapshotEncoder:
+    """Frames for one board's successive states"""
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.state = None
+        self.seq = 0
+        self.since_keyframe = 0
+        self.force_keyframe = True
+
+    def request_keyframe(self):
+        """Make the next frame a keyframe"""
+        self.force_keyframe = True
+
+    def encode(self, state):
+        """Frame for a new state, or None if nothing changed"""
+        previous = self.state
+        if state == previous and not self.force_keyframe:
+            return None
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.state = state
+        self.since_keyframe += 1
+        if (self.force_keyframe or previous is None or len(previous) != len(state)
+                or self.since_keyframe >= self.keyframe_interval):
+            self.force_keyframe = False
+            self.since_keyframe = 0
+            return FRAME_HEADER.pack(KEYFRAME, self.seq) + state
+        return FRAME_HEADER.pack(DELTA, self.seq) + encode_delta(previous, state)
+
+    def keyframe(self):
+        """Keyframe of the current state for a new subscriber (seq matches the last frame)"""
+        if self.state is None:
+            return None
+        return FRAME_HEADER.pack(KEYFRAME, self.seq) + self.state
+
+
+class SnapshotDecoder:
+    """Rebuilds states from frames produced by SnapshotEncoder"""
+
+    def __init__(self):
+        self.state = None
+        self.seq = None
+
+    def decode(self, frame):
+        """Apply a frame; returns the BoardState.
+
+        A delta that does not directly follow the last frame raises
+        SnapshotError; wait for the next keyframe then.
+        """
+        if len(frame) < FRAME_HEADER.size:
+            raise SnapshotError("Truncated frame")
+        kind, seq = FRAME_HEADER.unpack_from(frame)
+        body = frame[FRAME_HEADER.size:]
+        if kind == KEYFRAME:
+            if len(body) < HEADER.size:
+                raise SnapshotError("Truncated keyframe")
+            self.state = bytes(body)
+        elif kind == DELTA:
+            if self.state is None or seq != (self.seq + 1) & 0xFFFF:
+                raise SnapshotError("Delta without the preceding frame")
+            self.state = apply_delta(self.state, body)
+        else:
+            raise SnapshotError(f"Unknown frame type {kind}")
+        self.seq = seq
+        return BoardState(self.state)
@@ -0,0 +1,316 @@
+"""Spectator fan-out: every match tick is encoded once and written to all viewers.
+
+A Channel is the feed of one match. It owns the match's snapshot encoders,
+so the binary tick message built for the players (see game_server.py) is
+the same byte buffer that goes to every spectator: encoding cost does not
+grow with the number of viewers.
+
+Backpressure is per viewer and never blocks the tick: a viewer whose unsent
+bytes exceed HIGH_WATER stops receiving deltas; once its buffer drains below
+LOW_WATER it is sent a keyframe of the current state and follows the deltas
+again. Idle viewers cost only their connection.
+
+    python spectator.py --bench 1000 10000 50000
+    python spectator.py --load 15000 --url ws://127.0.0.1:8765
+
+--bench measures fan-out time in-process with null connections; --load
+connects idle WebSocket viewers to a running game server and reports the
+server's fan-out latency, viewer queue depth and memory use.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import struct
+import time
+from array import array
+from urllib.parse import urlsplit
+
+from snapshot import SnapshotEncoder
+from ws_protocol import OP_BINARY, connect, encode_frame
+
+# Binary tick message: b'T' + tick (u32), then per board index (u8), length (u16), snapshot frame
+TICK_MESSAGE = 0x54  # 'T'
+TICK_HEADER = struct.Struct('<BI')
+BOARD_HEADER = struct.Struct('<BH')
+
+# Unsent bytes at which a viewer stops getting deltas, and where it resumes with a keyframe
+HIGH_WATER = 64 * 1024
+LOW_WATER = 8 * 1024
+
+# Fan-out durations kept for the statistics
+FANOUT_HISTORY = 1024
+
+
+def tick_message(tick, frames):
+    """Binary tick message from [(board index, snapshot frame)]"""
+    message = bytearray(TICK_HEADER.pack(TICK_MESSAGE, tick & 0xFFFFFFFF))
+    for index, frame in frames:
+        message += BOARD_HEADER.pack(index, len(frame))
+        message += frame
+    return bytes(message)
+
+
+class Viewer:
+    __slots__ = ('ws', 'channel', 'stalled')
+
+    def __init__(self, ws, channel):
+        self.ws = ws
+        self.channel = channel
+        self.stalled = False
+
+
+class Channel:
+    """One match's feed: per-board snapshot encoders and the viewers"""
+
+    def __init__(self, channel_id, boards, info=None):
+        self.id = channel_id
+        self.encoders = [SnapshotEncoder() for _ in range(boards)]
+        self.info = info or {}
+        self.viewers = set()
+        self.tick = 0
+        self.keyframe_cache = None
+
+    def encode_tick(self, tick, states):
+        """WebSocket frame for one tick from each board's packed state (None if unchanged).
+
+        Returns None when no board changed.
+        """
+        frames = []
+        for index, state in enumerate(states):
+            if state is not None:
+                frame = self.encoders[index].encode(state)
+                if frame is not None:
+                    frames.append((index, frame))
+        if not frames:
+            return None
+        self.tick = tick
+        self.keyframe_cache = None
+        return encode_frame(tick_message(tick, frames), OP_BINARY)
+
+    def keyframe(self):
+        """WebSocket frame with keyframes of every board's current state (shared by all late joiners)"""
+        if self.keyframe_cache is None:
+            frames = [(index, encoder.keyframe()) for index, encoder in enumerate(self.encoders)
+                      if encoder.state is not None]
+            self.keyframe_cache = encode_frame(tick_message(self.tick, frames), OP_BINARY)
+        return self.keyframe_cache
+
+
+class SpectatorHub:
+    """Channels by match id and the fan-out to their viewers"""
+
+    def __init__(self, high_water=HIGH_WATER, low_water=LOW_WATER):
+        self.high_water = high_water
+        self.low_water = low_water
+        self.channels = {}
+        self.viewers = 0
+        self.frames_published = 0
+        self.bytes_written = 0
+        self.deltas_skipped = 0
+        self.keyframes_resent = 0
+        self.fanouts = 0
+        self.fanout_times = array('d', bytes(8 * FANOUT_HISTORY))
+
+    def open(self, channel_id, boards, info=None):
+        channel = Channel(channel_id, boards, info)
+        self.channels[channel_id] = channel
+        return channel
+
+    def close(self, channel_id, message=None):
+        """Remove a channel; its viewers get message (text) and are unsubscribed"""
+        channel = self.channels.pop(channel_id, None)
+        if channel is None:
+            return
+        frame = encode_frame(message) if message is not None else None
+        for viewer in channel.viewers:
+            viewer.channel = None
+            if frame is not None and not viewer.ws.closed:
+                viewer.ws.send_frame(frame)
+        self.viewers -= len(channel.viewers)
+        channel.viewers.clear()
+
+    def subscribe(self, ws, channel_id, viewer=None):
+        """Start (or move) a viewer on a channel; sends the current keyframe. Returns the Viewer or None"""
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            return None
+        if viewer is None:
+            viewer = Viewer(ws, channel)
+        else:
+            self.unsubscribe(viewer)
+            viewer.channel = channel
+        viewer.stalled = False
+        channel.viewers.add(viewer)
+        self.viewers += 1
+        if any(encoder.state is not None for encoder in channel.encoders):
+            ws.send_frame(channel.keyframe())
+        return viewer
+
+    def unsubscribe(self, viewer):
+        channel = viewer.channel
+        if channel is not None and viewer in channel.viewers:
+            channel.viewers.discard(viewer)
+            self.viewers -= 1
+        viewer.channel = None
+
+    def publish(self, channel, frame):
+        """Write one encoded frame to every viewer of a channel"""
+        viewers = channel.viewers
+        if not viewers:
+            return
+        start = time.perf_counter()
+        size = len(frame)
+        written = 0
+        high_water = self.high_water
+        for viewer in viewers:
+            ws = viewer.ws
+            if ws.closed:
+                continue
+            if viewer.stalled:
+                if ws.buffered() > self.low_water:
+                    self.deltas_skipped += 1
+                    continue
+                # Drained: catch up with the current state instead of the missed deltas
+                viewer.stalled = False
+                self.keyframes_resent += 1
+                keyframe = channel.keyframe()
+                ws.send_frame(keyframe)
+                written += len(keyframe)
+                continue
+            ws.send_frame(frame)
+            written += size
+            if ws.buffered() > high_water:
+                viewer.stalled = True
+        self.frames_published += 1
+        self.bytes_written += written
+        self.fanout_times[self.fanouts % FANOUT_HISTORY] = (time.perf_counter() - start) * 1000
+        self.fanouts += 1
+
+    def stats(self):
+        """Fan-out latency, viewer queue depth and memory use"""
+        samples = sorted(self.fanout_times[:min(self.fanouts, FANOUT_HISTORY)]) or [0.0]
+        depths = sorted(viewer.ws.buffered() for channel in self.channels.values()
+                        for viewer in channel.viewers) or [0]
+        return {
+            'channels': len(self.channels),
+            'viewers': self.viewers,
+            'frames_published': self.frames_published,
+            'bytes_written': self.bytes_written,
+            'fanout_p50_ms': samples[len(samples) // 2],
+            'fanout_p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            'fanout_max_ms': samples[-1],
+            'queue_p99_bytes': depths[min(len(depths) - 1, int(len(depths) * 0.99))],
+            'queue_max_bytes': depths[-1],
+            'stalled_viewers': sum(viewer.stalled for channel in self.channels.values()
+                                   for viewer in channel.viewers),
+            'deltas_skipped': self.deltas_skipped,
+            'keyframes_resent': self.keyframes_resent,
+            # ru_maxrss is in kilobytes on Linux
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+
+# Measurement
+
+def bench(viewers, ticks=200, seed=0):
+    """Fan one simulated match out to viewers null connections; returns the hub's stats"""
+    from engine import TetrisEngine
+    from game_server import NullSocket
+    from snapshot import pack_state
+
+    hub = SpectatorHub()
+    channel = hub.open(1, 1)
+    for _ in range(viewers):
+        hub.subscribe(NullSocket(), 1)
+    rng = random.Random(seed)
+    engine = TetrisEngine(seed=seed)
+    for tick in range(ticks):
+        if engine.game_over:
+            engine = TetrisEngine(seed=rng.getrandbits(32))
+        if rng.random() < 0.25:
+            engine.apply_action(rng.randrange(1, 6))
+        engine.update(50)
+        frame = channel.encode_tick(tick, [pack_state(engine)])
+        if frame is not None:
+            hub.publish(channel, frame)
+    return hub.stats()
+
+
+async def idle_viewer(host, port, seed, deadline, totals, connecting):
+    """Watch live matches until the deadline, moving to another match when one ends"""
+    rng = random.Random(seed)
+    async with connecting:
+        ws = await connect(host, port)
+    totals['connected'] += 1
+    try:
+        ws.send(json.dumps({'type': 'matches'}))
+        loop = asyncio.get_running_loop()
+        while loop.time() < deadline:
+            try:
+                message = await asyncio.wait_for(ws.recv(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            totals['messages'] += 1
+            totals['bytes'] += len(message)
+            if isinstance(message, str):
+                data = json.loads(message)
+                if data.get('type') == 'matches':
+                    if data['matches']:
+                        ws.send(json.dumps({'type': 'spectate', 'match': rng.choice(data['matches'])['match']}))
+                    else:
+                        await asyncio.sleep(1.0)
+                        ws.send(json.dumps({'type': 'matches'}))
+                elif data.get('type') == 'end':
+                    ws.send(json.dumps({'type': 'matches'}))
+    finally:
+        await ws.close()
+
+
+async def run_load(url, viewers, duration):
+    address = urlsplit(url)
+    host, port = address.hostname, address.port or 80
+    totals = {'connected': 0, 'messages': 0, 'bytes': 0}
+    loop = asyncio.get_running_loop()
+    connecting = asyncio.Semaphore(100)
+    # Time for every viewer to connect, then the measured period
+    deadline = loop.time() + viewers / 1000 + duration
+    results = await asyncio.gather(
+        *(idle_viewer(host, port, seed, deadline, totals, connecting) for seed in range(viewers)),
+        return_exceptions=True)
+    ws = await connect(host, port)
+    ws.send(json.dumps({'type': 'stats'}))
+    server_stats = json.loads(await ws.recv())
+    await ws.close()
+    return {
+        'viewers': viewers,
+        'connected': totals['connected'],
+        'failed': sum(isinstance(result, Exception) for result in results),
+        'messages': totals['messages'],
+        'kbytes': totals['bytes'] / 1024,
+        'client_max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'server': server_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spectator fan-out measurements")
+    parser.add_argument('--bench', type=int, nargs='+', metavar='VIEWERS',
+                        help="in-process fan-out time for these viewer counts")
+    parser.add_argument('--load', type=int, metavar='VIEWERS', help="idle viewers against --url")
+    parser.add_argument('--url', default='ws://127.0.0.1:8765')
+    parser.add_argument('--duration', type=float, default=20.0)
+    args = parser.parse_args()
+
+    if args.bench:
+        for viewers in args.bench:
+            print(json.dumps({'viewers': viewers, **bench(viewers)}))
+    elif args.load:
+        print(json.dumps(asyncio.run(run_load(args.url, args.load, args.duration)), indent=2))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+"""SQLite user storage shared by the desktop game and the web app.
+
+One table indexed on high_score, WAL journaling so readers never block the
+writer, one connection per thread, and fixed parameterized statements
+(sqlite3 keeps them prepared in its per-connection statement cache).
+Score updates are single UPDATE/UPSERT statements, so concurrent games
+never lose an increment.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    high_score INTEGER NOT NULL DEFAULT 0,
+    games_played INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_by_high_score ON users (high_score DESC, username);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS period_scores (
+    period TEXT NOT NULL,
+    username TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (period, username)
+);
+CREATE TABLE IF NOT EXISTS game_seeds (
+    username TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    issued REAL NOT NULL,
+    PRIMARY KEY (username, seed)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    writer INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    period TEXT
+);
+"""
+
+SELECT_USER = "SELECT high_score, games_played FROM users WHERE username = ?"
+INSERT_USER = "INSERT OR IGNORE INTO users (username) VALUES (?)"
+SAVE_USER = ("INSERT INTO users (username, high_score, games_played) VALUES (?, ?, ?) "
+             "ON CONFLICT (username) DO UPDATE SET "
+             "high_score = excluded.high_score, games_played = excluded.games_played")
+# Count a game and keep the best score in one statement
+RECORD_SCORE = ("UPDATE users SET games_played = games_played + 1, high_score = MAX(high_score, ?) "
+                "WHERE username = ?")
+UPSERT_SCORE = ("INSERT INTO users (username, high_score, games_played) VALUES (?, ?, 1) "
+                "ON CONFLICT (username) DO UPDATE SET "
+                "games_played = games_played + 1, high_score = MAX(high_score, excluded.high_score)")
+TOP_USERS = ("SELECT username, high_score, games_played FROM users "
+             "ORDER BY high_score DESC, username LIMIT ? OFFSET ?")
+COUNT_USERS = "SELECT COUNT(*) FROM users"
+ALL_SCORES = "SELECT username, high_score FROM users"
+# Best score per player within a day or week (leaderboard.period_key)
+RECORD_PERIOD_SCORE = ("INSERT INTO period_scores (period, username, score) VALUES (?, ?, ?) "
+                       "ON CONFLICT (period, username) DO UPDATE SET score = MAX(score, excluded.score)")
+PERIOD_SCORES = "SELECT username, score FROM period_scores WHERE period = ?"
+
+# Seeds of games started on the server, used up by the verified submission
+ISSUE_SEED = "INSERT OR REPLACE INTO game_seeds (username, seed, issued) VALUES (?, ?, ?)"
+TRIM_SEEDS = ("DELETE FROM game_seeds WHERE username = ? AND seed NOT IN "
+              "(SELECT seed FROM game_seeds WHERE username = ? ORDER BY issued DESC LIMIT ?)")
+CLAIM_SEED = "DELETE FROM game_seeds WHERE username = ? AND seed = ? AND issued >= ?"
+
+MIGRATION_KEY = 'migrated_json'
+
+# Change log: every write also appends (writer pid, username, score, period or
+# NULL) to changes, so other processes can apply just those scores to their
+# leaderboards. Scores only ever count as "best of", so applying a change
+# late or twice gives the same board.
+LOG_CHANGE = "INSERT INTO changes (writer, username, score, period) VALUES (?, ?, ?, ?)"
+CHANGES_SINCE = ("SELECT id, writer, username, score, period FROM changes "
+                 "WHERE id > ? ORDER BY id LIMIT ?")
+LAST_CHANGE = "SELECT COALESCE(MAX(id), 0) FROM changes"
+FIRST_CHANGE = "SELECT MIN(id) FROM changes"
+PRUNE_CHANGES = "DELETE FROM changes WHERE id <= ?"
+# Entries kept in the log; a process further behind rebuilds from the tables
+CHANGE_LOG_SIZE = 10000
+CHANGES_BATCH = 1000
+
+
+class SQLiteUserStore:
+    """Same interface as user_store.UserStore, backed by an SQLite file"""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.watch_conn = None
+        self.watch_version = None
+        conn = self.connection()
+        conn.executescript(SCHEMA)
+
+    def connection(self):
+        """This thread's connection"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # Autocommit: every statement is its own transaction unless BEGIN is used
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def __contains__(self, username):
+        return self.get_user(username) is not None
+
+    def __len__(self):
+        return self.connection().execute(COUNT_USERS).fetchone()[0]
+
+    def get_user(self, username):
+        """User's data, or None"""
+        row = self.connection().execute(SELECT_USER, (username,)).fetchone()
+        if row is None:
+            return None
+        return {'high_score': row[0], 'games_played': row[1]}
+
+    def create_user(self, username):
+        """Create the user if missing; returns (data, created)"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            created = conn.execute(INSERT_USER, (username,)).rowcount == 1
+            if created:
+                self.log_changes(conn, [(username, 0, None)])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get_user(username), created
+
+    def save_user(self, username, data):
+        """Overwrite a user's data"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(SAVE_USER, (username, data.get('high_score', 0),
+                                     data.get('games_played', 0)))
+            self.log_changes(conn, [(username, data.get('high_score', 0), None)])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record_score(self, username, score):
+        """Count a played game and keep the best score.
+
+        Returns (data, new_record), or None if the user does not exist.
+        """
+        return self.record_scores([(username, score)])[0]
+
+    def record_scores(self, results):
+        """record_score() for many (username, score) pairs in one transaction.
+
+        Returns a list with (data, new_record) or None for each pair, in order.
+        """
+        conn = self.connection()
+        outcomes = []
+        changes = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for username, score in results:
+                if conn.execute(RECORD_SCORE, (score, username)).rowcount == 0:
+                    outcomes.append(None)
+                    continue
+                data = self.get_user(username)
+                outcomes.append((data, score == data['high_score'] and score > 0))
+                changes.append((username, data['high_score'], None))
+            self.log_changes(conn, changes)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return outcomes
+
+    def update_user_score(self, username, score):
+        """Count a game for a user, creating the user if needed; returns the new data"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(UPSERT_SCORE, (username, score))
+            data = self.get_user(username)
+            self.log_changes(conn, [(username, data['high_score'], None)])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return data
+
+    def scores(self):
+        """(username, high_score) of every user"""
+        return self.connection().execute(ALL_SCORES).fetchall()
+
+    def top(self, limit=10, offset=0):
+        """Best players as (username, data), highest score first (served by the index)"""
+        rows = self.connection().execute(TOP_USERS, (limit, offset)).fetchall()
+        return [(username, {'high_score': high_score, 'games_played': games_played})
+                for username, high_score, games_played in rows]
+
+    def record_period_scores(self, entries):
+        """Keep the best score of each (period, username, score) entry"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(RECORD_PERIOD_SCORE, entries)
+            self.log_changes(conn, [(username, score, period) for period, username, score in entries])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def period_scores(self, period):
+        """(username, score) of every player with a result in a period"""
+        return self.connection().execute(PERIOD_SCORES, (period,)).fetchall()
+
+    def issue_seed(self, username, seed, max_open):
+        """Remember a game seed issued to a user, keeping the user's max_open newest"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(ISSUE_SEED, (username, seed, time.time()))
+            conn.execute(TRIM_SEEDS, (username, username, max_open))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim_seed(self, username, seed, issued_after):
+        """Use up a seed issued to a user after issued_after (a timestamp); False if there is none.
+
+        A single DELETE, so of two submissions of the same game only one succeeds.
+        """
+        return self.connection().execute(CLAIM_SEED, (username, seed, issued_after)).rowcount == 1
+
+    def log_changes(self, conn, changes):
+        """Append (username, score, period) changes to the log; call inside the write transaction"""
+        if not changes:
+            return
+        writer = os.getpid()
+        conn.executemany(LOG_CHANGE, [(writer, username, score, period)
+                                      for username, score, period in changes])
+        last = conn.execute(LAST_CHANGE).fetchone()[0]
+        if last % CHANGES_BATCH < len(changes):
+            conn.execute(PRUNE_CHANGES, (last - CHANGE_LOG_SIZE,))
+
+    def last_change(self):
+        """Id of the newest change; read before loading leaderboards, then pass to changes_since()"""
+        return self.connection().execute(LAST_CHANGE).fetchone()[0]
+
+    def changes_since(self, last_id):
+        """Changes other processes made after last_id.
+
+        Returns (changes, last_id) with changes as [(username, score, period)]
+        (period None for the overall high score), or (None, last_id) if the log
+        no longer reaches back to last_id and the caller must reload. PRAGMA
+        data_version on a connection that never writes tells cheaply whether
+        anything was committed at all; the log is only read when it moved.
+        """
+        with self.lock:
+            if self.watch_conn is None:
+                self.watch_conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                                  check_same_thread=False)
+            conn = self.watch_conn
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.watch_version:
+                return [], last_id
+            self.watch_version = version
+            first = conn.execute(FIRST_CHANGE).fetchone()[0]
+            if first is not None and first > last_id + 1:
+                return None, conn.execute(LAST_CHANGE).fetchone()[0]
+            writer = os.getpid()
+            changes = []
+            while True:
+                rows = conn.execute(CHANGES_SINCE, (last_id, CHANGES_BATCH)).fetchall()
+                for change_id, change_writer, username, score, period in rows:
+                    if change_writer != writer:
+                        changes.append((username, score, period))
+                if len(rows) < CHANGES_BATCH:
+                    break
+                last_id = rows[-1][0]
+            if rows:
+                last_id = rows[-1][0]
+            return changes, last_id
+
+    def migrate_json(self, paths):
+        """Import the old JSON user files once.
+
+        Users present in several files are merged: the best high score and
+        the total of games played. Later calls do nothing.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (MIGRATION_KEY,)).fetchone():
+                conn.execute("COMMIT")
+                return 0
+            merged = {}
+            for path in paths:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        users = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if not isinstance(users, dict):
+                    continue
+                for username, data in users.items():
+                    high_score, games_played = merged.get(username, (0, 0))
+                    merged[username] = (max(high_score, int(data.get('high_score', 0))),
+                                        games_played + int(data.get('games_played', 0)))
+            conn.executemany(
+                "INSERT INTO users (username, high_score, games_played) VALUES (?, ?, ?) "
+                "ON CONFLICT (username) DO UPDATE SET "
+                "high_score = MAX(high_score, excluded.high_score), "
+                "games_played = games_played + excluded.games_played",
+                [(username, high_score, games_played)
+                 for username, (high_score, games_played) in merged.items()])
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)",
+                         (MIGRATION_KEY, json.dumps([os.path.basename(p) for p in paths])))
+            self.log_changes(conn, [(username, high_score, None)
+                                    for username, (high_score, _) in merged.items()])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(merged)
+
+    def flush(self):
+        """Writes are committed immediately; nothing to do"""
+        return False
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+            if self.watch_conn is not None:
+                self.watch_conn.close()
+                self.watch_conn = None
+        self.local = threading.local()
@@ -0,0 +1,118 @@
+"""Cold start measurements for the web service.
+
+app.py wraps its startup work (user store, leaderboards, rules, template
+compilation) in phase(); report() starts a fresh interpreter with
+-X importtime, imports app there and returns the import time of each module
+app imports directly, the phase timings and the latency of the first
+requests, which is what a client waiting on a scale-from-zero instance sees.
+
+    python serve.py --startup-report
+    python app.py --startup-report
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Phase name -> milliseconds, in the order the phases ran
+PHASES = {}
+
+# Modules the web service should not load at startup (desktop client, bots, optional backends)
+UNWANTED_MODULES = ('pygame', 'numpy', 'replit', 'multiprocessing', 'renderer', 'game', 'main')
+
+# Requests timed right after the import, each path once
+FIRST_REQUESTS = ('/', '/api/leaderboard', '/api/rules', '/healthz')
+
+# Run in the child interpreter: import the app, then time the first requests
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - start) * 1000
+import startup
+client = app.app.test_client()
+requests = {}
+for path in startup.FIRST_REQUESTS:
+    start = time.perf_counter()
+    status = client.get(path).status_code
+    requests[path] = [status, (time.perf_counter() - start) * 1000]
+print(json.dumps({'import_ms': import_ms, 'phases': startup.PHASES, 'requests': requests,
+                  'unwanted': [name for name in startup.UNWANTED_MODULES if name in sys.modules]}))
+'''
+
+
+@contextmanager
+def phase(name):
+    """Time a block of startup work under name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES[name] = (time.perf_counter() - start) * 1000
+
+
+def parse_importtime(output):
+    """[(module, self_ms, cumulative_ms, depth)] from -X importtime output, in print order"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the column header
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(fields[0]) / 1000, int(fields[1]) / 1000, depth))
+    return entries
+
+
+def direct_imports(entries, module):
+    """Entries for the modules that module imports itself (children are printed before their parent)"""
+    children = []
+    for name, self_ms, cumulative_ms, depth in entries:
+        if depth == 0:
+            if name == module:
+                return children
+            children = []
+        elif depth == 1:
+            children.append((name, self_ms, cumulative_ms))
+    return []
+
+
+def report(cwd=None):
+    """Measure a cold import of app.py in a new interpreter (environment inherited)"""
+    # Not imported with app.py: startup.phase() is all the web service itself needs
+    import subprocess
+
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [cwd, os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    child = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=cwd, env=env,
+                           capture_output=True, text=True)
+    process_ms = (time.perf_counter() - start) * 1000
+    if child.returncode != 0:
+        raise RuntimeError(f"Importing app failed:\n{child.stderr[-2000:]}")
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    imports = sorted(direct_imports(parse_importtime(child.stderr), 'app'), key=lambda entry: -entry[2])
+    result['process_ms'] = process_ms
+    result['imports'] = [{'module': name, 'ms': cumulative_ms} for name, _, cumulative_ms in imports]
+    return result
+
+
+def print_report(result, file=sys.stdout):
+    print(f"Process start to exit: {result['process_ms']:.0f} ms "
+          f"(import app: {result['import_ms']:.0f} ms, timed with -X importtime)", file=file)
+    print("\nImports of app.py (cumulative):", file=file)
+    for entry in result['imports']:
+        print(f"  {entry['module']:<24} {entry['ms']:8.1f} ms", file=file)
+    print("\nStartup phases:", file=file)
+    for name, ms in result['phases'].items():
+        print(f"  {name:<24} {ms:8.1f} ms", file=file)
+    print("\nFirst requests:", file=file)
+    for path, (status, ms) in result['requests'].items():
+        print(f"  {path:<24} {ms:8.1f} ms  ({status})", file=file)
+    unwanted = result['unwanted']
+    print(f"\nNot loaded: {', '.join(name for name in UNWANTED_MODULES if name not in unwanted)}", file=file)
+    if unwanted:
+        print(f"Loaded at startup (should be lazy): {', '.join(unwanted)}", file=file)
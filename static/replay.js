@@ -0,0 +1,209 @@
+// Записи игр для проверки на сервере - тот же формат, что в replay.py
+//
+// Фигуры выдаются генератором 7-bag (randomizer.BagRandomizer) с тем же
+// seed, что у движка на Python: вихрь Мерсенна инициализируется и
+// перемешивает мешок так же, как random.Random в CPython. Поэтому сервер,
+// получив seed и поток ввода, пересчитывает ту же игру и тот же счёт.
+
+const REPLAY_MAGIC = [0x54, 0x42, 0x52, 0x50]; // 'TBRP'
+const REPLAY_VERSION = 1;
+const REPLAY_RANDOMIZER_CODES = { random: 0, '7bag': 1 };
+
+const REPLAY_OP_FRAME = 0;
+const REPLAY_OP_PAUSE = 6;
+const REPLAY_OP_END = 255;
+
+// Действия ввода, как engine.ACTION_*
+const ACTION_LEFT = 1;
+const ACTION_RIGHT = 2;
+const ACTION_SOFT_DROP = 3;
+const ACTION_ROTATE = 4;
+const ACTION_HARD_DROP = 5;
+
+const MT_N = 624;
+const MT_M = 397;
+
+// MT19937 с инициализацией как random.seed(n) в CPython для 0 <= n < 2**32
+class MersenneTwister {
+    constructor(seed) {
+        this.mt = new Uint32Array(MT_N);
+        this.index = MT_N;
+        this.initByArray([seed >>> 0]);
+    }
+
+    initGenrand(s) {
+        const mt = this.mt;
+        mt[0] = s >>> 0;
+        for (let i = 1; i < MT_N; i++) {
+            const prev = mt[i - 1] ^ (mt[i - 1] >>> 30);
+            mt[i] = (Math.imul(1812433253, prev) + i) >>> 0;
+        }
+    }
+
+    initByArray(key) {
+        const mt = this.mt;
+        this.initGenrand(19650218);
+        let i = 1;
+        let j = 0;
+        for (let k = Math.max(MT_N, key.length); k > 0; k--) {
+            const prev = mt[i - 1] ^ (mt[i - 1] >>> 30);
+            mt[i] = ((mt[i] ^ Math.imul(prev, 1664525)) + key[j] + j) >>> 0;
+            i++;
+            j++;
+            if (i >= MT_N) {
+                mt[0] = mt[MT_N - 1];
+                i = 1;
+            }
+            if (j >= key.length) {
+                j = 0;
+            }
+        }
+        for (let k = MT_N - 1; k > 0; k--) {
+            const prev = mt[i - 1] ^ (mt[i - 1] >>> 30);
+            mt[i] = ((mt[i] ^ Math.imul(prev, 1566083941)) - i) >>> 0;
+            i++;
+            if (i >= MT_N) {
+                mt[0] = mt[MT_N - 1];
+                i = 1;
+            }
+        }
+        mt[0] = 0x80000000;
+        this.index = MT_N;
+    }
+
+    twist() {
+        const mt = this.mt;
+        for (let k = 0; k < MT_N; k++) {
+            const y = (mt[k] & 0x80000000) | (mt[(k + 1) % MT_N] & 0x7fffffff);
+            mt[k] = mt[(k + MT_M) % MT_N] ^ (y >>> 1) ^ ((y & 1) ? 0x9908b0df : 0);
+        }
+        this.index = 0;
+    }
+
+    nextUint32() {
+        if (this.index >= MT_N) {
+            this.twist();
+        }
+        let y = this.mt[this.index++];
+        y ^= y >>> 11;
+        y ^= (y << 7) & 0x9d2c5680;
+        y ^= (y << 15) & 0xefc60000;
+        y ^= y >>> 18;
+        return y >>> 0;
+    }
+
+    // random.getrandbits(k) для k <= 32
+    getrandbits(k) {
+        return this.nextUint32() >>> (32 - k);
+    }
+
+    // random._randbelow(n): отбор по getrandbits
+    randbelow(n) {
+        const k = 32 - Math.clz32(n);
+        let r = this.getrandbits(k);
+        while (r >= n) {
+            r = this.getrandbits(k);
+        }
+        return r;
+    }
+
+    // random.shuffle(x)
+    shuffle(x) {
+        for (let i = x.length - 1; i > 0; i--) {
+            const j = this.randbelow(i + 1);
+            [x[i], x[j]] = [x[j], x[i]];
+        }
+    }
+}
+
+// randomizer.BagRandomizer: каждые N фигур - перемешанный набор всех типов
+class BagRandomizer {
+    constructor(seed, pieceCount) {
+        this.kind = '7bag';
+        this.seed = seed;
+        this.pieceCount = pieceCount;
+        this.rng = new MersenneTwister(seed);
+        this.queue = [];
+    }
+
+    // Индекс типа следующей фигуры (порядок фигур из rules.json)
+    next() {
+        if (!this.queue.length) {
+            const bag = Array.from({ length: this.pieceCount }, (_, i) => i);
+            this.rng.shuffle(bag);
+            this.queue = bag;
+        }
+        return this.queue.shift();
+    }
+}
+
+function writeReplayVarint(out, value) {
+    while (value >= 0x80) {
+        out.push((value % 0x80) | 0x80);
+        value = Math.floor(value / 0x80);
+    }
+    out.push(value);
+}
+
+// replay.ReplayRecorder: заголовок, затем кадры, действия и паузы
+class ReplayRecorder {
+    constructor(seed, randomizer, width, height, username) {
+        this.bytes = REPLAY_MAGIC.slice();
+        this.bytes.push(REPLAY_VERSION, REPLAY_RANDOMIZER_CODES[randomizer]);
+        writeReplayVarint(this.bytes, seed);
+        writeReplayVarint(this.bytes, width);
+        writeReplayVarint(this.bytes, height);
+        const name = new TextEncoder().encode(username);
+        writeReplayVarint(this.bytes, name.length);
+        for (const byte of name) {
+            this.bytes.push(byte);
+        }
+        this.closed = false;
+    }
+
+    // Один шаг движка на dt целых миллисекунд
+    frame(dt) {
+        this.bytes.push(REPLAY_OP_FRAME);
+        writeReplayVarint(this.bytes, dt);
+    }
+
+    action(action) {
+        this.bytes.push(action);
+    }
+
+    pause() {
+        this.bytes.push(REPLAY_OP_PAUSE);
+    }
+
+    close(score) {
+        if (!this.closed) {
+            this.bytes.push(REPLAY_OP_END);
+            writeReplayVarint(this.bytes, score);
+            this.closed = true;
+        }
+    }
+
+    // Запись в base64 для поля replay в /api/save_score
+    toBase64() {
+        let binary = '';
+        for (let i = 0; i < this.bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, this.bytes.slice(i, i + 0x8000));
+        }
+        return btoa(binary);
+    }
+}
+
+// Случайный seed для новой игры (32 бита, как randomizer.PieceRandomizer)
+function newGameSeed() {
+    if (typeof crypto !== 'undefined' && crypto.getRandomValues) {
+        return crypto.getRandomValues(new Uint32Array(1))[0];
+    }
+    return Math.floor(Math.random() * 0x100000000);
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = {
+        MersenneTwister, BagRandomizer, ReplayRecorder, newGameSeed,
+        ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE, ACTION_HARD_DROP
+    };
+}
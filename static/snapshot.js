@@ -0,0 +1,281 @@
+// Компактные снимки состояния игры - тот же формат, что в snapshot.py
+//
+// Состояние: заголовок 25 байт (фигура, следующая фигура, очки, линии,
+// уровень, флаги, очищаемые строки, ожидающий мусор) и поле - по 4 бита
+// (индекс типа фигуры) на клетку.
+// Кадры: 'K' + seq (u16) + всё состояние или 'D' + seq + участки
+// (пропуск, длина, байты XOR) относительно предыдущего состояния.
+
+const SNAPSHOT_KEYFRAME = 0x4B; // 'K'
+const SNAPSHOT_DELTA = 0x44;    // 'D'
+const SNAPSHOT_KEYFRAME_INTERVAL = 200;
+const SNAPSHOT_HEADER_SIZE = 25;
+const SNAPSHOT_FRAME_HEADER_SIZE = 3;
+
+const SNAPSHOT_FLAG_GAME_OVER = 1;
+const SNAPSHOT_FLAG_PAUSED = 2;
+
+// Очки, линии и уровень - u32, большие значения передаются ограниченными
+const SNAPSHOT_COUNTER_MAX = 0xFFFFFFFF;
+
+class SnapshotError extends Error {}
+
+// Типы фигур в порядке rules.json (как snapshot.PIECE_TYPES) из ответа
+// /api/rules; в клетках это индексы с 1, следующий за последним - мусор
+function snapshotPieceTypes(rulesData) {
+    return rulesData.rules.pieces.map(piece => piece.type);
+}
+
+// Состояние {width, height, piece, x, y, rotation, nextPiece, score, lines,
+// level, gameOver, paused, clearing: [y...], garbage, cells: Uint8Array} -> байты
+function packState(state, pieceTypes) {
+    const cellCount = state.width * state.height;
+    const bytes = new Uint8Array(SNAPSHOT_HEADER_SIZE + cellCount / 2);
+    const view = new DataView(bytes.buffer);
+    let clearing = 0;
+    for (const y of state.clearing) {
+        clearing |= 1 << y;
+    }
+    view.setUint8(0, state.width);
+    view.setUint8(1, state.height);
+    view.setUint8(2, state.piece ? pieceTypes.indexOf(state.piece) + 1 : 0);
+    view.setInt8(3, state.x);
+    view.setInt8(4, state.y);
+    view.setUint8(5, state.rotation);
+    view.setUint8(6, state.nextPiece ? pieceTypes.indexOf(state.nextPiece) + 1 : 0);
+    view.setUint32(7, Math.min(state.score, SNAPSHOT_COUNTER_MAX), true);
+    view.setUint32(11, Math.min(state.lines, SNAPSHOT_COUNTER_MAX), true);
+    view.setUint32(15, Math.min(state.level, SNAPSHOT_COUNTER_MAX), true);
+    view.setUint8(19, (state.gameOver ? SNAPSHOT_FLAG_GAME_OVER : 0) | (state.paused ? SNAPSHOT_FLAG_PAUSED : 0));
+    view.setUint32(20, clearing >>> 0, true);
+    view.setUint8(24, Math.min(255, state.garbage));
+    for (let i = 0; i < cellCount; i += 2) {
+        bytes[SNAPSHOT_HEADER_SIZE + i / 2] = (state.cells[i] << 4) | state.cells[i + 1];
+    }
+    return bytes;
+}
+
+// Байты состояния -> объект (как у packState)
+function unpackState(bytes, pieceTypes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    const width = view.getUint8(0);
+    const height = view.getUint8(1);
+    const piece = view.getUint8(2);
+    const nextPiece = view.getUint8(6);
+    const flags = view.getUint8(19);
+    const clearingMask = view.getUint32(20, true);
+    const clearing = [];
+    for (let y = 0; y < height; y++) {
+        if ((clearingMask >>> y) & 1) {
+            clearing.push(y);
+        }
+    }
+    const cells = new Uint8Array(width * height);
+    for (let i = 0; i < cells.length; i += 2) {
+        const packed = bytes[SNAPSHOT_HEADER_SIZE + i / 2];
+        cells[i] = packed >> 4;
+        cells[i + 1] = packed & 0x0F;
+    }
+    return {
+        width,
+        height,
+        piece: piece ? pieceTypes[piece - 1] : null,
+        x: view.getInt8(3),
+        y: view.getInt8(4),
+        rotation: view.getUint8(5),
+        nextPiece: nextPiece ? pieceTypes[nextPiece - 1] : null,
+        score: view.getUint32(7, true),
+        lines: view.getUint32(11, true),
+        level: view.getUint32(15, true),
+        gameOver: Boolean(flags & SNAPSHOT_FLAG_GAME_OVER),
+        paused: Boolean(flags & SNAPSHOT_FLAG_PAUSED),
+        clearing,
+        garbage: view.getUint8(24),
+        cells,
+        // Занятость строк битовыми масками, как board.row_masks()
+        rowMasks() {
+            const masks = [];
+            for (let y = 0; y < height; y++) {
+                let mask = 0;
+                for (let x = 0; x < width; x++) {
+                    if (cells[y * width + x]) {
+                        mask |= 1 << x;
+                    }
+                }
+                masks.push(mask);
+            }
+            return masks;
+        }
+    };
+}
+
+function writeVarint(out, value) {
+    while (value >= 0x80) {
+        out.push((value & 0x7F) | 0x80);
+        value >>>= 7;
+    }
+    out.push(value);
+}
+
+function readVarint(data, pos) {
+    let value = 0;
+    let shift = 0;
+    while (true) {
+        if (pos >= data.length) {
+            throw new SnapshotError('Обрезанное число');
+        }
+        const byte = data[pos++];
+        value |= (byte & 0x7F) << shift;
+        if (byte < 0x80) {
+            return [value, pos];
+        }
+        shift += 7;
+    }
+}
+
+// Участки изменившихся байтов; разрывы до двух байт не начинают новый участок
+function encodeDelta(previous, state) {
+    const out = [];
+    let pos = 0;
+    let i = 0;
+    while (i < state.length) {
+        if (previous[i] === state[i]) {
+            i++;
+            continue;
+        }
+        const start = i;
+        let end = i + 1;
+        let j = end;
+        while (j < state.length && j - end <= 2) {
+            if (previous[j] !== state[j]) {
+                end = j + 1;
+            }
+            j++;
+        }
+        writeVarint(out, start - pos);
+        writeVarint(out, end - start);
+        for (let k = start; k < end; k++) {
+            out.push(previous[k] ^ state[k]);
+        }
+        pos = end;
+        i = end;
+    }
+    return out;
+}
+
+function applyDelta(previous, delta) {
+    const state = new Uint8Array(previous);
+    let pos = 0;
+    let offset = 0;
+    while (pos < delta.length) {
+        let skip, length;
+        [skip, pos] = readVarint(delta, pos);
+        [length, pos] = readVarint(delta, pos);
+        offset += skip;
+        if (offset + length > state.length || pos + length > delta.length) {
+            throw new SnapshotError('Участок за пределами состояния');
+        }
+        for (let i = 0; i < length; i++) {
+            state[offset + i] ^= delta[pos + i];
+        }
+        pos += length;
+        offset += length;
+    }
+    return state;
+}
+
+function sameBytes(a, b) {
+    if (!a || a.length !== b.length) {
+        return false;
+    }
+    for (let i = 0; i < a.length; i++) {
+        if (a[i] !== b[i]) {
+            return false;
+        }
+    }
+    return true;
+}
+
+class SnapshotEncoder {
+    constructor(keyframeInterval = SNAPSHOT_KEYFRAME_INTERVAL) {
+        this.keyframeInterval = keyframeInterval;
+        this.state = null;
+        this.seq = 0;
+        this.sinceKeyframe = 0;
+        this.forceKeyframe = true;
+    }
+
+    requestKeyframe() {
+        this.forceKeyframe = true;
+    }
+
+    // Кадр для нового состояния (Uint8Array) или null, если ничего не изменилось
+    encode(state) {
+        const previous = this.state;
+        if (sameBytes(previous, state) && !this.forceKeyframe) {
+            return null;
+        }
+        this.seq = (this.seq + 1) & 0xFFFF;
+        this.state = state;
+        this.sinceKeyframe++;
+        let kind, body;
+        if (this.forceKeyframe || !previous || previous.length !== state.length ||
+            this.sinceKeyframe >= this.keyframeInterval) {
+            this.forceKeyframe = false;
+            this.sinceKeyframe = 0;
+            kind = SNAPSHOT_KEYFRAME;
+            body = state;
+        } else {
+            kind = SNAPSHOT_DELTA;
+            body = encodeDelta(previous, state);
+        }
+        const frame = new Uint8Array(SNAPSHOT_FRAME_HEADER_SIZE + body.length);
+        frame[0] = kind;
+        frame[1] = this.seq & 0xFF;
+        frame[2] = this.seq >> 8;
+        frame.set(body, SNAPSHOT_FRAME_HEADER_SIZE);
+        return frame;
+    }
+}
+
+class SnapshotDecoder {
+    // rulesData - ответ /api/rules, как у TetrisGame
+    constructor(rulesData) {
+        this.pieceTypes = snapshotPieceTypes(rulesData);
+        this.state = null;
+        this.seq = null;
+    }
+
+    // Применить кадр (Uint8Array); дельта без предыдущего кадра - SnapshotError,
+    // тогда нужно дождаться ключевого кадра
+    decode(frame) {
+        if (frame.length < SNAPSHOT_FRAME_HEADER_SIZE) {
+            throw new SnapshotError('Обрезанный кадр');
+        }
+        const kind = frame[0];
+        const seq = frame[1] | (frame[2] << 8);
+        const body = frame.subarray(SNAPSHOT_FRAME_HEADER_SIZE);
+        if (kind === SNAPSHOT_KEYFRAME) {
+            if (body.length < SNAPSHOT_HEADER_SIZE) {
+                throw new SnapshotError('Обрезанный ключевой кадр');
+            }
+            this.state = new Uint8Array(body);
+        } else if (kind === SNAPSHOT_DELTA) {
+            if (this.state === null || seq !== ((this.seq + 1) & 0xFFFF)) {
+                throw new SnapshotError('Дельта без предыдущего кадра');
+            }
+            this.state = applyDelta(this.state, body);
+        } else {
+            throw new SnapshotError('Неизвестный тип кадра ' + kind);
+        }
+        this.seq = seq;
+        return unpackState(this.state, this.pieceTypes);
+    }
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = {
+        SnapshotEncoder, SnapshotDecoder, SnapshotError, packState, unpackState,
+        snapshotPieceTypes
+    };
+}
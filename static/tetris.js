@@ -1,15 +1,40 @@
 // Tetris Web Game - Modern Classic Edition
 
+// Правила игры (фигуры, повороты, гравитация, очки) приходят с сервера -
+// те же, что у движка на Python (rules.json), поэтому очки сравнимы
+let rulesPromise = null;
+
+function loadRules() {
+    if (!rulesPromise) {
+        rulesPromise = fetch(typeof RULES_URL !== 'undefined' ? RULES_URL : '/api/rules')
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Не удалось загрузить правила: ' + response.status);
+                }
+                return response.json();
+            })
+            .catch(error => {
+                rulesPromise = null;
+                throw error;
+            });
+    }
+    return rulesPromise;
+}
+
 class TetrisGame {
-    constructor() {
+    constructor(rulesData) {
         this.canvas = document.getElementById('gameCanvas');
         this.ctx = this.canvas.getContext('2d');
         this.nextCanvas = document.getElementById('nextCanvas');
         this.nextCtx = this.nextCanvas.getContext('2d');
         
+        const rules = rulesData.rules;
+        this.rules = rules;
+        this.rulesVersion = rulesData.version;
+        
         // Размеры игрового поля
-        this.BOARD_WIDTH = 10;
-        this.BOARD_HEIGHT = 20;
+        this.BOARD_WIDTH = rules.board.width;
+        this.BOARD_HEIGHT = rules.board.height;
         this.BLOCK_SIZE = 30;
         
         // Игровое состояние
@@ -20,65 +45,47 @@ class TetrisGame {
         this.level = 1;
         this.lines = 0;
         this.dropTime = 0;
-        this.dropInterval = 1000; // 1 секунда для первого уровня
+        this.dropInterval = this.fallSpeed(1);
         this.isPaused = false;
         this.isGameOver = false;
         this.username = '';
         
-        // Цвета для фигур
-        this.colors = [
-            '#FF0000', // I - красный
-            '#00FF00', // O - зелёный  
-            '#0000FF', // T - синий
-            '#FFFF00', // S - жёлтый
-            '#FF00FF', // Z - пурпурный
-            '#00FFFF', // J - голубой
-            '#FFA500'  // L - оранжевый
-        ];
-        
-        // Формы тетромино
-        this.pieces = [
-            // I
-            [
-                [1,1,1,1]
-            ],
-            // O
-            [
-                [1,1],
-                [1,1]
-            ],
-            // T
-            [
-                [0,1,0],
-                [1,1,1]
-            ],
-            // S
-            [
-                [0,1,1],
-                [1,1,0]
-            ],
-            // Z
-            [
-                [1,1,0],
-                [0,1,1]
-            ],
-            // J
-            [
-                [1,0,0],
-                [1,1,1]
-            ],
-            // L
-            [
-                [0,0,1],
-                [1,1,1]
-            ]
-        ];
+        // Очищаемые строки ждут окончания анимации, как в движке
+        this.clearingLines = [];
+        this.clearTime = 0;
+        
+        // Типы фигур в порядке правил; в клетках поля - индекс типа + 1,
+        // последний индекс палитры - мусорные строки
+        this.pieceTypes = rules.pieces.map(piece => piece.type);
+        this.colors = rules.pieces.map(piece => this.cssColor(piece.color));
+        this.colors.push(this.cssColor(rules.garbage_color));
+        
+        // Готовые таблицы поворотов: rotations[тип][поворот] -> [[dx, dy], ...]
+        this.rotations = this.pieceTypes.map(type => rulesData.rotations[type]);
+        
+        // Сначала поворот на месте, затем отскоки от стен
+        this.kicks = [[0, 0]].concat(rules.wall_kicks);
         
         this.initBoard();
         this.bindEvents();
         this.bindMobileEvents();
     }
     
+    cssColor(rgb) {
+        return `rgb(${rgb[0]}, ${rgb[1]}, ${rgb[2]})`;
+    }
+    
+    // Миллисекунды на шаг падения на уровне
+    fallSpeed(level) {
+        const gravity = this.rules.gravity;
+        return Math.max(gravity.min_ms, gravity.start_ms - (level - 1) * gravity.step_ms);
+    }
+    
+    linePoints(lines) {
+        const table = this.rules.scoring.line_points;
+        return table[Math.min(lines, table.length - 1)];
+    }
+    
     initBoard() {
         // Создать пустое игровое поле
         this.board = Array(this.BOARD_HEIGHT).fill().map(() => Array(this.BOARD_WIDTH).fill(0));
@@ -91,19 +98,19 @@ class TetrisGame {
             switch(e.key) {
                 case 'ArrowLeft':
                     e.preventDefault();
-                    this.movePiece(-1, 0);
+                    this.applyAction(ACTION_LEFT);
                     break;
                 case 'ArrowRight':
                     e.preventDefault();
-                    this.movePiece(1, 0);
+                    this.applyAction(ACTION_RIGHT);
                     break;
                 case 'ArrowDown':
                     e.preventDefault();
-                    this.movePiece(0, 1);
+                    this.applyAction(ACTION_SOFT_DROP);
                     break;
                 case 'ArrowUp':
                     e.preventDefault();
-                    this.rotatePiece();
+                    this.applyAction(ACTION_ROTATE);
                     break;
                 case ' ':
                     e.preventDefault();
@@ -161,25 +168,25 @@ class TetrisGame {
         
         addButtonEvents(leftBtn, () => {
             if (!this.isGameOver && !this.isPaused) {
-                this.movePiece(-1, 0);
+                this.applyAction(ACTION_LEFT);
             }
         });
         
         addButtonEvents(rightBtn, () => {
             if (!this.isGameOver && !this.isPaused) {
-                this.movePiece(1, 0);
+                this.applyAction(ACTION_RIGHT);
             }
         });
         
         addButtonEvents(downBtn, () => {
             if (!this.isGameOver && !this.isPaused) {
-                this.movePiece(0, 1);
+                this.applyAction(ACTION_SOFT_DROP);
             }
         });
         
         addButtonEvents(rotateBtn, () => {
             if (!this.isGameOver && !this.isPaused) {
-                this.rotatePiece();
+                this.applyAction(ACTION_ROTATE);
             }
         });
         
@@ -190,27 +197,55 @@ class TetrisGame {
         });
     }
     
+    // Ввод, как TetrisEngine.apply_action: не действует на паузе, во время
+    // очистки строк и после конца игры; остальное попадает в запись игры
+    applyAction(action) {
+        if (this.isGameOver || this.isPaused || this.clearingLines.length) return;
+        
+        this.recorder.action(action);
+        switch (action) {
+            case ACTION_LEFT:
+                this.movePiece(-1, 0);
+                break;
+            case ACTION_RIGHT:
+                this.movePiece(1, 0);
+                break;
+            case ACTION_SOFT_DROP:
+                this.movePiece(0, 1);
+                break;
+            case ACTION_ROTATE:
+                this.rotatePiece();
+                break;
+        }
+    }
+    
     createPiece() {
-        const type = Math.floor(Math.random() * this.pieces.length);
+        // Фигуры из генератора 7-bag с seed игры - сервер получит ту же последовательность
+        const type = this.randomizer.next();
         return {
-            shape: this.pieces[type],
-            color: this.colors[type],
-            x: Math.floor(this.BOARD_WIDTH / 2) - Math.floor(this.pieces[type][0].length / 2),
-            y: 0,
-            type: type
+            type: type,
+            rotation: 0,
+            x: 0,
+            y: 0
         };
     }
     
+    pieceCoords(piece, rotation = piece.rotation) {
+        return this.rotations[piece.type][rotation];
+    }
+    
     spawnPiece() {
         if (!this.nextPiece) {
             this.nextPiece = this.createPiece();
         }
         
         this.currentPiece = this.nextPiece;
+        this.currentPiece.x = Math.floor(this.BOARD_WIDTH / 2) + this.rules.spawn.column_offset;
+        this.currentPiece.y = this.rules.spawn.row;
         this.nextPiece = this.createPiece();
         
         // Проверить game over
-        if (this.checkCollision(this.currentPiece)) {
+        if (this.checkCollision(this.currentPiece.x, this.currentPiece.y, this.pieceCoords(this.currentPiece))) {
             this.gameOver();
             return false;
         }
@@ -220,74 +255,52 @@ class TetrisGame {
     }
     
     movePiece(dx, dy) {
-        if (!this.currentPiece || this.isPaused) return;
+        if (!this.currentPiece || this.isPaused || this.clearingLines.length) return false;
         
-        const newPiece = {
-            ...this.currentPiece,
-            x: this.currentPiece.x + dx,
-            y: this.currentPiece.y + dy
-        };
+        const x = this.currentPiece.x + dx;
+        const y = this.currentPiece.y + dy;
         
-        if (!this.checkCollision(newPiece)) {
-            this.currentPiece = newPiece;
+        // Фигура фиксируется только гравитацией (см. update), как в движке
+        if (!this.checkCollision(x, y, this.pieceCoords(this.currentPiece))) {
+            this.currentPiece.x = x;
+            this.currentPiece.y = y;
             return true;
         }
         
-        // Если фигура не может двигаться вниз, зафиксировать её
-        if (dy > 0) {
-            this.placePiece();
-            return false;
-        }
-        
         return false;
     }
     
     rotatePiece() {
-        if (!this.currentPiece || this.isPaused) return;
-        
-        const rotated = this.rotateMatrix(this.currentPiece.shape);
-        const newPiece = {
-            ...this.currentPiece,
-            shape: rotated
-        };
-        
-        if (!this.checkCollision(newPiece)) {
-            this.currentPiece.shape = rotated;
+        if (!this.currentPiece || this.isPaused || this.clearingLines.length) return;
+        
+        const piece = this.currentPiece;
+        const rotation = (piece.rotation + 1) % 4;
+        const coords = this.pieceCoords(piece, rotation);
+        
+        // Поворот на месте, затем отскоки от стен по порядку
+        for (const [dx, dy] of this.kicks) {
+            if (!this.checkCollision(piece.x + dx, piece.y + dy, coords)) {
+                piece.x += dx;
+                piece.y += dy;
+                piece.rotation = rotation;
+                return;
+            }
         }
     }
     
-    rotateMatrix(matrix) {
-        const n = matrix.length;
-        const m = matrix[0].length;
-        const rotated = Array(m).fill().map(() => Array(n).fill(0));
-        
-        for (let i = 0; i < n; i++) {
-            for (let j = 0; j < m; j++) {
-                rotated[j][n - 1 - i] = matrix[i][j];
+    checkCollision(x, y, coords) {
+        for (const [dx, dy] of coords) {
+            const boardX = x + dx;
+            const boardY = y + dy;
+            
+            // Проверить границы
+            if (boardX < 0 || boardX >= this.BOARD_WIDTH || boardY >= this.BOARD_HEIGHT) {
+                return true;
             }
-        }
-        
-        return rotated;
-    }
-    
-    checkCollision(piece) {
-        for (let y = 0; y < piece.shape.length; y++) {
-            for (let x = 0; x < piece.shape[y].length; x++) {
-                if (piece.shape[y][x]) {
-                    const boardX = piece.x + x;
-                    const boardY = piece.y + y;
-                    
-                    // Проверить границы
-                    if (boardX < 0 || boardX >= this.BOARD_WIDTH || 
-                        boardY >= this.BOARD_HEIGHT) {
-                        return true;
-                    }
-                    
-                    // Проверить столкновение с другими блоками
-                    if (boardY >= 0 && this.board[boardY][boardX]) {
-                        return true;
-                    }
-                }
+            
+            // Проверить столкновение с другими блоками
+            if (boardY >= 0 && this.board[boardY][boardX]) {
+                return true;
             }
         }
         return false;
@@ -295,83 +308,89 @@ class TetrisGame {
     
     placePiece() {
         // Поместить фигуру на доску
-        for (let y = 0; y < this.currentPiece.shape.length; y++) {
-            for (let x = 0; x < this.currentPiece.shape[y].length; x++) {
-                if (this.currentPiece.shape[y][x]) {
-                    const boardX = this.currentPiece.x + x;
-                    const boardY = this.currentPiece.y + y;
-                    
-                    if (boardY >= 0) {
-                        this.board[boardY][boardX] = this.currentPiece.type + 1;
-                    }
-                }
+        const piece = this.currentPiece;
+        for (const [dx, dy] of this.pieceCoords(piece)) {
+            const boardX = piece.x + dx;
+            const boardY = piece.y + dy;
+            
+            if (boardY >= 0 && boardY < this.BOARD_HEIGHT) {
+                this.board[boardY][boardX] = piece.type + 1;
             }
         }
-        
-        // Проверить и убрать заполненные линии
-        this.clearLines();
-        
-        // Создать новую фигуру
-        this.spawnPiece();
     }
     
-    clearLines() {
-        let linesCleared = 0;
-        
-        for (let y = this.BOARD_HEIGHT - 1; y >= 0; y--) {
+    fullRows() {
+        const rows = [];
+        for (let y = 0; y < this.BOARD_HEIGHT; y++) {
             if (this.board[y].every(cell => cell !== 0)) {
-                // Удалить линию
-                this.board.splice(y, 1);
-                // Добавить новую пустую линию сверху
-                this.board.unshift(Array(this.BOARD_WIDTH).fill(0));
-                linesCleared++;
-                y++; // Проверить эту линию снова
+                rows.push(y);
             }
         }
+        return rows;
+    }
+    
+    startLineClear(rows) {
+        this.clearingLines = rows;
+        this.clearTime = 0;
+        
+        // Очки начисляются сразу, строки убираются после анимации
+        this.score += this.linePoints(rows.length);
+        this.lines += rows.length;
+        
+        const newLevel = Math.floor(this.score / this.rules.scoring.level_points) + 1;
+        if (newLevel > this.level) {
+            this.level = newLevel;
+            this.dropInterval = this.fallSpeed(this.level);
+        }
         
-        if (linesCleared > 0) {
-            // Подсчёт очков (квадратичный)
-            const points = linesCleared * linesCleared * 100 * this.level;
-            this.score += points;
-            this.lines += linesCleared;
-            
-            // Повышение уровня каждые 10 линий
-            const newLevel = Math.floor(this.lines / 10) + 1;
-            if (newLevel > this.level) {
-                this.level = newLevel;
-                // Увеличить скорость
-                this.dropInterval = Math.max(100, 1000 - (this.level - 1) * 100);
-            }
-            
-            this.updateUI();
+        this.updateUI();
+    }
+    
+    finishLineClear() {
+        // Удалить строки и добавить пустые сверху
+        for (const y of this.clearingLines) {
+            this.board.splice(y, 1);
+            this.board.unshift(Array(this.BOARD_WIDTH).fill(0));
         }
+        this.clearingLines = [];
+        this.clearTime = 0;
+        this.spawnPiece();
     }
     
     togglePause() {
+        if (this.isGameOver) return;
         this.isPaused = !this.isPaused;
+        this.recorder.pause();
         document.getElementById('pauseScreen').style.display = this.isPaused ? 'flex' : 'none';
     }
     
     gameOver() {
         this.isGameOver = true;
+        this.recorder.close(this.score);
         this.saveScore();
     }
     
     async saveScore() {
         try {
+            // Сервер пересчитывает игру по записи и засчитывает свой результат;
+            // без выданного сервером seed засчитывается только сыгранная игра
+            const payload = { username: this.username };
+            if (this.serverSeed) {
+                payload.replay = this.recorder.toBase64();
+            }
             const response = await fetch('/api/save_score', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({
-                    username: this.username,
-                    score: this.score
-                })
+                body: JSON.stringify(payload)
             });
             
             const data = await response.json();
-            this.showGameOverScreen(data.new_record);
+            if (!response.ok) {
+                console.error('Результат не засчитан:', data.error);
+            }
+            this.showGameOverScreen(Boolean(data.new_record));
         } catch (error) {
             console.error('Ошибка сохранения результата:', error);
             this.showGameOverScreen(false);
@@ -394,10 +413,28 @@ class TetrisGame {
     update(deltaTime) {
         if (this.isPaused || this.isGameOver) return;
         
+        this.recorder.frame(deltaTime);
         this.dropTime += deltaTime;
         
-        if (this.dropTime >= this.dropInterval) {
-            this.movePiece(0, 1);
+        // Анимация очистки строк: новая фигура появится после неё
+        if (this.clearingLines.length) {
+            this.clearTime += deltaTime;
+            if (this.clearTime >= this.rules.line_clear.duration_ms) {
+                this.finishLineClear();
+                return;
+            }
+        }
+        
+        if (!this.clearingLines.length && this.dropTime >= this.dropInterval) {
+            if (!this.movePiece(0, 1)) {
+                this.placePiece();
+                const rows = this.fullRows();
+                if (rows.length) {
+                    this.startLineClear(rows);
+                } else {
+                    this.spawnPiece();
+                }
+            }
             this.dropTime = 0;
         }
     }
@@ -410,8 +447,8 @@ class TetrisGame {
         // Нарисовать доску
         this.drawBoard();
         
-        // Нарисовать текущую фигуру
-        if (this.currentPiece) {
+        // Нарисовать текущую фигуру (во время очистки строк она уже на доске)
+        if (this.currentPiece && !this.clearingLines.length) {
             this.drawPiece(this.currentPiece);
         }
         
@@ -420,10 +457,14 @@ class TetrisGame {
     }
     
     drawBoard() {
+        // Очищаемые строки мигают после задержки из правил
+        const flashing = this.clearTime >= this.rules.line_clear.flash_delay_ms &&
+            Math.floor(this.clearTime / 100) % 2 === 0;
         for (let y = 0; y < this.BOARD_HEIGHT; y++) {
+            const clearing = flashing && this.clearingLines.includes(y);
             for (let x = 0; x < this.BOARD_WIDTH; x++) {
                 if (this.board[y][x]) {
-                    this.ctx.fillStyle = this.colors[this.board[y][x] - 1];
+                    this.ctx.fillStyle = clearing ? '#ffffff' : this.colors[this.board[y][x] - 1];
                     this.ctx.fillRect(
                         x * this.BLOCK_SIZE + 1,
                         y * this.BLOCK_SIZE + 1,
@@ -436,18 +477,17 @@ class TetrisGame {
     }
     
     drawPiece(piece) {
-        this.ctx.fillStyle = piece.color;
-        
-        for (let y = 0; y < piece.shape.length; y++) {
-            for (let x = 0; x < piece.shape[y].length; x++) {
-                if (piece.shape[y][x]) {
-                    this.ctx.fillRect(
-                        (piece.x + x) * this.BLOCK_SIZE + 1,
-                        (piece.y + y) * this.BLOCK_SIZE + 1,
-                        this.BLOCK_SIZE - 2,
-                        this.BLOCK_SIZE - 2
-                    );
-                }
+        this.ctx.fillStyle = this.colors[piece.type];
+        
+        for (const [dx, dy] of this.pieceCoords(piece)) {
+            const y = piece.y + dy;
+            if (y >= 0) {
+                this.ctx.fillRect(
+                    (piece.x + dx) * this.BLOCK_SIZE + 1,
+                    y * this.BLOCK_SIZE + 1,
+                    this.BLOCK_SIZE - 2,
+                    this.BLOCK_SIZE - 2
+                );
             }
         }
     }
@@ -479,23 +519,24 @@ class TetrisGame {
         this.nextCtx.fillRect(0, 0, this.nextCanvas.width, this.nextCanvas.height);
         
         const piece = this.nextPiece;
+        const coords = this.pieceCoords(piece);
         const blockSize = 15;
-        const offsetX = (this.nextCanvas.width - piece.shape[0].length * blockSize) / 2;
-        const offsetY = (this.nextCanvas.height - piece.shape.length * blockSize) / 2;
-        
-        this.nextCtx.fillStyle = piece.color;
-        
-        for (let y = 0; y < piece.shape.length; y++) {
-            for (let x = 0; x < piece.shape[y].length; x++) {
-                if (piece.shape[y][x]) {
-                    this.nextCtx.fillRect(
-                        offsetX + x * blockSize,
-                        offsetY + y * blockSize,
-                        blockSize - 1,
-                        blockSize - 1
-                    );
-                }
-            }
+        const minX = Math.min(...coords.map(([dx]) => dx));
+        const minY = Math.min(...coords.map(([, dy]) => dy));
+        const width = Math.max(...coords.map(([dx]) => dx)) - minX + 1;
+        const height = Math.max(...coords.map(([, dy]) => dy)) - minY + 1;
+        const offsetX = (this.nextCanvas.width - width * blockSize) / 2;
+        const offsetY = (this.nextCanvas.height - height * blockSize) / 2;
+        
+        this.nextCtx.fillStyle = this.colors[piece.type];
+        
+        for (const [dx, dy] of coords) {
+            this.nextCtx.fillRect(
+                offsetX + (dx - minX) * blockSize,
+                offsetY + (dy - minY) * blockSize,
+                blockSize - 1,
+                blockSize - 1
+            );
         }
     }
     
@@ -505,19 +546,60 @@ class TetrisGame {
         document.getElementById('lines').textContent = this.lines;
     }
     
-    start() {
+    // Seed новой игры от сервера (одноразовый, привязан к игроку) или null
+    async requestGameSeed() {
+        try {
+            const response = await fetch('/api/new_game', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ username: this.username })
+            });
+            const data = await response.json();
+            if (response.ok) {
+                return data.seed;
+            }
+            console.error('Не удалось начать игру на сервере:', data.error);
+        } catch (error) {
+            console.error('Не удалось начать игру на сервере:', error);
+        }
+        return null;
+    }
+    
+    async start() {
+        // Seed запрашивается до сброса состояния: пока ответа нет, идёт прежний экран.
+        // Повторный запуск в это время (двойное нажатие) ничего не делает
+        if (this.starting) return;
+        this.starting = true;
+        const serverSeed = await this.requestGameSeed();
+        this.starting = false;
+        
         this.initBoard();
         this.score = 0;
         this.level = 1;
         this.lines = 0;
         this.dropTime = 0;
-        this.dropInterval = 1000;
+        this.dropInterval = this.fallSpeed(1);
+        this.clearingLines = [];
+        this.clearTime = 0;
         this.isPaused = false;
         this.isGameOver = false;
         this.currentPiece = null;
         this.nextPiece = null;
         
+        // Новая игра: seed, генератор фигур и запись ввода для проверки на сервере
+        this.serverSeed = serverSeed !== null;
+        const seed = this.serverSeed ? serverSeed : newGameSeed();
+        this.randomizer = new BagRandomizer(seed, this.pieceTypes.length);
+        this.recorder = new ReplayRecorder(seed, this.randomizer.kind,
+            this.BOARD_WIDTH, this.BOARD_HEIGHT, this.username);
+        
+        // Порядок выдачи фигур как в TetrisEngine.__init__: следующая фигура
+        // после первого появления берётся ещё раз
         this.spawnPiece();
+        this.nextPiece = this.createPiece();
+        this.drawNextPiece();
         this.updateUI();
         
         // Показать игровое поле и мобильные кнопки
@@ -530,13 +612,21 @@ class TetrisGame {
     }
     
     gameLoop() {
-        let lastTime = 0;
+        let lastTime = null;
+        let carry = 0;
         
         const loop = (currentTime) => {
-            const deltaTime = currentTime - lastTime;
+            // Игра идёт шагами в целые миллисекунды, как их записывает и
+            // пересчитывает сервер; дробный остаток переходит в следующий кадр
+            if (lastTime !== null) {
+                carry += currentTime - lastTime;
+                const deltaTime = Math.floor(carry);
+                carry -= deltaTime;
+                if (deltaTime > 0) {
+                    this.update(deltaTime);
+                }
+            }
             lastTime = currentTime;
-            
-            this.update(deltaTime);
             this.draw();
             
             if (!this.isGameOver) {
@@ -580,8 +670,9 @@ async function login() {
             document.getElementById('playerStats').innerHTML = 
                 `Рекорд: ${data.stats.high_score}<br>Игр: ${data.stats.games_played}`;
             
-            // Создать и запустить игру
-            game = new TetrisGame();
+            // Создать и запустить игру по правилам сервера
+            const rules = await loadRules();
+            game = new TetrisGame(rules);
             game.username = username;
             game.start();
         } else {
@@ -618,4 +709,6 @@ document.getElementById('usernameInput').addEventListener('keypress', (e) => {
 // Инициализация при загрузке страницы
 window.addEventListener('load', () => {
     document.getElementById('usernameInput').focus();
+    // Загрузить правила заранее, пока игрок вводит имя
+    loadRules().catch(error => console.error(error));
 });
\ No newline at end of file
@@ -0,0 +1,315 @@
+"""Invariants between the engine's alternative implementations.
+
+Headless and SDL-free (rendering uses SDL's dummy driver); checks needing
+numpy, pygame or node are skipped when those are missing.
+
+    python -m unittest test_invariants
+"""
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from board import BitBoard, ListBoard
+from engine import (TetrisEngine, ACTION_HARD_DROP, ACTION_LEFT, ACTION_RIGHT, ACTION_ROTATE,
+                    ACTION_SOFT_DROP)
+from pieces import PIECE_TYPES
+from placements import PlacementSearch, result_board
+from randomizer import BagRandomizer
+from replay import ReplayPlayer, ReplayRecorder, ReplayError
+from selfplay import GreedyPolicy
+from snapshot import SnapshotDecoder, SnapshotEncoder, pack_state
+from verify import record_bot_game, verify_replay
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pygame
+except ImportError:
+    pygame = None
+
+NODE = shutil.which('node')
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def random_actions(seed, count):
+    """Random inputs, mostly moves so games last a while"""
+    rng = random.Random(seed)
+    choices = [0, 0, 0, ACTION_LEFT, ACTION_RIGHT, ACTION_SOFT_DROP, ACTION_ROTATE, ACTION_HARD_DROP]
+    return [rng.choice(choices) for _ in range(count)]
+
+
+def bot_engines(seed, pieces, board_backend='bitboard'):
+    """Yield a greedy bot's engine before every piece it places"""
+    engine = TetrisEngine(seed=seed, board_backend=board_backend)
+    policy = GreedyPolicy(seed)
+    search = PlacementSearch(cache_size=0)
+    while not engine.game_over and engine.pieces_placed < pieces:
+        if not engine.clearing_lines:
+            yield engine
+            piece = engine.current_piece
+            placements = search.placements(engine.board, piece.type, piece.x, piece.y, piece.rotation)
+            for action in policy.choose(engine, placements).actions:
+                engine.apply_action(action)
+        engine.update(16)
+
+
+class BotInputs:
+    """A greedy bot's inputs for one engine, handed out one per frame"""
+
+    def __init__(self, seed):
+        self.policy = GreedyPolicy(seed)
+        self.search = PlacementSearch(cache_size=256)
+        self.pending = []
+
+    def next(self, engine):
+        if not self.pending and not engine.clearing_lines and not engine.game_over:
+            piece = engine.current_piece
+            placements = self.search.placements(engine.board, piece.type, piece.x, piece.y, piece.rotation)
+            if placements:
+                self.pending = list(self.policy.choose(engine, placements).actions)
+        return self.pending.pop(0) if self.pending else 0
+
+
+def run_node(script):
+    result = subprocess.run([NODE, '-e', script], cwd=ROOT, capture_output=True, text=True,
+                            check=True, timeout=60)
+    return json.loads(result.stdout)
+
+
+class BoardBackendTest(unittest.TestCase):
+    def test_list_and_bitboard_engines_agree(self):
+        for seed in range(10):
+            engines = [TetrisEngine(seed=seed, board_backend=backend) for backend in ('list', 'bitboard')]
+            for action in random_actions(seed, 2000):
+                for engine in engines:
+                    engine.apply_action(action)
+                    engine.update(16)
+                list_engine, bit_engine = engines
+                self.assertEqual(list_engine.board.row_masks(), bit_engine.board.row_masks())
+                self.assertEqual(list_engine.board.grid, bit_engine.board.grid)
+                self.assertEqual(list_engine.score, bit_engine.score)
+
+    def test_piece_collides_matches_cells(self):
+        rng = random.Random(0)
+        for width, height in ((10, 20), (6, 12), (12, 22)):
+            boards = ListBoard(width, height), BitBoard(width, height)
+            for _ in range(width * height // 3):
+                x, y = rng.randrange(width), rng.randrange(height)
+                for board in boards:
+                    board.place(x, y, [(0, 0)], (1, 2, 3))
+            for piece_type in PIECE_TYPES:
+                for rotation in range(4):
+                    for x in range(-3, width + 3):
+                        for y in range(-3, height + 3):
+                            self.assertEqual(boards[0].piece_collides(x, y, piece_type, rotation),
+                                             boards[1].piece_collides(x, y, piece_type, rotation))
+
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+class BatchEngineTest(unittest.TestCase):
+    def test_batch_matches_scalar_engines(self):
+        from batch import BatchEngine
+
+        for randomizer in ('random', '7bag'):
+            seeds = list(range(16))
+            batch = BatchEngine(len(seeds), seeds, randomizer=randomizer)
+            engines = [TetrisEngine(seed=seed, randomizer=randomizer) for seed in seeds]
+            # Half the boards play a bot game (line clears), half random inputs (top-outs)
+            bots = [BotInputs(seed) for seed in seeds[:8]]
+            streams = [random_actions(seed, 1200) for seed in seeds[8:]]
+            for step in range(1200):
+                actions = ([bot.next(engine) for bot, engine in zip(bots, engines)]
+                           + [stream[step] for stream in streams])
+                batch.step(actions)
+                for i, engine in enumerate(engines):
+                    engine.apply_action(actions[i])
+                    engine.update(16)
+                    piece = engine.current_piece
+                    self.assertEqual(tuple(batch.board_rows(i)), engine.board.row_masks(), (randomizer, i, step))
+                    self.assertEqual((batch.score[i], batch.lines_cleared[i], batch.level[i],
+                                      bool(batch.game_over[i])),
+                                     (engine.score, engine.lines_cleared, engine.level, engine.game_over))
+                    self.assertEqual((PIECE_TYPES[batch.piece[i]], batch.x[i], batch.y[i], batch.rotation[i]),
+                                     (piece.type, piece.x, piece.y, piece.rotation))
+
+
+class PlacementSearchTest(unittest.TestCase):
+    def test_placements_match_engine_inputs(self):
+        """Every placement's inputs land where it says; every naive input sequence is found"""
+        search = PlacementSearch()
+        for seed in range(3):
+            for count, engine in enumerate(bot_engines(seed, 60)):
+                if count % 3:
+                    continue
+                piece = engine.current_piece
+                start = engine.snapshot()
+                board = engine.board.copy()
+                placements = search.placements(board, piece.type, piece.x, piece.y, piece.rotation)
+                expected = {}
+                for placement in placements:
+                    rows = result_board(board, piece.type, placement)[0].row_masks()
+                    self.assertNotIn(rows, expected)
+                    expected[rows] = placement
+
+                    engine.restore(start)
+                    for action in placement.actions:
+                        engine.apply_action(action)
+                    self.assertEqual(engine.board.row_masks(), rows, placement)
+
+                # Brute force: rotate up to three times, shift towards every column, drop
+                for rotations in range(4):
+                    for target in range(-2, engine.width + 2):
+                        engine.restore(start)
+                        for _ in range(rotations):
+                            engine.apply_action(ACTION_ROTATE)
+                        step = ACTION_LEFT if target < engine.current_piece.x else ACTION_RIGHT
+                        for _ in range(abs(target - engine.current_piece.x)):
+                            engine.apply_action(step)
+                        engine.apply_action(ACTION_HARD_DROP)
+                        self.assertIn(engine.board.row_masks(), expected)
+                engine.restore(start)
+
+
+class ReplayTest(unittest.TestCase):
+    def test_bot_replays_verify(self):
+        for seed in range(5):
+            data = record_bot_game(seed, max_pieces=80)
+            result = verify_replay(data)
+            self.assertEqual(result.score, result.claimed_score)
+            self.assertEqual((result.username, result.seed), (f"bot{seed}", seed))
+
+    def test_replay_reproduces_the_game(self):
+        engine = TetrisEngine(seed=7, randomizer='7bag')
+        out = io.BytesIO()
+        recorder = ReplayRecorder.for_engine(engine, out, 'tester')
+        for i, action in enumerate(random_actions(7, 3000)):
+            if i == 1000:
+                engine.toggle_pause()
+            engine.apply_action(action)
+            engine.update(16 + i % 3)
+            if i == 1010:
+                engine.toggle_pause()
+        recorder.close(engine.score)
+
+        player = ReplayPlayer(out.getvalue(), snapshot_interval=100)
+        replayed = player.play()
+        self.assertEqual(replayed.board.row_masks(), engine.board.row_masks())
+        self.assertEqual((replayed.score, replayed.pieces_placed), (engine.score, engine.pieces_placed))
+        self.assertEqual(player.final_score, engine.score)
+
+        # Seeking from snapshots matches playing from the start
+        plain = ReplayPlayer(out.getvalue(), snapshot_interval=0)
+        for frame in (0, 150, 999, 1500, player.frame_count):
+            self.assertEqual(player.seek(frame).snapshot()['state'], plain.seek(frame).snapshot()['state'])
+
+    def test_wrong_score_is_rejected(self):
+        engine = TetrisEngine(seed=3)
+        out = io.BytesIO()
+        recorder = ReplayRecorder.for_engine(engine, out, 'cheater')
+        for action in random_actions(3, 500):
+            engine.apply_action(action)
+            engine.update(16)
+        recorder.close(engine.score + 100)
+        with self.assertRaises(ReplayError):
+            verify_replay(out.getvalue())
+
+
+class SnapshotTest(unittest.TestCase):
+    def game_states(self, seed=5, count=1500):
+        engine = TetrisEngine(seed=seed)
+        states = []
+        for action in random_actions(seed, count):
+            engine.apply_action(action)
+            engine.update(16)
+            states.append(pack_state(engine))
+        return states
+
+    def test_deltas_round_trip(self):
+        states = self.game_states()
+        encoder = SnapshotEncoder(keyframe_interval=50)
+        decoder = SnapshotDecoder()
+        for state in states:
+            frame = encoder.encode(state)
+            if frame is not None:
+                decoder.decode(frame)
+            self.assertEqual(decoder.state, state)
+
+    @unittest.skipUnless(NODE, "node is not installed")
+    def test_js_decoder_matches(self):
+        states = self.game_states(count=600)
+        encoder = SnapshotEncoder(keyframe_interval=50)
+        frames = [frame.hex() for frame in map(encoder.encode, states) if frame is not None]
+        decoded = run_node(f"""
+            const {{ SnapshotDecoder }} = require('./static/snapshot.js');
+            const decoder = new SnapshotDecoder({{ rules: {{ pieces: {json.dumps(PIECE_TYPES)}.map(type => ({{ type }})) }} }});
+            let state;
+            for (const hex of {json.dumps(frames)}) {{
+                state = decoder.decode(Uint8Array.from(Buffer.from(hex, 'hex')));
+            }}
+            console.log(JSON.stringify([Array.from(decoder.state), state.score, state.piece]));
+        """)
+        expected = SnapshotDecoder()
+        for frame in frames:
+            state = expected.decode(bytes.fromhex(frame))
+        self.assertEqual(decoded, [list(expected.state), state.score, state.piece])
+
+
+@unittest.skipUnless(NODE, "node is not installed")
+class JavaScriptRandomTest(unittest.TestCase):
+    def test_mersenne_twister_and_bag_match_cpython(self):
+        seeds = [0, 1, 42, 123456789, 2 ** 32 - 1]
+        js = run_node(f"""
+            const {{ MersenneTwister, BagRandomizer }} = require('./static/replay.js');
+            const out = [];
+            for (const seed of {json.dumps(seeds)}) {{
+                const mt = new MersenneTwister(seed);
+                const bag = new BagRandomizer(seed, {len(PIECE_TYPES)});
+                out.push([Array.from({{ length: 1300 }}, () => mt.nextUint32()),
+                          Array.from({{ length: 300 }}, () => bag.next())]);
+            }}
+            console.log(JSON.stringify(out));
+        """)
+        for seed, (words, pieces) in zip(seeds, js):
+            rng = random.Random(seed)
+            self.assertEqual(words, [rng.getrandbits(32) for _ in range(1300)], seed)
+            self.assertEqual(pieces, list(BagRandomizer(seed).take(300)), seed)
+
+
+@unittest.skipUnless(pygame, "pygame is not installed")
+class RenderTest(unittest.TestCase):
+    def test_dirty_render_matches_full_render(self):
+        from game import TetrisGame
+
+        pygame.init()
+        try:
+            pygame.display.set_mode((800, 600))
+            games = [TetrisGame(pygame.Surface((800, 600)), 'tester', None, seed=11, render_mode=mode)
+                     for mode in ('full', 'dirty')]
+            bot = BotInputs(11)
+            for i in range(900):
+                action = bot.next(games[0].engine)
+                for game in games:
+                    if i in (200, 230):
+                        game.engine.toggle_pause()
+                    game.engine.apply_action(action)
+                    game.sync_animation()
+                    game.tick()
+                    game.draw()
+                full, dirty = (pygame.image.tobytes(game.screen, 'RGB') for game in games)
+                self.assertTrue(full == dirty, f"frame {i}")
+        finally:
+            pygame.quit()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Shared fonts and cached text/overlay surfaces for the pygame client.
+
+Rendering text is one of the most expensive things a frame does, and
+constructing a pygame Font (which loads the font file) is worse. Fonts are
+created once per (name, size) and rendered strings are kept in an LRU cache
+keyed by (text, size, color), so static labels are rendered once and
+changing values (score, level) only when they change.
+"""
+from collections import OrderedDict
+import pygame
+
+# Rendered strings kept by the shared cache
+TEXT_CACHE_SIZE = 512
+
+_fonts = {}
+_overlays = {}
+
+
+def get_font(size, name=None):
+    """Shared Font for a size (name=None is pygame's default font)"""
+    key = (name, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.Font(name, size)
+        _fonts[key] = font
+    return font
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces"""
+
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, size, color, font_name=None):
+        """Antialiased text surface, rendered only on a cache miss"""
+        key = (text, size, tuple(color), font_name)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = get_font(size, font_name).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+text_cache = TextCache()
+
+
+def render_text(text, size, color, font_name=None):
+    """Render text through the shared cache"""
+    return text_cache.render(text, size, color, font_name)
+
+
+def get_overlay(size, color, alpha=None):
+    """Shared solid-color surface of the given size, with per-call alpha.
+
+    Callers blit it right away; the next call may change its alpha.
+    """
+    key = (tuple(size), tuple(color))
+    overlay = _overlays.get(key)
+    if overlay is None:
+        overlay = pygame.Surface(size)
+        overlay.fill(color)
+        _overlays[key] = overlay
+    overlay.set_alpha(alpha)
+    return overlay
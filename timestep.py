@@ -0,0 +1,50 @@
+import time
+
+# Simulation step of the desktop client: 125 Hz, a whole number of
+# milliseconds so every step is recorded exactly in replays
+STEP_MS = 8
+
+# Most simulation steps run between two rendered frames before time is dropped
+MAX_STEPS_PER_FRAME = 8
+
+
+class FixedTimestep:
+    """Accumulator that converts wall-clock time into fixed simulation steps.
+
+    Call advance() once per rendered frame and run that many steps; alpha is
+    how far the current moment lies between the last step and the next one,
+    for interpolating what is drawn. If the machine falls behind by more
+    than max_steps, the excess time is dropped (the game briefly slows down)
+    instead of piling up ever more catch-up work.
+    """
+
+    def __init__(self, step_ms=STEP_MS, max_steps=MAX_STEPS_PER_FRAME, clock=time.perf_counter):
+        self.step_ms = step_ms
+        self.max_steps = max_steps
+        self.clock = clock
+        self.accumulator = 0.0
+        self.dropped_ms = 0.0
+        self.last_time = clock()
+
+    def reset(self):
+        """Forget elapsed time (after a blocking menu or a pause screen)"""
+        self.accumulator = 0.0
+        self.last_time = self.clock()
+
+    def advance(self):
+        """Number of simulation steps to run for the time elapsed since the last call"""
+        now = self.clock()
+        self.accumulator += (now - self.last_time) * 1000
+        self.last_time = now
+        steps = int(self.accumulator // self.step_ms)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.dropped_ms += self.accumulator - steps * self.step_ms
+            self.accumulator = float(steps * self.step_ms)
+        self.accumulator -= steps * self.step_ms
+        return steps
+
+    @property
+    def alpha(self):
+        """Fraction of a step elapsed since the last simulation step (0..1)"""
+        return min(1.0, self.accumulator / self.step_ms)
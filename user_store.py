@@ -0,0 +1,172 @@
+"""Process-wide in-memory user store with write-behind persistence.
+
+The JSON file is read once at startup. Requests read and update the
+in-memory dict under a lock; a background thread writes the whole file
+(atomically: temp file + rename) at most once per flush interval, and only
+if something changed. close() stops the thread and performs a final flush.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Seconds between background flushes of changed data
+FLUSH_INTERVAL = 1.0
+
+
+def new_user_data():
+    return {'high_score': 0, 'games_played': 0}
+
+
+class UserStore:
+    """Users by name: {'high_score': int, 'games_played': int}"""
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        # Serializes writers of the file; held while the lock is not
+        self.write_lock = threading.Lock()
+        self.users = self._load()
+        # Seeds of games started on the server: username -> {seed: issue time}.
+        # Kept in memory only; games open during a restart cannot be submitted
+        self.seeds = {}
+        self.version = 0
+        self.saved_version = 0
+        self.stopping = threading.Event()
+        self.flusher = None
+        if flush_interval:
+            self.flusher = threading.Thread(target=self._flush_loop, name='user-store-flush', daemon=True)
+            self.flusher.start()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                users = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return users if isinstance(users, dict) else {}
+
+    def _changed(self):
+        """Mark the data dirty; call with the lock held"""
+        self.version += 1
+
+    def __contains__(self, username):
+        with self.lock:
+            return username in self.users
+
+    def __len__(self):
+        with self.lock:
+            return len(self.users)
+
+    def get_user(self, username):
+        """Copy of a user's data, or None"""
+        with self.lock:
+            data = self.users.get(username)
+            return dict(data) if data is not None else None
+
+    def create_user(self, username):
+        """Create the user if missing; returns (data, created)"""
+        with self.lock:
+            data = self.users.get(username)
+            created = data is None
+            if created:
+                data = self.users[username] = new_user_data()
+                self._changed()
+            return dict(data), created
+
+    def record_score(self, username, score):
+        """Count a played game and keep the best score.
+
+        Returns (data, new_record), or None if the user does not exist.
+        """
+        with self.lock:
+            data = self.users.get(username)
+            if data is None:
+                return None
+            data['games_played'] += 1
+            if score > data['high_score']:
+                data['high_score'] = score
+            self._changed()
+            return dict(data), score == data['high_score'] and score > 0
+
+    def record_scores(self, results):
+        """record_score() for many (username, score) pairs under one lock and one flush.
+
+        Returns a list with (data, new_record) or None for each pair, in order.
+        """
+        with self.lock:
+            return [self.record_score(username, score) for username, score in results]
+
+    def issue_seed(self, username, seed, max_open):
+        """Remember a game seed issued to a user, keeping the user's max_open newest"""
+        with self.lock:
+            seeds = self.seeds.setdefault(username, {})
+            seeds[seed] = time.time()
+            while len(seeds) > max_open:
+                del seeds[min(seeds, key=seeds.get)]
+
+    def claim_seed(self, username, seed, issued_after):
+        """Use up a seed issued to a user after issued_after (a timestamp); False if there is none"""
+        with self.lock:
+            issued = self.seeds.get(username, {}).pop(seed, None)
+            return issued is not None and issued >= issued_after
+
+    def scores(self):
+        """(username, high_score) of every user"""
+        with self.lock:
+            return [(username, data['high_score']) for username, data in self.users.items()]
+
+    def top(self, limit=10):
+        """Best players as (username, data), highest score first"""
+        with self.lock:
+            ranked = sorted(self.users.items(), key=lambda item: item[1]['high_score'], reverse=True)
+            return [(username, dict(data)) for username, data in ranked[:limit]]
+
+    def flush(self):
+        """Write the data to disk now if it changed; returns True if written"""
+        with self.write_lock:
+            with self.lock:
+                version = self.version
+                if version == self.saved_version:
+                    return False
+                text = json.dumps(self.users, ensure_ascii=False, indent=2)
+            self._write(text)
+            self.saved_version = version
+            return True
+
+    def _write(self, text):
+        """Replace the file atomically so readers never see a partial write"""
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.users-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _flush_loop(self):
+        while not self.stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                # Keep the data in memory and retry on the next interval
+                pass
+
+    def close(self):
+        """Stop the background flusher and write any pending changes"""
+        self.stopping.set()
+        if self.flusher is not None:
+            self.flusher.join()
+            self.flusher = None
+        self.flush()
@@ -0,0 +1,184 @@
+"""Server-side score verification by re-simulating submitted replays.
+
+Replays (see replay.py) are re-run through the headless engine in a bounded
+process pool; only the score the engine reproduces is trusted.
+
+Throughput benchmark:
+    python verify.py --bench --games 200 --workers 4
+"""
+import argparse
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from replay import ReplayPlayer, ReplayRecorder, ReplayError
+
+# Limits on what a single submission may cost to verify: the size, then the
+# frames (over an hour at 144 fps) and inputs a game may have. Frames cost about
+# 1 us and inputs 2 us each, so the worst accepted replay takes under a second
+MAX_REPLAY_BYTES = 4 * 1024 * 1024
+MAX_REPLAY_FRAMES = 600_000
+MAX_REPLAY_ACTIONS = 100_000
+
+VerificationResult = namedtuple('VerificationResult', [
+    'username', 'seed', 'score', 'claimed_score', 'lines', 'level', 'frames', 'seconds'])
+
+
+class VerifierBusy(RuntimeError):
+    """Raised when too many verifications are already pending"""
+
+
+def verify_replay(data):
+    """Re-simulate a replay and return a VerificationResult.
+
+    Raises ReplayError if the replay is malformed, incomplete, too large or
+    too long (MAX_REPLAY_FRAMES, MAX_REPLAY_ACTIONS), or if
+    its recorded final score does not match the simulation.
+    """
+    start = time.perf_counter()
+    if len(data) > MAX_REPLAY_BYTES:
+        raise ReplayError("Replay too large")
+    # The header (board size included) is validated while it is parsed
+    player = ReplayPlayer(data, snapshot_interval=0, max_frames=MAX_REPLAY_FRAMES,
+                          max_actions=MAX_REPLAY_ACTIONS)
+    engine = player.play()
+    if player.final_score is None:
+        raise ReplayError("Replay is incomplete")
+    if player.final_score != engine.score:
+        raise ReplayError("Recorded score does not match the simulation")
+    return VerificationResult(player.username, player.seed, engine.score, player.final_score,
+                              engine.lines_cleared, engine.level, player.frame_count,
+                              time.perf_counter() - start)
+
+
+class Verifier:
+    """Bounded worker pool for replay verification.
+
+    At most max_pending verifications are queued or running; beyond that
+    submit() raises VerifierBusy immediately, so a burst of submissions cannot
+    tie up request threads.
+    """
+
+    def __init__(self, max_workers=None, max_pending=64):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.pool = None
+        self.lock = threading.Lock()
+        self.verified = 0
+        self.cpu_seconds = 0.0
+
+    def _get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                # Imported with the first verification: multiprocessing is not needed to start the web app
+                from concurrent.futures import ProcessPoolExecutor
+                self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.pool
+
+    def submit(self, data, timeout=None):
+        """Start verifying a replay; returns a Future of VerificationResult.
+
+        With a timeout, waits up to that many seconds for a free slot
+        instead of failing immediately.
+        """
+        if timeout is None:
+            acquired = self.pending.acquire(blocking=False)
+        else:
+            acquired = self.pending.acquire(timeout=timeout)
+        if not acquired:
+            raise VerifierBusy("Too many pending verifications")
+        try:
+            future = self._get_pool().submit(verify_replay, bytes(data))
+        except Exception:
+            self.pending.release()
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        self.pending.release()
+        if not future.cancelled() and future.exception() is None:
+            with self.lock:
+                self.verified += 1
+                self.cpu_seconds += future.result().seconds
+
+    def verify(self, data, timeout=30):
+        """Verify a replay and wait for the result"""
+        return self.submit(data).result(timeout=timeout)
+
+    def throughput(self):
+        """Replays verified per CPU-second of simulation (replays/s per core)"""
+        with self.lock:
+            return self.verified / self.cpu_seconds if self.cpu_seconds else 0.0
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+
+def record_bot_game(seed, max_pieces=200, tick_ms=16):
+    """Play a greedy self-play game and return its replay bytes"""
+    from engine import TetrisEngine
+    from placements import PlacementSearch
+    from selfplay import GreedyPolicy
+
+    engine = TetrisEngine(seed=seed)
+    out = io.BytesIO()
+    recorder = ReplayRecorder.for_engine(engine, out, f"bot{seed}")
+    policy = GreedyPolicy(seed)
+    search = PlacementSearch(cache_size=256)
+    while not engine.game_over and engine.pieces_placed < max_pieces:
+        if not engine.clearing_lines:
+            piece = engine.current_piece
+            placements = search.placements(engine.board, piece.type, piece.x, piece.y, piece.rotation)
+            if placements:
+                for action in policy.choose(engine, placements).actions:
+                    engine.apply_action(action)
+        engine.update(tick_ms)
+    recorder.close(engine.score)
+    return out.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify replays or benchmark verification")
+    parser.add_argument('paths', nargs='*', help="replay files to verify")
+    parser.add_argument('--bench', action='store_true', help="measure verification throughput")
+    parser.add_argument('--games', type=int, default=100, help="replays to generate for --bench")
+    parser.add_argument('--pieces', type=int, default=200, help="pieces per generated replay")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="verification workers")
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        with open(path, 'rb') as f:
+            try:
+                result = verify_replay(f.read())
+            except ReplayError as e:
+                print(f"{path}: REJECTED ({e})")
+            else:
+                print(f"{path}: OK {result.username} score {result.score} "
+                      f"({result.frames} frames in {result.seconds * 1000:.1f} ms)")
+
+    if args.bench:
+        print(f"Recording {args.games} bot replays...")
+        replays = [record_bot_game(seed, args.pieces) for seed in range(args.games)]
+        frames = 0
+        verifier = Verifier(max_workers=args.workers, max_pending=len(replays))
+        start = time.perf_counter()
+        futures = [verifier.submit(data) for data in replays]
+        for future in futures:
+            frames += future.result().frames
+        elapsed = time.perf_counter() - start
+        verifier.shutdown()
+        size = sum(len(data) for data in replays) / len(replays)
+        print(f"Verified {len(replays)} replays ({frames} frames, {size:.0f} bytes avg) "
+              f"in {elapsed:.2f}s with {verifier.max_workers} workers")
+        print(f"Wall-clock: {len(replays) / elapsed:.1f} replays/s")
+        print(f"Per core:   {verifier.throughput():.1f} replays/s "
+              f"({frames / max(verifier.cpu_seconds, 1e-9):.0f} frames/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Minimal WebSocket (RFC 6455) server and client on asyncio streams.
+
+Only what the game server needs: the HTTP upgrade handshake, text and
+binary messages (fragmented ones are reassembled), ping/pong and close.
+Frames are encoded once with encode_frame() and can be written to any
+number of connections; messages larger than MAX_MESSAGE are refused.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import struct
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# Largest message accepted from a peer
+MAX_MESSAGE = 64 * 1024
+
+# Seconds to wait for the closing frame to be written
+CLOSE_TIMEOUT = 2.0
+
+# Seconds a new connection has to complete the HTTP upgrade
+HANDSHAKE_TIMEOUT = 10.0
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(Exception):
+    """Failed handshake or protocol violation"""
+
+
+class ConnectionClosed(Exception):
+    """The peer closed the connection or it was lost"""
+
+
+def accept_key(key):
+    """Sec-WebSocket-Accept value for a client's Sec-WebSocket-Key"""
+    return base64.b64encode(hashlib.sha1((key + GUID).encode('ascii')).digest()).decode('ascii')
+
+
+def valid_key(key):
+    """Whether a Sec-WebSocket-Key is base64 of 16 bytes, as RFC 6455 requires"""
+    try:
+        return len(base64.b64decode(key, validate=True)) == 16
+    except (binascii.Error, ValueError):
+        return False
+
+
+def apply_mask(data, key):
+    """XOR data with the repeating 4-byte mask key"""
+    n = len(data)
+    if not n:
+        return data
+    repeated = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(repeated, 'little')).to_bytes(n, 'little')
+
+
+def encode_frame(payload, opcode=OP_TEXT, mask=False):
+    """One complete (final) frame; clients must mask, servers must not"""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    length = len(payload)
+    first = 0x80 | opcode
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header = struct.pack('!BB', first, mask_bit | length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', first, mask_bit | 126, length)
+    else:
+        header = struct.pack('!BBQ', first, mask_bit | 127, length)
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    return header + key + apply_mask(payload, key)
+
+
+class WebSocket:
+    """An open connection, server or client side"""
+
+    def __init__(self, reader, writer, client=False, path='/', headers=None):
+        self.reader = reader
+        self.writer = writer
+        self.client = client
+        self.path = path
+        self.headers = headers or {}
+        self.closed = False
+
+    def buffered(self):
+        """Bytes written but not yet accepted by the socket"""
+        return self.writer.transport.get_write_buffer_size()
+
+    def send_frame(self, frame):
+        """Queue an encoded frame without waiting for the socket"""
+        if not self.closed:
+            self.writer.write(frame)
+
+    def send(self, message):
+        """Queue a text (str) or binary (bytes) message"""
+        opcode = OP_TEXT if isinstance(message, str) else OP_BINARY
+        self.send_frame(encode_frame(message, opcode, mask=self.client))
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def recv(self):
+        """Next message as str (text) or bytes (binary); raises ConnectionClosed"""
+        fragments = []
+        size = 0
+        message_opcode = None
+        while True:
+            opcode, fin, payload = await self._read_frame()
+            if opcode == OP_PING:
+                self.send_frame(encode_frame(payload, OP_PONG, mask=self.client))
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                await self.close()
+                raise ConnectionClosed()
+            if opcode == OP_CONTINUATION:
+                if message_opcode is None:
+                    raise WebSocketError("Unexpected continuation frame")
+            elif message_opcode is not None:
+                raise WebSocketError("Expected a continuation frame")
+            else:
+                message_opcode = opcode
+            fragments.append(payload)
+            size += len(payload)
+            if size > MAX_MESSAGE:
+                raise WebSocketError("Message too large")
+            if fin:
+                break
+        data = b''.join(fragments)
+        if message_opcode == OP_TEXT:
+            try:
+                return data.decode('utf-8')
+            except UnicodeDecodeError:
+                raise WebSocketError("Text message is not UTF-8")
+        return data
+
+    async def _read_frame(self):
+        reader = self.reader
+        try:
+            first, second = await reader.readexactly(2)
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', await reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', await reader.readexactly(8))[0]
+            if length > MAX_MESSAGE:
+                raise WebSocketError("Frame too large")
+            key = await reader.readexactly(4) if second & 0x80 else None
+            if key is None and not self.client:
+                # Clients must mask every frame; the server closes with 1002
+                raise WebSocketError("Unmasked client frame")
+            payload = await reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.closed = True
+            raise ConnectionClosed()
+        if key is not None:
+            payload = apply_mask(payload, key)
+        return first & 0x0F, bool(first & 0x80), payload
+
+    async def close(self, code=1000):
+        """Send a close frame and shut the connection"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.writer.write(encode_frame(struct.pack('!H', code), OP_CLOSE, mask=self.client))
+            await asyncio.wait_for(self.writer.drain(), CLOSE_TIMEOUT)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        self.writer.close()
+
+    def abort(self):
+        """Drop the connection at once (slow or misbehaving peer)"""
+        self.closed = True
+        self.writer.transport.abort()
+
+
+def parse_headers(lines):
+    headers = {}
+    for line in lines:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+async def server_handshake(reader, writer):
+    """Answer the HTTP upgrade request; returns the server-side WebSocket"""
+    try:
+        request = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.LimitOverrunError, asyncio.IncompleteReadError):
+        raise WebSocketError("Incomplete handshake")
+    lines = request.decode('latin-1').split('\r\n')
+    method, path, _ = (lines[0].split(' ') + ['', '', ''])[:3]
+    headers = parse_headers(lines[1:])
+    key = headers.get('sec-websocket-key')
+    if (method != 'GET' or 'websocket' not in headers.get('upgrade', '').lower() or
+            not key or not valid_key(key)):
+        writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+        raise WebSocketError("Not a WebSocket upgrade request")
+    writer.write(('HTTP/1.1 101 Switching Protocols\r\n'
+                  'Upgrade: websocket\r\n'
+                  'Connection: Upgrade\r\n'
+                  f'Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n').encode('ascii'))
+    return WebSocket(reader, writer, path=path, headers=headers)
+
+
+async def connect(host, port, path='/'):
+    """Open a client WebSocket"""
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode('ascii')
+    writer.write((f'GET {path} HTTP/1.1\r\n'
+                  f'Host: {host}:{port}\r\n'
+                  'Upgrade: websocket\r\n'
+                  'Connection: Upgrade\r\n'
+                  f'Sec-WebSocket-Key: {key}\r\n'
+                  'Sec-WebSocket-Version: 13\r\n\r\n').encode('ascii'))
+    response = await reader.readuntil(b'\r\n\r\n')
+    lines = response.decode('latin-1').split('\r\n')
+    headers = parse_headers(lines[1:])
+    if not lines[0].startswith('HTTP/1.1 101') or headers.get('sec-websocket-accept') != accept_key(key):
+        writer.close()
+        raise WebSocketError(f"Handshake refused: {lines[0]}")
+    return WebSocket(reader, writer, client=True, path=path, headers=headers)
+
+
+def serve(handler, host, port, **kwargs):
+    """Start an asyncio server that calls handler(ws) for every accepted WebSocket"""
+    async def on_connect(reader, writer):
+        try:
+            ws = await asyncio.wait_for(server_handshake(reader, writer), HANDSHAKE_TIMEOUT)
+        except (WebSocketError, ConnectionError, asyncio.TimeoutError):
+            writer.close()
+            return
+        try:
+            await handler(ws)
+        except WebSocketError:
+            await ws.close(1002)
+        except (ConnectionClosed, ConnectionError):
+            pass
+        finally:
+            await ws.close()
+
+    return asyncio.start_server(on_connect, host, port, **kwargs)